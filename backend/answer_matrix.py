@@ -0,0 +1,95 @@
+"""
+Dense NumPy encoding of stored exam attempts.
+
+Each auto-graded question of a GradingPlan becomes a column. A student answer
+is normalized with the question's AnswerKey and mapped to a small integer
+code from a per-question vocabulary in which the correct answer is always
+code 0, so correctness for a whole batch of attempts is `codes == 0` and the
+scores are one matrix-vector product with the points vector.
+"""
+
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from grading import GradingPlan
+
+# Code for a question the attempt did not answer
+MISSING = -1
+# Code of the correct answer in every column's vocabulary
+CORRECT = 0
+
+
+class AnswerMatrix:
+    """Encodes attempts (as stored in exam_attempts) against one grading plan."""
+
+    def __init__(self, plan: GradingPlan):
+        self.plan = plan
+        self.keys = list(plan.keys.values())
+        self.question_ids: List[str] = [key.question_id for key in self.keys]
+        self.columns: Dict[str, int] = {qid: j for j, qid in enumerate(self.question_ids)}
+        self.points = np.array([key.points for key in self.keys], dtype=np.float64)
+        # Canonical answer -> code, per question; shared across batches so codes stay stable
+        self.vocab: List[Dict[Hashable, int]] = [{key.canonical: CORRECT} for key in self.keys]
+        # Raw answer string -> code, per question; most attempts repeat a few option strings
+        self._raw_codes: List[Dict[str, int]] = [{} for _ in self.keys]
+
+    @property
+    def width(self) -> int:
+        return len(self.keys)
+
+    def encode(self, attempts: Iterable[Dict[str, Any]]) -> np.ndarray:
+        """Return an int32 (attempts x questions) matrix of answer codes."""
+        return self._encode(attempts, None)
+
+    def encode_with_times(self, attempts: Iterable[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Answer codes plus a float32 matrix of time_spent_seconds (NaN where unanswered)."""
+        times: List[List[float]] = []
+        codes = self._encode(attempts, times)
+        return codes, np.array(times, dtype=np.float32).reshape(codes.shape)
+
+    def code_of(self, j: int, answer: Any) -> int:
+        """Code of a raw student answer in column j (MISSING if it normalizes to nothing)."""
+        raw_codes = self._raw_codes[j]
+        if type(answer) is str:
+            code = raw_codes.get(answer)
+            if code is not None:
+                return code
+        value = self.keys[j].normalize(answer)
+        if value is None:
+            code = MISSING
+        else:
+            vocab = self.vocab[j]
+            code = vocab.get(value)
+            if code is None:
+                code = vocab[value] = len(vocab)
+        if type(answer) is str:
+            raw_codes[answer] = code
+        return code
+
+    def _encode(self, attempts: Iterable[Dict[str, Any]], times: Optional[List[List[float]]]) -> np.ndarray:
+        width = self.width
+        columns = self.columns
+        nan = float('nan')
+        rows: List[List[int]] = []
+        for attempt in attempts:
+            row = [MISSING] * width
+            time_row = [nan] * width if times is not None else None
+            for ans in attempt.get('answers') or []:
+                j = columns.get(str(ans.get('question_id')))
+                # First answer per question wins, as in GradingPlan.grade
+                if j is None or row[j] != MISSING:
+                    continue
+                row[j] = self.code_of(j, ans.get('answer'))
+                if time_row is not None and row[j] != MISSING:
+                    spent = ans.get('time_spent_seconds')
+                    if spent is not None:
+                        time_row[j] = spent
+            rows.append(row)
+            if times is not None:
+                times.append(time_row)
+        return np.array(rows, dtype=np.int32).reshape(len(rows), width)
+
+    def score(self, codes: np.ndarray) -> np.ndarray:
+        """Vector of scores, one per encoded attempt."""
+        return (codes == CORRECT).astype(np.float64) @ self.points
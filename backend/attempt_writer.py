@@ -0,0 +1,158 @@
+"""
+Group-commit writer for exam_attempts.
+
+At the deadline of a large exam, hundreds of submissions arrive within a few
+seconds and each paid a full round trip (and a journal commit) for its own
+insert_one. BatchWriter queues the documents of concurrent requests and
+writes them with one unordered insert_many once `max_batch` documents are
+waiting or `max_delay` seconds after the first one arrived; every caller
+awaits a future for its own document. Up to `max_inflight` batches are
+written at once, and documents keep queueing meanwhile, so the batch size
+grows with load while an idle server adds at most `max_delay` of latency.
+
+Errors stay per request: a document rejected inside a batch (e.g. a duplicate
+key) fails only its own caller, with the same exception type insert_one would
+raise; if the whole batch fails every caller in it gets the error. A batch
+whose write concern was not satisfied raises WriteConcernError for every
+document that was not rejected outright, as insert_one would: the documents
+may be stored, but not as durably as required.
+
+The flusher task is started lazily on the event loop of the first insert, and
+close() writes whatever is still queued.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError, WriteError
+
+logger = logging.getLogger(__name__)
+
+_Entry = Tuple[Dict[str, Any], asyncio.Future]
+
+
+def _document_error(error: Dict[str, Any]) -> Exception:
+    """The exception insert_one would have raised for one writeErrors entry"""
+    code = error.get('code')
+    message = error.get('errmsg', 'write failed')
+    if code in (11000, 11001, 12582):
+        return DuplicateKeyError(message, code, error)
+    return WriteError(message, code, error)
+
+
+class BatchWriter:
+    def __init__(
+        self,
+        get_collection: Callable[[], Any],
+        max_batch: int = 256,
+        max_delay: float = 0.005,
+        max_inflight: int = 4,
+    ):
+        self.get_collection = get_collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_inflight = max_inflight
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[_Entry] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writes: set = set()
+        self.counters = {"documents": 0, "batches": 0, "failed": 0, "largest_batch": 0}
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First insert, or on a new loop: the old loop's primitives cannot be reused
+            self._loop = loop
+            self._pending = []
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_inflight)
+            self._writes = set()
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    async def insert(self, doc: Dict[str, Any]):
+        """Insert one document as part of the next batch; raises what insert_one would"""
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._pending.append((doc, future))
+        self._wakeup.set()
+        await future
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if len(self._pending) < self.max_batch:
+                # Group-commit window: let concurrent requests join this batch
+                await asyncio.sleep(self.max_delay)
+            # Take the batch only once a slot is free, so cancelling here loses nothing
+            await self._slots.acquire()
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            write = asyncio.create_task(self._write(batch))
+            self._writes.add(write)
+            write.add_done_callback(self._write_done)
+
+    def _write_done(self, write: asyncio.Task):
+        self._writes.discard(write)
+        self._slots.release()
+
+    async def _write(self, batch: List[_Entry]):
+        docs = [doc for doc, _ in batch]
+        failed: Dict[int, Exception] = {}
+        try:
+            await self.get_collection().insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index']: _document_error(error) for error in e.details.get('writeErrors', [])}
+            concern_errors = e.details.get('writeConcernErrors') or []
+            if concern_errors:
+                concern = concern_errors[0]
+                error = WriteConcernError(concern.get('errmsg', 'write concern failed'), concern.get('code'), concern)
+                logger.error(f"Batch insert of {len(batch)} attempts missed its write concern: {error}")
+                for i in range(len(batch)):
+                    failed.setdefault(i, error)
+        except Exception as e:
+            logger.error(f"Batch insert of {len(batch)} attempts failed: {e}")
+            failed = {i: e for i in range(len(batch))}
+
+        self.counters["documents"] += len(batch) - len(failed)
+        self.counters["failed"] += len(failed)
+        self.counters["batches"] += 1
+        self.counters["largest_batch"] = max(self.counters["largest_batch"], len(batch))
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if i in failed:
+                future.set_exception(failed[i])
+            else:
+                future.set_result(None)
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            await self._write(batch)
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self.counters["batches"]
+        written = self.counters["documents"] + self.counters["failed"]
+        return {
+            **self.counters,
+            "queued": len(self._pending),
+            "mean_batch": round(written / batches, 1) if batches else None,
+        }
@@ -0,0 +1,103 @@
+"""
+Caches on the tutor request path.
+
+Dashboards poll several endpoints every few seconds, and each call verified
+the JWT signature and read the tutor or the exam's owner from Mongo again.
+
+TokenCache keeps verified tokens in a bounded LRU keyed by the token's
+SHA-256 (raw tokens are never held), each entry expiring at the token's own
+`exp`, so a cached token is never accepted past the moment jwt.decode would
+have rejected it. Tokens that fail verification are not cached.
+
+TutorCache keeps tutor profiles and exam -> owner mappings for a short TTL.
+Exam owners never change, so the owner entry only has to go when the exam is
+deleted; callers invalidate on deletes. No endpoint updates tutors, so
+profiles only expire with the TTL, which also bounds staleness for writes
+made outside this API.
+"""
+
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cachetools import TLRUCache, TTLCache
+
+
+def token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+class TokenCache:
+    def __init__(self, decode: Callable[[str], Dict[str, Any]], maxsize: int = 10000, timer=time.time):
+        # decode(token) -> verified claims; raises for invalid or expired tokens
+        self.decode = decode
+        # Entries expire at the token's exp (wall-clock seconds, like the claim)
+        self._tokens: TLRUCache = TLRUCache(
+            maxsize=maxsize, ttu=lambda key, value, now: value[1], timer=timer
+        )
+        self.counters = {"hits": 0, "misses": 0}
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Verified claims of `token` (tutor_id, exp), from the cache when possible"""
+        key = token_key(token)
+        cached: Optional[Tuple[str, float]] = self._tokens.get(key)
+        if cached is not None:
+            self.counters["hits"] += 1
+            return {"tutor_id": cached[0], "exp": cached[1]}
+
+        self.counters["misses"] += 1
+        payload = self.decode(token)
+        tutor_id, exp = payload.get('tutor_id'), payload.get('exp')
+        if tutor_id and isinstance(exp, (int, float)):
+            self._tokens[key] = (tutor_id, exp)
+        return payload
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "size": len(self._tokens), "maxsize": self._tokens.maxsize}
+
+
+class TutorCache:
+    def __init__(
+        self,
+        load_profile: Callable[[str], Awaitable[Optional[Dict[str, Any]]]],
+        load_owner: Callable[[str], Awaitable[Optional[str]]],
+        ttl: float = 60,
+        maxsize: int = 20000,
+    ):
+        self.load_profile = load_profile
+        self.load_owner = load_owner
+        self._profiles: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._owners: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.counters = {"profile_hits": 0, "profile_misses": 0, "owner_hits": 0, "owner_misses": 0}
+
+    async def profile(self, tutor_id: str) -> Optional[Dict[str, Any]]:
+        tutor = self._profiles.get(tutor_id)
+        if tutor is not None:
+            self.counters["profile_hits"] += 1
+            return tutor
+        self.counters["profile_misses"] += 1
+        tutor = await self.load_profile(tutor_id)
+        if tutor is not None:
+            self._profiles[tutor_id] = tutor
+        return tutor
+
+    async def owns(self, exam_id: str, tutor_id: str) -> bool:
+        owner = self._owners.get(exam_id)
+        if owner is not None:
+            self.counters["owner_hits"] += 1
+            return owner == tutor_id
+        self.counters["owner_misses"] += 1
+        # Missing exams are not remembered: an id may be created right after
+        owner = await self.load_owner(exam_id)
+        if owner is not None:
+            self._owners[exam_id] = owner
+        return owner == tutor_id
+
+    def remember_owner(self, exam_id: str, tutor_id: str):
+        self._owners[exam_id] = tutor_id
+
+    def invalidate_exam(self, exam_id: str):
+        self._owners.pop(exam_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "profiles": len(self._profiles), "owners": len(self._owners)}
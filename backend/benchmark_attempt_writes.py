@@ -0,0 +1,107 @@
+"""
+Benchmark: one insert_one per submission vs the BatchWriter group commit.
+
+Runs `--submissions` attempt-sized documents through each strategy with
+`--concurrency` submissions in flight (a deadline burst), against a scratch
+collection in MONGO_URL / DB_NAME that is dropped afterwards, and prints
+throughput and per-request latency for both. Run it against a primary with
+production-like latency and write concern; a local mongod with no network in
+between understates what batching saves.
+
+Usage:
+    python benchmark_attempt_writes.py [--submissions 5000] [--concurrency 500]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from attempt_writer import BatchWriter
+
+
+def make_attempt(i: int) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "exam_id": "benchmark",
+        "student_data": {"name": f"Student {i}", "email": f"student{i}@example.com"},
+        "answers": [{"question_id": str(q), "answer": "B", "time_spent_seconds": 30} for q in range(40)],
+        "violations": [],
+        "score": 30.0,
+        "max_score": 40,
+        "percentage": 75.0,
+        "submitted_at": datetime.now(timezone.utc).isoformat(),
+        "flagged": False,
+    }
+
+
+async def run(insert: Callable[[Dict[str, Any]], Any], submissions: int, concurrency: int) -> Dict[str, float]:
+    gate = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    docs = [make_attempt(i) for i in range(submissions)]
+
+    async def submit(doc: Dict[str, Any]):
+        async with gate:
+            started = time.perf_counter()
+            await insert(doc)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(submit(doc) for doc in docs))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "per_second": submissions / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000,
+    }
+
+
+async def benchmark(args) -> Dict[str, Dict[str, float]]:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], maxPoolSize=args.pool_size)
+    collection = client[os.environ['DB_NAME']][f"benchmark_attempts_{uuid.uuid4().hex[:8]}"]
+
+    results = {}
+    try:
+        results["insert_one"] = await run(collection.insert_one, args.submissions, args.concurrency)
+        await collection.drop()
+        writer = BatchWriter(lambda: collection, max_batch=args.batch_size, max_delay=args.delay_ms / 1000)
+        results["batch_writer"] = await run(writer.insert, args.submissions, args.concurrency)
+        await writer.close()
+        results["batch_writer"]["mean_batch"] = writer.stats()["mean_batch"]
+    finally:
+        await collection.drop()
+        client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare insert_one per submission with group-committed insert_many")
+    parser.add_argument('--submissions', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--delay-ms', type=float, default=5)
+    parser.add_argument('--pool-size', type=int, default=100, help="Motor connection pool size")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args))
+    for name, r in results.items():
+        line = f"{name:>13}: {r['per_second']:9.0f} submissions/s   p50 {r['p50_ms']:7.1f} ms   p99 {r['p99_ms']:7.1f} ms"
+        if 'mean_batch' in r:
+            line += f"   mean batch {r['mean_batch']}"
+        print(line)
+    speedup = results["batch_writer"]["per_second"] / results["insert_one"]["per_second"]
+    print(f"Group commit throughput: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Columnar (Parquet / Arrow IPC) export of attempts for warehouse loading.
+
+Every attempt of a tutor's exams is written as three tables:
+
+    attempts/exam_id=<id>/part-<run>.parquet      one row per attempt
+    answers/exam_id=<id>/part-<run>.parquet       one row per submitted answer
+    violations/exam_id=<id>/part-<run>.parquet    one row per proctoring violation
+
+Attempts are read from one cursor ordered by (exam_id, submitted_at, id), so
+each exam's partition writers are opened, filled and closed in turn. Values
+are appended straight into per-column lists and turned into Arrow record
+batches every `batch_size` attempts; no per-row records are built.
+
+Exports can be incremental: pass the `watermark` of the previous run as
+`since` to get the attempts submitted after it. submitted_at is stamped
+before the attempt is written, so an attempt can become visible after a run
+whose watermark is already past it; each incremental run therefore re-reads
+the `overlap_seconds` before `since` as well. Rows from that window repeat
+those of the previous run, so loads must dedupe on attempt_id (the manifest
+names it as `dedupe_key`), which also keeps a repeated run idempotent.
+
+Requires pyarrow.
+
+Usage:
+    python columnar_export.py <tutor_id> <out_dir> [--since ISO-8601] [--format arrow]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from grading import serialize_answer
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+# Re-read before `since`: longer than any attempt takes from stamping to being stored
+DEFAULT_OVERLAP_SECONDS = 300
+FORMATS = ('parquet', 'arrow')
+TABLES = ('attempts', 'answers', 'violations')
+
+EXPORT_PROJECTION = {
+    '_id': 0, 'id': 1, 'exam_id': 1, 'student_data': 1, 'score': 1, 'max_score': 1,
+    'percentage': 1, 'flagged': 1, 'submitted_at': 1, 'answers': 1, 'violations': 1,
+}
+
+
+def _schemas() -> Dict[str, 'pa.Schema']:
+    timestamp = pa.timestamp('us', tz='UTC')
+    return {
+        'attempts': pa.schema([
+            ('attempt_id', pa.string()),
+            ('exam_id', pa.string()),
+            ('submitted_at', timestamp),
+            ('score', pa.float64()),
+            ('max_score', pa.int64()),
+            ('percentage', pa.float64()),
+            ('flagged', pa.bool_()),
+            ('violations_count', pa.int32()),
+            ('student_name', pa.string()),
+            ('student_email', pa.string()),
+            ('student_data', pa.string()),
+        ]),
+        'answers': pa.schema([
+            ('attempt_id', pa.string()),
+            ('exam_id', pa.string()),
+            ('submitted_at', timestamp),
+            ('question_id', pa.string()),
+            ('answer', pa.string()),
+            ('time_spent_seconds', pa.float64()),
+        ]),
+        'violations': pa.schema([
+            ('attempt_id', pa.string()),
+            ('exam_id', pa.string()),
+            ('submitted_at', timestamp),
+            ('type', pa.string()),
+            ('timestamp', pa.string()),
+            ('details', pa.string()),
+        ]),
+    }
+
+
+class _ColumnBuffer:
+    """Per-column value lists for one table, flushed as Arrow record batches."""
+
+    def __init__(self, schema: 'pa.Schema'):
+        self.schema = schema
+        self.columns: Dict[str, List[Any]] = {name: [] for name in schema.names}
+
+    def take_batch(self) -> 'pa.RecordBatch':
+        arrays = [pa.array(self.columns[field.name], type=field.type) for field in self.schema]
+        for values in self.columns.values():
+            values.clear()
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+class _PartitionWriter:
+    """Writers for one exam's partition of every table."""
+
+    def __init__(self, out_dir: Path, exam_id: str, run_id: str, fmt: str, schemas: Dict[str, 'pa.Schema']):
+        self.paths: Dict[str, Path] = {}
+        self._writers: Dict[str, Any] = {}
+        self._out_dir = out_dir
+        self._exam_id = exam_id
+        self._run_id = run_id
+        self._fmt = fmt
+        self._schemas = schemas
+
+    def write(self, table: str, batch: 'pa.RecordBatch'):
+        if batch.num_rows == 0:
+            return
+        writer = self._writers.get(table)
+        if writer is None:
+            suffix = 'parquet' if self._fmt == 'parquet' else 'arrow'
+            path = self._out_dir / table / f"exam_id={self._exam_id}" / f"part-{self._run_id}.{suffix}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if self._fmt == 'parquet':
+                writer = pq.ParquetWriter(str(path), self._schemas[table], compression='zstd')
+            else:
+                writer = pa_ipc.new_file(str(path), self._schemas[table])
+            self._writers[table] = writer
+            self.paths[table] = path
+        if self._fmt == 'parquet':
+            writer.write_batch(batch)
+        else:
+            writer.write(batch)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """ISO-8601 timestamp as an aware datetime; naive values are UTC. Raises ValueError."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+async def export_attempts(
+    db,
+    exam_ids: List[str],
+    out_dir: str,
+    since: Optional[str] = None,
+    fmt: str = 'parquet',
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+) -> Dict[str, Any]:
+    """
+    Write attempts of `exam_ids` submitted after `since` (less the overlap window) under `out_dir`.
+    Returns a manifest: {format, since, read_from, watermark, dedupe_key, rows: {table: n}, files: [relative paths]}
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for columnar exports")
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+
+    out = Path(out_dir)
+    run_id = uuid.uuid4().hex[:12]
+    schemas = _schemas()
+    buffers = {table: _ColumnBuffer(schemas[table]) for table in TABLES}
+    rows = {table: 0 for table in TABLES}
+    files: List[str] = []
+    watermark = since
+    read_from = None
+
+    query: Dict[str, Any] = {'exam_id': {'$in': exam_ids}}
+    if since:
+        # Same format as the stored submitted_at strings, so they compare in order
+        read_from = (parse_time(since).astimezone(timezone.utc) - timedelta(seconds=overlap_seconds)).isoformat()
+        query['submitted_at'] = {'$gt': read_from}
+    cursor = db.exam_attempts.find(query, EXPORT_PROJECTION).sort(
+        [('exam_id', 1), ('submitted_at', 1), ('id', 1)]
+    ).batch_size(batch_size)
+
+    partition: Optional[_PartitionWriter] = None
+    current_exam: Optional[str] = None
+    pending = 0
+
+    def flush(writer: _PartitionWriter):
+        for table in TABLES:
+            batch = buffers[table].take_batch()
+            rows[table] += batch.num_rows
+            writer.write(table, batch)
+
+    def finish(writer: _PartitionWriter):
+        flush(writer)
+        writer.close()
+        files.extend(str(path.relative_to(out)) for path in writer.paths.values())
+
+    attempts_cols = buffers['attempts'].columns
+    answers_cols = buffers['answers'].columns
+    violations_cols = buffers['violations'].columns
+
+    async for attempt in cursor:
+        exam_id = attempt['exam_id']
+        if exam_id != current_exam:
+            if partition is not None:
+                await asyncio.to_thread(finish, partition)
+            partition = _PartitionWriter(out, exam_id, run_id, fmt, schemas)
+            current_exam = exam_id
+            pending = 0
+
+        attempt_id = attempt['id']
+        submitted_at_raw = attempt.get('submitted_at')
+        submitted_at = parse_time(submitted_at_raw)
+        student_data = attempt.get('student_data') or {}
+        violations = attempt.get('violations') or []
+
+        attempts_cols['attempt_id'].append(attempt_id)
+        attempts_cols['exam_id'].append(exam_id)
+        attempts_cols['submitted_at'].append(submitted_at)
+        attempts_cols['score'].append(attempt.get('score'))
+        attempts_cols['max_score'].append(attempt.get('max_score'))
+        attempts_cols['percentage'].append(attempt.get('percentage'))
+        attempts_cols['flagged'].append(bool(attempt.get('flagged')))
+        attempts_cols['violations_count'].append(len(violations))
+        attempts_cols['student_name'].append(student_data.get('name'))
+        attempts_cols['student_email'].append(student_data.get('email'))
+        attempts_cols['student_data'].append(json.dumps(student_data, ensure_ascii=False))
+
+        for ans in attempt.get('answers') or []:
+            answers_cols['attempt_id'].append(attempt_id)
+            answers_cols['exam_id'].append(exam_id)
+            answers_cols['submitted_at'].append(submitted_at)
+            answers_cols['question_id'].append(str(ans.get('question_id')))
+            answers_cols['answer'].append(serialize_answer(ans.get('answer')))
+            answers_cols['time_spent_seconds'].append(ans.get('time_spent_seconds'))
+
+        for violation in violations:
+            violations_cols['attempt_id'].append(attempt_id)
+            violations_cols['exam_id'].append(exam_id)
+            violations_cols['submitted_at'].append(submitted_at)
+            violations_cols['type'].append(violation.get('type'))
+            violations_cols['timestamp'].append(violation.get('timestamp'))
+            violations_cols['details'].append(violation.get('details'))
+
+        if submitted_at_raw and (watermark is None or submitted_at_raw > watermark):
+            watermark = submitted_at_raw
+        pending += 1
+        if pending >= batch_size:
+            await asyncio.to_thread(flush, partition)
+            pending = 0
+
+    if partition is not None:
+        await asyncio.to_thread(finish, partition)
+
+    manifest = {
+        'format': fmt, 'since': since, 'read_from': read_from, 'watermark': watermark,
+        'dedupe_key': 'attempt_id', 'rows': rows, 'files': sorted(files),
+    }
+    logger.info(f"Columnar export of {len(exam_ids)} exams: {rows['attempts']} attempts, watermark {watermark}")
+    return manifest
+
+
+async def export_tutor_attempts(db, tutor_id: str, out_dir: str, **kwargs) -> Dict[str, Any]:
+    exam_ids = await db.exams.distinct('id', {'tutor_id': tutor_id})
+    return await export_attempts(db, exam_ids, out_dir, **kwargs)
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Export a tutor's attempts as partitioned Parquet/Arrow files")
+    parser.add_argument('tutor_id')
+    parser.add_argument('out_dir')
+    parser.add_argument('--since', help="only attempts submitted after this watermark (submitted_at)")
+    parser.add_argument('--overlap-seconds', type=float, default=DEFAULT_OVERLAP_SECONDS,
+                        help="also re-read attempts submitted this long before --since")
+    parser.add_argument('--format', choices=FORMATS, default='parquet')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    try:
+        manifest = asyncio.run(export_tutor_attempts(
+            db, args.tutor_id, args.out_dir, since=args.since, fmt=args.format, batch_size=args.batch_size,
+            overlap_seconds=args.overlap_seconds
+        ))
+        print(json.dumps(manifest, indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
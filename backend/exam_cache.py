@@ -0,0 +1,181 @@
+"""
+In-process cache for public (sanitized) exam payloads.
+
+- Concurrent misses for the same exam are coalesced into one Mongo read
+  (single-flight), so 800 students opening an exam at once cost one query.
+- Entries are fresh for `ttl` seconds and then served stale for up to
+  `stale_ttl` seconds while one background refresh reloads them
+  (stale-while-revalidate), so an exam never expires mid-exam.
+- Memory is bounded by payload bytes with W-TinyLFU admission (tinylfu.py),
+  so big exams are charged for their size and a scan of one-off exam IDs
+  cannot evict the exams that are live right now.
+- ExamPrewarmer loads exams shortly before their start_date, so the first
+  wave of students is served from memory.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from cachetools import LRUCache
+
+from singleflight import SingleFlight
+from tinylfu import TinyLFUCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_HIT = 'HIT'
+CACHE_STALE = 'STALE'
+CACHE_MISS = 'MISS'
+
+Loader = Callable[[str], Awaitable[Optional[Any]]]
+
+# Bookkeeping charged per entry on top of the payload itself
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class CacheEntry:
+    __slots__ = ('value', 'size', 'fresh_until', 'expires_at')
+
+    def __init__(self, value: Any, size: int, fresh_until: float, expires_at: float):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.expires_at = expires_at
+
+
+class PublicExamCache:
+    def __init__(
+        self,
+        loader: Loader,
+        ttl: float = 60,
+        stale_ttl: float = 600,
+        max_bytes: int = 64 * 1024 * 1024,
+        getsizeof: Callable[[Any], int] = lambda value: 1,
+        max_generations: int = 10000,
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        # Entries are dropped entirely once they have been stale for stale_ttl
+        self.stale_ttl = stale_ttl
+        self.getsizeof = getsizeof
+        self._entries = TinyLFUCache(max_bytes, getsizeof=lambda entry: entry.size)
+        self._flights = SingleFlight()
+        # Renewed on invalidation so a load that was already in flight is not cached;
+        # bounded, and a load whose exam was evicted meanwhile is not cached either
+        self._generations: LRUCache = LRUCache(maxsize=max_generations)
+        self._generation_counter = itertools.count(1)
+        self._refreshes: Set[asyncio.Task] = set()
+        self.counters = {CACHE_HIT: 0, CACHE_STALE: 0, CACHE_MISS: 0}
+
+    async def get(self, exam_id: str) -> Tuple[Optional[Any], str]:
+        """Return (payload or None if the exam does not exist, cache status)."""
+        entry = self._entries.get(exam_id)
+        now = time.monotonic()
+        if entry is not None and now >= entry.expires_at:
+            self._entries.pop(exam_id)
+            entry = None
+        if entry is not None:
+            if now < entry.fresh_until:
+                self.counters[CACHE_HIT] += 1
+                return entry.value, CACHE_HIT
+            self.counters[CACHE_STALE] += 1
+            self._refresh_in_background(exam_id)
+            return entry.value, CACHE_STALE
+        self.counters[CACHE_MISS] += 1
+        return await self._flights.do(exam_id, lambda: self._load(exam_id)), CACHE_MISS
+
+    async def warm(self, exam_id: str):
+        """Load an exam unless a fresh copy is already cached."""
+        entry = self._entries.get(exam_id) if exam_id in self._entries else None
+        if entry is None or time.monotonic() >= entry.fresh_until:
+            await self._flights.do(exam_id, lambda: self._load(exam_id))
+
+    def invalidate(self, exam_id: str):
+        self._generations[exam_id] = next(self._generation_counter)
+        self._entries.pop(exam_id, None)
+
+    async def _load(self, exam_id: str) -> Optional[Any]:
+        generation = self._generations.get(exam_id)
+        if generation is None:
+            generation = self._generations[exam_id] = next(self._generation_counter)
+        value = await self.loader(exam_id)
+        if self._generations.get(exam_id) == generation:
+            if value is None:
+                self._entries.pop(exam_id, None)
+            else:
+                now = time.monotonic()
+                size = self.getsizeof(value) + ENTRY_OVERHEAD_BYTES
+                self._entries[exam_id] = CacheEntry(value, size, now + self.ttl, now + self.ttl + self.stale_ttl)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Request outcomes (HIT/STALE/MISS) plus size, eviction and admission counters"""
+        return {"requests": dict(self.counters), **self._entries.stats()}
+
+    def _refresh_in_background(self, exam_id: str):
+        if self._flights.in_flight(exam_id):
+            return
+        task = asyncio.ensure_future(self._flights.do(exam_id, lambda: self._load(exam_id)))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task):
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background refresh of public exam failed: {task.exception()}")
+
+
+class ExamPrewarmer:
+    """Periodically warms the cache for exams whose start_date is coming up."""
+
+    def __init__(
+        self,
+        cache: PublicExamCache,
+        find_starting: Callable[[datetime, datetime], Awaitable[List[str]]],
+        lead_minutes: float = 5,
+        interval_seconds: float = 60,
+    ):
+        self.cache = cache
+        self.find_starting = find_starting
+        self.lead = timedelta(minutes=lead_minutes)
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def warm_upcoming(self) -> int:
+        now = datetime.now(timezone.utc)
+        exam_ids = await self.find_starting(now, now + self.lead)
+        for exam_id in exam_ids:
+            try:
+                await self.cache.warm(exam_id)
+            except Exception as e:
+                logger.warning(f"Failed to pre-warm exam {exam_id}: {e}")
+        if exam_ids:
+            logger.info(f"🔥 Pre-warmed {len(exam_ids)} exams starting within {self.lead}")
+        return len(exam_ids)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.warm_upcoming()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Exam pre-warm failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
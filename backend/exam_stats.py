@@ -0,0 +1,268 @@
+"""
+Per-exam summary statistics kept in the `exam_stats` collection.
+
+submit_exam folds every new attempt into its exam's document with a single
+atomic update ($inc count/sum/flagged, $min/$max), so analytics is one point
+read regardless of how many attempts an exam has. The document can always be
+rebuilt from exam_attempts: after a regrade, or to repair drift. The first
+attempt of an exam creates its document (upsert). Exams whose attempts
+predate this collection are backfilled with `--all`, once, when deploying;
+rebuilding replaces any document new attempts started meanwhile. Reads never
+rebuild: a rebuild racing a submission could count that attempt twice.
+
+The document also carries the score distribution in bounded space:
+
+- `histogram`: attempt counts per 5-point percentage bin ($inc per attempt)
+- `score_buckets`: attempt counts per 0.1-point bucket, the source of the
+  Fenwick trees that rank submissions (score_rank.py)
+- `digest`: a t-digest of percentages (quantile_sketch.py) for the median,
+  quartiles and other percentiles. Submissions $push their percentage onto
+  `digest_buffer`; every DIGEST_FLUSH_EVERY attempts the first k buffered
+  values are folded into the digest by a pipeline update that slices exactly
+  those k off the buffer, so percentages pushed meanwhile stay buffered.
+  The update is conditioned on `digest_version` only, so submissions never
+  make it fail; of two concurrent flushes one wins and the other skips.
+
+Rebuilding replaces the document with an aggregate over the attempts, so
+attempts submitted while a rebuild runs may be missed; run it when an exam is
+quiet, or again afterwards.
+
+Usage:
+    python exam_stats.py <exam_id>      # rebuild one exam
+    python exam_stats.py --all          # rebuild every exam with attempts
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from quantile_sketch import TDigest
+from score_rank import score_bucket
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_BIN_WIDTH = 5
+HISTOGRAM_BINS = 100 // HISTOGRAM_BIN_WIDTH
+DIGEST_FLUSH_EVERY = 64
+# $slice needs an explicit length; larger than any buffer can grow
+DIGEST_BUFFER_SLICE_MAX = 2 ** 31 - 1
+REPORTED_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def histogram_bin(percentage: float) -> int:
+    # 100% falls into the last bin
+    return min(max(int(percentage // HISTOGRAM_BIN_WIDTH), 0), HISTOGRAM_BINS - 1)
+
+
+async def ensure_indexes(db):
+    await db.exam_stats.create_index([("exam_id", 1)], unique=True)
+
+
+async def record_attempt(
+    db, exam_id: str, percentage: float, flagged: bool, with_buckets: bool = False
+) -> Dict[str, Any]:
+    """
+    Fold one submitted attempt into the exam's statistics; returns {count,
+    digest_pending} after it, plus score_buckets if `with_buckets` (for ranking).
+    """
+    projection = {"_id": 0, "count": 1, "digest_pending": 1}
+    if with_buckets:
+        projection["score_buckets"] = 1
+    stats = await db.exam_stats.find_one_and_update(
+        {"exam_id": exam_id},
+        {
+            "$inc": {
+                "count": 1,
+                "sum_percentage": percentage,
+                "flagged_count": 1 if flagged else 0,
+                f"histogram.{histogram_bin(percentage)}": 1,
+                f"score_buckets.{score_bucket(percentage)}": 1,
+                "digest_pending": 1,
+            },
+            "$min": {"lowest_percentage": percentage},
+            "$max": {"highest_percentage": percentage},
+            "$push": {"digest_buffer": percentage},
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()},
+        },
+        projection=projection,
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if stats.get("digest_pending", 0) >= DIGEST_FLUSH_EVERY:
+        try:
+            await flush_digest(db, exam_id)
+        except Exception as e:
+            logger.warning(f"Failed to fold score digest of exam {exam_id}: {e}")
+    return stats
+
+
+async def flush_digest(db, exam_id: str) -> bool:
+    """Fold buffered percentages into the stored t-digest; False if another flush won the race"""
+    stats = await db.exam_stats.find_one(
+        {"exam_id": exam_id}, {"_id": 0, "digest": 1, "digest_buffer": 1, "digest_version": 1}
+    )
+    if not stats or not stats.get("digest_buffer"):
+        return True
+    merged = stats["digest_buffer"]
+    k = len(merged)
+    digest = TDigest.from_dict(stats.get("digest"))
+    digest.update(merged)
+    # Drops exactly the k merged values; anything pushed since the read stays buffered
+    result = await db.exam_stats.update_one(
+        {"exam_id": exam_id, "digest_version": stats.get("digest_version")},
+        [{"$set": {
+            "digest": {"$literal": digest.to_dict()},
+            "digest_buffer": {"$slice": ["$digest_buffer", k, DIGEST_BUFFER_SLICE_MAX]},
+            "digest_pending": {"$subtract": ["$digest_pending", k]},
+            "digest_version": {"$add": [{"$ifNull": ["$digest_version", 0]}, 1]},
+        }}],
+    )
+    return result.modified_count == 1
+
+
+async def rebuild_exam_stats(db, exam_id: str) -> Optional[Dict[str, Any]]:
+    """Recompute an exam's statistics from its attempts; returns the new document"""
+    pipeline = [
+        {"$match": {"exam_id": exam_id}},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "sum_percentage": {"$sum": "$percentage"},
+            "flagged_count": {"$sum": {"$cond": ["$flagged", 1, 0]}},
+            "lowest_percentage": {"$min": "$percentage"},
+            "highest_percentage": {"$max": "$percentage"},
+        }},
+    ]
+    groups = await db.exam_attempts.aggregate(pipeline).to_list(1)
+    if not groups or not groups[0]["count"]:
+        await db.exam_stats.delete_one({"exam_id": exam_id})
+        return None
+
+    histogram: Dict[str, int] = {}
+    score_buckets: Dict[str, int] = {}
+    digest = TDigest()
+    cursor = db.exam_attempts.find({"exam_id": exam_id}, {"_id": 0, "percentage": 1})
+    async for attempt in cursor:
+        percentage = attempt.get("percentage") or 0
+        key = str(histogram_bin(percentage))
+        histogram[key] = histogram.get(key, 0) + 1
+        bucket = str(score_bucket(percentage))
+        score_buckets[bucket] = score_buckets.get(bucket, 0) + 1
+        digest.add(percentage)
+
+    stats = groups[0]
+    stats.pop("_id", None)
+    stats["exam_id"] = exam_id
+    stats["histogram"] = histogram
+    stats["score_buckets"] = score_buckets
+    stats["digest"] = digest.to_dict()
+    stats["digest_buffer"] = []
+    stats["digest_pending"] = 0
+    stats["digest_version"] = 0
+    stats["updated_at"] = datetime.now(timezone.utc).isoformat()
+    await db.exam_stats.replace_one({"exam_id": exam_id}, stats, upsert=True)
+    return stats
+
+
+async def rebuild_all_exam_stats(db) -> int:
+    exam_ids = await db.exam_attempts.distinct("exam_id")
+    for exam_id in exam_ids:
+        await rebuild_exam_stats(db, exam_id)
+    return len(exam_ids)
+
+
+async def get_exam_stats(db, exam_id: str) -> Optional[Dict[str, Any]]:
+    return await db.exam_stats.find_one({"exam_id": exam_id}, {"_id": 0, "score_buckets": 0})
+
+
+async def get_score_buckets(db, exam_id: str) -> Tuple[Dict[str, int], int]:
+    """(bucket -> attempt count, attempt count) for ranking"""
+    stats = await db.exam_stats.find_one({"exam_id": exam_id}, {"_id": 0, "count": 1, "score_buckets": 1})
+    if not stats:
+        return {}, 0
+    return stats.get("score_buckets") or {}, stats.get("count", 0)
+
+
+def score_digest(stats: Dict[str, Any]) -> TDigest:
+    """Stored digest plus the values still buffered for it"""
+    digest = TDigest.from_dict(stats.get("digest"))
+    digest.update(stats.get("digest_buffer") or [])
+    return digest
+
+
+def histogram_bins(stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+    counts = stats.get("histogram") or {}
+    return [
+        {
+            "from": i * HISTOGRAM_BIN_WIDTH,
+            "to": (i + 1) * HISTOGRAM_BIN_WIDTH,
+            "count": counts.get(str(i), 0),
+        }
+        for i in range(HISTOGRAM_BINS)
+    ]
+
+
+def summarize(stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Analytics response for an exam_stats document"""
+    if not stats or not stats.get("count"):
+        return {
+            "total_attempts": 0,
+            "average_score": 0,
+            "flagged_count": 0,
+            "completion_rate": 0,
+            "percentiles": {},
+            "histogram": histogram_bins({})
+        }
+    digest = score_digest(stats)
+    # Documents written before the digest existed have neither digest nor buffer
+    percentiles = {}
+    if digest.quantile(0.5) is not None:
+        percentiles = {f"p{p}": round(digest.quantile(p / 100), 2) for p in REPORTED_PERCENTILES}
+    return {
+        "total_attempts": stats["count"],
+        "average_score": round(stats["sum_percentage"] / stats["count"], 2),
+        "flagged_count": stats["flagged_count"],
+        "completion_rate": 100.0,
+        "highest_score": stats["highest_percentage"],
+        "lowest_score": stats["lowest_percentage"],
+        "median_score": percentiles.get("p50"),
+        "percentiles": percentiles,
+        "histogram": histogram_bins(stats)
+    }
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Rebuild exam_stats documents from exam_attempts")
+    parser.add_argument('exam_id', nargs='?')
+    parser.add_argument('--all', action='store_true', help="rebuild every exam that has attempts")
+    args = parser.parse_args()
+    if not args.exam_id and not args.all:
+        parser.error("pass an exam_id or --all")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    try:
+        if args.all:
+            count = asyncio.run(rebuild_all_exam_stats(db))
+            print(f"✅ Rebuilt statistics for {count} exams")
+        else:
+            stats = asyncio.run(rebuild_exam_stats(db, args.exam_id))
+            print(f"✅ Rebuilt statistics for exam {args.exam_id}: {summarize(stats)}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Background XLSX export jobs.
+
+POST creates a job and returns at once; the workbook is generated in a
+separate process (spawned, with its own pymongo client) so XML generation
+and compression never compete with the API event loop, and no proxy timeout
+applies. The job document in `export_jobs` carries status and progress, so
+any API worker can answer polls.
+
+Finished files are artifacts keyed by (exam_id, exam version, scores
+version, attempt count); regrade bumps the exam's scores_version, so
+exporting an exam whose questions, scores and attempts have not changed
+since the last export reuses the file without running a job. Artifacts live
+on local disk, or in S3 when EXPORT_S3_BUCKET is set (downloads then
+redirect to a presigned URL).
+
+At most one job per artifact is queued or running: such a job holds the
+artifact key in `active_key`, under a partial unique index, and renews a
+lease while it runs. A job whose lease ran out (its API worker died) is
+marked failed the next time it is polled or the export is requested again,
+and a new job takes its place.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from xlsx_stream import StreamingXlsxWriter, estimate_widths
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+EXPORT_PROJECTION = {
+    "_id": 0, "student_data": 1, "score": 1, "max_score": 1, "percentage": 1,
+    "violations.type": 1, "flagged": 1, "submitted_at": 1,
+}
+EXPORT_SORT = [("submitted_at", 1), ("id", 1)]
+EXPORT_BATCH_SIZE = 1000
+# Rows used to estimate column widths before writing starts
+EXPORT_WIDTH_SAMPLE = 200
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ACTIVE_STATUSES = [STATUS_QUEUED, STATUS_RUNNING]
+
+
+def export_headers(exam: Dict[str, Any]) -> List[str]:
+    headers = [field.replace('_', ' ').title() for field in exam.get('required_fields', [])]
+    headers.extend(['Score', 'Max Score', 'Percentage', 'Violations', 'Flagged', 'Submitted At'])
+    return headers
+
+
+def export_row(attempt: Dict[str, Any], required_fields: List[str]) -> List[Any]:
+    student_data = attempt.get('student_data') or {}
+    return [
+        *(student_data.get(field, '') for field in required_fields),
+        attempt['score'],
+        attempt['max_score'],
+        f"{attempt['percentage']:.2f}%",
+        len(attempt.get('violations') or []),
+        'Yes' if attempt['flagged'] else 'No',
+        attempt['submitted_at'],
+    ]
+
+
+def export_filename(exam: Dict[str, Any]) -> str:
+    return f"{exam['title'].replace(' ', '_')}_results.xlsx"
+
+
+def artifact_key(exam: Dict[str, Any], attempt_count: int) -> str:
+    return f"{exam['id']}/v{exam.get('version', 1)}-s{exam.get('scores_version', 0)}-n{attempt_count}.xlsx"
+
+
+# ============ CHILD PROCESS ============
+
+_sync_clients: Dict[str, Any] = {}
+
+
+def connect_sync_db(mongo_url: str, db_name: str):
+    """pymongo database for the export process (one client per process)"""
+    from pymongo import MongoClient
+
+    client = _sync_clients.get(mongo_url)
+    if client is None:
+        client = _sync_clients[mongo_url] = MongoClient(mongo_url)
+    return client[db_name]
+
+
+def write_export_file(connect: Callable[[], Any], job_id: str, exam: Dict[str, Any], path: str) -> int:
+    """Write the exam's attempts to an XLSX file at `path`; runs in the export process"""
+    db = connect()
+    required_fields = exam.get('required_fields', [])
+    headers = export_headers(exam)
+    cursor = db.exam_attempts.find({"exam_id": exam['id']}, EXPORT_PROJECTION).sort(EXPORT_SORT).batch_size(EXPORT_BATCH_SIZE)
+    db.export_jobs.update_one({"id": job_id}, {"$set": {"status": STATUS_RUNNING, "updated_at": _now()}})
+
+    sample = []
+    for attempt in cursor:
+        sample.append(export_row(attempt, required_fields))
+        if len(sample) >= EXPORT_WIDTH_SAMPLE:
+            break
+
+    # Unique per run: a job taken over from a stalled worker may still be writing
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    rows = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            writer = StreamingXlsxWriter(f, "Exam Results", estimate_widths([headers, *sample], len(headers)))
+            writer.write_header(headers)
+            writer.write_rows(sample)
+            rows = len(sample)
+            batch = []
+            for attempt in cursor:
+                batch.append(export_row(attempt, required_fields))
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    writer.write_rows(batch)
+                    rows += len(batch)
+                    batch = []
+                    db.export_jobs.update_one({"id": job_id}, {"$set": {"progress.rows": rows, "updated_at": _now()}})
+            writer.write_rows(batch)
+            rows += len(batch)
+            writer.close()
+        os.replace(tmp_path, path)
+    except Exception:
+        # A failed run leaves no partial file behind
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return rows
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ============ ARTIFACT STORES ============
+
+class LocalArtifactStore:
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key
+
+    async def exists(self, key: str) -> bool:
+        return self.local_path(key).exists()
+
+    async def publish(self, key: str, path: Path):
+        # Files are written in place; drop older artifacts of the same exam
+        for other in path.parent.glob('*.xlsx'):
+            if other != path:
+                other.unlink(missing_ok=True)
+
+    async def download_url(self, key: str) -> Optional[str]:
+        return None
+
+
+class S3ArtifactStore(LocalArtifactStore):
+    """Files are built in a local scratch directory, then uploaded to S3 and deleted locally."""
+
+    def __init__(self, root: str, bucket: str, prefix: str = 'exports/', url_ttl: int = 3600):
+        import boto3
+
+        super().__init__(root)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_ttl = url_ttl
+        self._s3 = boto3.client('s3')
+
+    async def exists(self, key: str) -> bool:
+        def head():
+            try:
+                self._s3.head_object(Bucket=self.bucket, Key=self.prefix + key)
+                return True
+            except Exception:
+                return False
+        return await asyncio.to_thread(head)
+
+    async def publish(self, key: str, path: Path):
+        await asyncio.to_thread(
+            self._s3.upload_file, str(path), self.bucket, self.prefix + key,
+            ExtraArgs={'ContentType': XLSX_MEDIA_TYPE}
+        )
+        path.unlink(missing_ok=True)
+
+    async def download_url(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(
+            self._s3.generate_presigned_url, 'get_object',
+            Params={'Bucket': self.bucket, 'Key': self.prefix + key}, ExpiresIn=self.url_ttl
+        )
+
+
+def create_artifact_store(root: str, bucket: Optional[str]):
+    if bucket:
+        try:
+            return S3ArtifactStore(root, bucket)
+        except ImportError:
+            logger.warning("EXPORT_S3_BUCKET is set but boto3 is not installed; keeping exports on local disk")
+    return LocalArtifactStore(root)
+
+
+# ============ JOBS ============
+
+class ExportJobs:
+    def __init__(
+        self,
+        get_db: Callable[[], Any],
+        connect: Callable[[], Any],
+        store: LocalArtifactStore,
+        max_workers: int = 2,
+        executor: Optional[Executor] = None,
+        lease_seconds: float = 60.0,
+    ):
+        self.get_db = get_db
+        # Picklable factory for the database handle used inside the export process
+        self.connect = connect
+        self.store = store
+        self.max_workers = max_workers
+        self._executor = executor
+        self.lease_seconds = lease_seconds
+        self._tasks: set = set()
+
+    @property
+    def collection(self):
+        return self.get_db().export_jobs
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("id", 1)], unique=True)
+        await self.collection.create_index([("artifact_key", 1), ("status", 1)])
+        # One queued or running job per artifact
+        await self.collection.create_index(
+            [("active_key", 1)], unique=True, partialFilterExpression={"active_key": {"$type": "string"}}
+        )
+        # Job records expire after a day; artifacts are kept by key
+        await self.collection.create_index([("created_at", 1)], expireAfterSeconds=86400)
+
+    def executor(self) -> Executor:
+        if self._executor is None:
+            # Spawned, not forked: the parent has an event loop and driver threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    async def create(self, exam: Dict[str, Any], tutor_id: str, attempt_count: int) -> Dict[str, Any]:
+        """Start an export of `exam` (or reuse a matching artifact or running job)"""
+        key = artifact_key(exam, attempt_count)
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "exam_id": exam['id'],
+            "tutor_id": tutor_id,
+            "artifact_key": key,
+            "filename": export_filename(exam),
+            "status": STATUS_QUEUED,
+            "progress": {"rows": 0, "total": attempt_count},
+            "created_at": now,
+            "updated_at": now.isoformat(),
+        }
+
+        if await self.store.exists(key):
+            job.update(status=STATUS_DONE, cached=True, progress={"rows": attempt_count, "total": attempt_count})
+            await self.collection.insert_one(job)
+            return _public(job)
+
+        job.update(active_key=key, lease_until=now + timedelta(seconds=self.lease_seconds))
+        while True:
+            try:
+                await self.collection.insert_one(job)
+                break
+            except DuplicateKeyError:
+                running = await self.collection.find_one({"active_key": key}, {"_id": 0})
+                # Retry the insert if the holder just finished or its lease ran out
+                if running and not await self._abandon_if_stale(running):
+                    return _public(running)
+
+        task = asyncio.create_task(self._run(job, exam))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return _public(job)
+
+    async def _abandon_if_stale(self, job: Dict[str, Any]) -> bool:
+        """Mark a queued/running job whose lease expired as failed; True if it no longer holds its key"""
+        lease_until = job.get("lease_until")
+        if job["status"] not in ACTIVE_STATUSES or lease_until is None:
+            return True
+        if lease_until.tzinfo is None:
+            lease_until = lease_until.replace(tzinfo=timezone.utc)
+        if lease_until > datetime.now(timezone.utc):
+            return False
+        await self.collection.update_one(
+            {"id": job["id"], "lease_until": job["lease_until"]},
+            {"$set": {"status": STATUS_FAILED, "error": "Export was interrupted; request it again", "updated_at": _now()},
+             "$unset": {"active_key": "", "lease_until": ""}},
+        )
+        logger.warning(f"Export {job['id']} of exam {job['exam_id']} lost its worker; marked failed")
+        return True
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.collection.update_one(
+                {"id": job_id, "active_key": {"$exists": True}},
+                {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}},
+            )
+
+    async def _run(self, job: Dict[str, Any], exam: Dict[str, Any]):
+        path = self.store.local_path(job['artifact_key'])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        heartbeat = asyncio.create_task(self._heartbeat(job['id']))
+        try:
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(
+                self.executor(), write_export_file, self.connect, job['id'],
+                {k: exam.get(k) for k in ('id', 'title', 'required_fields')}, str(path)
+            )
+            await self.store.publish(job['artifact_key'], path)
+            await self.collection.update_one({"id": job['id']}, {
+                "$set": {"status": STATUS_DONE, "progress.rows": rows, "updated_at": _now()},
+                "$unset": {"active_key": "", "lease_until": ""},
+            })
+            logger.info(f"📦 Export {job['id']} of exam {job['exam_id']} finished ({rows} attempts)")
+        except Exception as e:
+            logger.error(f"Export {job['id']} of exam {job['exam_id']} failed: {e}")
+            await self.collection.update_one({"id": job['id']}, {
+                "$set": {"status": STATUS_FAILED, "error": str(e), "updated_at": _now()},
+                "$unset": {"active_key": "", "lease_until": ""},
+            })
+        finally:
+            heartbeat.cancel()
+
+    async def get(self, job_id: str, tutor_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.collection.find_one({"id": job_id, "tutor_id": tutor_id}, {"_id": 0})
+        if job and job["status"] in ACTIVE_STATUSES and await self._abandon_if_stale(job):
+            job = await self.collection.find_one({"id": job_id}, {"_id": 0})
+        return _public(job) if job else None
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "job_id": job["id"],
+        "exam_id": job["exam_id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "cached": job.get("cached", False),
+        "error": job.get("error"),
+        "artifact_key": job["artifact_key"],
+        "filename": job["filename"],
+    }
@@ -0,0 +1,215 @@
+"""
+Shared server-side grading for server.py and server_enhanced.py.
+
+An exam's answer key is compiled once per exam change into a GradingPlan:
+an index keyed by question_id whose correct answers are already normalized
+(stripped/lowercased strings, parsed numerics, sorted tuples for multiple
+select). Grading a submission is then a single pass over the answers that
+yields the score and the per-answer verdicts together, so the Supabase
+mirror never has to grade the attempt a second time.
+
+The rules follow the grade-exam edge function:
+- short_answer questions and questions without a correct_answer are not
+  auto-graded
+- multiple select answers may be a list, a JSON array string or a
+  '||'-separated string; options compare case-insensitively as sorted lists,
+  so repeated selections count
+- numeric answers compare as numbers, falling back to text comparison when
+  either side is not a number
+- text answers compare after trimming, NFC normalization, lowercasing and
+  collapsing whitespace
+"""
+
+import itertools
+import json
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from cachetools import LRUCache, TTLCache
+
+# Answer key kinds
+KIND_TEXT = 'text'
+KIND_NUMERIC = 'numeric'
+KIND_MULTI = 'multi'
+
+
+def normalize_text(value: Any) -> str:
+    return ' '.join(unicodedata.normalize('NFC', str(value)).split()).lower()
+
+
+def _parse_multi(answer: Any) -> List[Any]:
+    if isinstance(answer, list):
+        return answer
+    if not isinstance(answer, str):
+        return [answer]
+    try:
+        parsed = json.loads(answer)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, list):
+        return parsed
+    return [part for part in answer.split('||') if part]
+
+
+def serialize_answer(answer: Any) -> Optional[str]:
+    """Answer as stored in submission_answers.answer."""
+    if answer is None:
+        return None
+    return json.dumps(answer) if isinstance(answer, list) else str(answer)
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    """Pre-normalized correct answer for one auto-graded question."""
+    question_id: str
+    kind: str
+    points: int
+    canonical: Hashable
+
+    def normalize(self, answer: Any) -> Optional[Hashable]:
+        """Map a student answer onto the same canonical form as the key."""
+        if answer is None:
+            return None
+        if self.kind == KIND_MULTI:
+            return tuple(sorted(str(x).strip().lower() for x in _parse_multi(answer)))
+        if self.kind == KIND_NUMERIC:
+            try:
+                return float(answer)
+            except (TypeError, ValueError):
+                return normalize_text(answer)
+        return normalize_text(answer)
+
+    def is_correct(self, answer: Any) -> bool:
+        return self.normalize(answer) == self.canonical
+
+
+def compile_answer_key(question: Dict[str, Any]) -> Optional[AnswerKey]:
+    """Compile a question into an AnswerKey, or None if it is not auto-graded."""
+    q_correct = question.get('correct_answer', None)
+    if question.get('type') == 'short_answer' or q_correct is None or q_correct == '':
+        # manual grading required
+        return None
+
+    question_id = str(question['id'])
+    points = question.get('points') or 0
+    if isinstance(q_correct, list):
+        return AnswerKey(question_id, KIND_MULTI, points, tuple(sorted(str(x).strip().lower() for x in q_correct)))
+    if question.get('type') == 'numeric':
+        try:
+            canonical = float(q_correct)
+        except (TypeError, ValueError):
+            canonical = normalize_text(q_correct)
+        return AnswerKey(question_id, KIND_NUMERIC, points, canonical)
+    return AnswerKey(question_id, KIND_TEXT, points, normalize_text(q_correct))
+
+
+@dataclass
+class GradeResult:
+    score: int
+    max_score: int
+    percentage: float
+    # One row per answered question of the exam, in exam order:
+    # {question_id, answer, is_correct}
+    verdicts: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class GradingPlan:
+    """Answer-key index for one version of an exam."""
+
+    def __init__(self, exam: Dict[str, Any]):
+        self.exam_id: str = str(exam['id'])
+        self.version: int = exam.get('version', 1)
+        settings = exam.get('settings') or {}
+        self.max_violations: int = settings.get('max_violations', 3)
+        self.show_results_immediately: bool = bool(settings.get('show_results_immediately', False))
+        self.keys: Dict[str, AnswerKey] = {}
+        # Every question in exam order, with its key (None if not auto-graded)
+        self.questions: List[Tuple[str, Optional[AnswerKey]]] = []
+        for question in exam.get('questions') or []:
+            key = compile_answer_key(question)
+            self.questions.append((str(question['id']), key))
+            if key is not None:
+                self.keys[key.question_id] = key
+        self.max_score: int = sum(key.points for key in self.keys.values())
+
+    def grade(self, answers: Iterable[Any]) -> GradeResult:
+        """Score StudentAnswer-like objects (question_id, answer) in one pass."""
+        # First answer per question wins, matching the previous linear scan
+        by_question: Dict[str, Any] = {}
+        for ans in answers:
+            by_question.setdefault(str(ans.question_id), ans.answer)
+
+        score = 0
+        verdicts = []
+        for question_id, key in self.questions:
+            if question_id not in by_question:
+                continue
+            answer = by_question[question_id]
+            is_correct = key is not None and key.is_correct(answer)
+            if is_correct:
+                score += key.points
+            verdicts.append({
+                'question_id': question_id,
+                # The edge function stores a null answer as ''
+                'answer': '' if answer is None else serialize_answer(answer),
+                'is_correct': is_correct,
+            })
+
+        percentage = (score / self.max_score * 100) if self.max_score > 0 else 0
+        return GradeResult(score, self.max_score, percentage, verdicts)
+
+    def is_correct(self, question_id: str, answer: Any) -> bool:
+        key = self.keys.get(question_id)
+        return key is not None and key.is_correct(answer)
+
+
+# Compiled plans per exam_id. Writes invalidate explicitly; the TTL bounds how
+# long another worker process can keep grading against an outdated key.
+_plan_cache: TTLCache = TTLCache(maxsize=1000, ttl=300)
+# Per-exam generation, replaced on invalidation: a plan compiled from a read
+# that started before an invalidation is not cached. Bounded; an exam whose
+# generation was evicted is simply not cached until its next read.
+_plan_generations: LRUCache = LRUCache(maxsize=10000)
+_generation_counter = itertools.count(1)
+
+
+def get_cached_plan(exam_id: str) -> Optional[GradingPlan]:
+    return _plan_cache.get(exam_id)
+
+
+def plan_generation(exam_id: str) -> int:
+    """Take before reading the exam; pass to compile_plan to cache the result."""
+    generation = _plan_generations.get(exam_id)
+    if generation is None:
+        generation = _plan_generations[exam_id] = next(_generation_counter)
+    return generation
+
+
+def compile_plan(exam: Dict[str, Any], generation: Optional[int] = None) -> GradingPlan:
+    """Compile a plan for the given exam document; cached if `generation` is still current."""
+    plan = GradingPlan(exam)
+    if generation is not None and _plan_generations.get(plan.exam_id) == generation:
+        _plan_cache[plan.exam_id] = plan
+    return plan
+
+
+def invalidate_plan(exam_id: str) -> None:
+    _plan_generations[exam_id] = next(_generation_counter)
+    _plan_cache.pop(exam_id, None)
+
+
+def grading_plan_projection() -> Dict[str, int]:
+    """Fields needed to compile a plan (skips question text, options, media)."""
+    return {
+        '_id': 0,
+        'id': 1,
+        'version': 1,
+        'settings.max_violations': 1,
+        'settings.show_results_immediately': 1,
+        'questions.id': 1,
+        'questions.type': 1,
+        'questions.points': 1,
+        'questions.correct_answer': 1,
+    }
+
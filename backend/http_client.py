@@ -0,0 +1,80 @@
+"""
+Shared async HTTP layer for outbound calls (Supabase REST, Ollama).
+
+One pooled httpx.AsyncClient is kept per origin, so every host gets its own
+connection limit and keep-alive pool, and HTTP/2 is negotiated when the h2
+package is installed. Every call takes a deadline that bounds the whole
+request (connect, send and read), so a slow upstream can only stall the
+request that is waiting on it. Servers close the clients in their lifespan.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get('HTTP_MAX_CONNECTIONS_PER_HOST', '50'))
+MAX_KEEPALIVE_PER_HOST = int(os.environ.get('HTTP_MAX_KEEPALIVE_PER_HOST', '20'))
+KEEPALIVE_EXPIRY_SECONDS = 30.0
+DEFAULT_DEADLINE_SECONDS = 10.0
+
+
+class SharedHttpClient:
+    def __init__(
+        self,
+        max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_per_host: int = MAX_KEEPALIVE_PER_HOST,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections_per_host,
+            max_keepalive_connections=max_keepalive_per_host,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+        )
+        # (event loop id, origin) -> client; pooled connections belong to the
+        # loop that opened them, so a new loop gets fresh clients
+        self._clients: Dict[Tuple[int, str], httpx.AsyncClient] = {}
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        parts = urlsplit(url)
+        key = (id(asyncio.get_running_loop()), f"{parts.scheme}://{parts.netloc}")
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(limits=self.limits, http2=HTTP2_AVAILABLE)
+            self._clients[key] = client
+        return client
+
+    async def request(self, method: str, url: str, deadline: float = DEFAULT_DEADLINE_SECONDS, **kwargs) -> httpx.Response:
+        """Send a request that must complete within `deadline` seconds (raises TimeoutError)."""
+        client = self.client_for(url)
+        async with asyncio.timeout(deadline):
+            return await client.request(method, url, timeout=deadline, **kwargs)
+
+    async def get(self, url: str, deadline: float = DEFAULT_DEADLINE_SECONDS, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, deadline=deadline, **kwargs)
+
+    async def post(self, url: str, deadline: float = DEFAULT_DEADLINE_SECONDS, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, deadline=deadline, **kwargs)
+
+    async def aclose(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing HTTP client: {e}")
+
+
+# Process-wide instance shared by server.py, server_enhanced.py and ollama_extractor.py
+http_client = SharedHttpClient()
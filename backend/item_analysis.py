@@ -0,0 +1,159 @@
+"""
+Per-question item analysis over stored exam attempts.
+
+Attempts are streamed from Mongo in batches into the compact code matrix of
+AnswerMatrix (plus a float32 matrix of time_spent_seconds), and all
+statistics for all auto-graded questions come out of one vectorized pass:
+
+- p_value: share of attempts that answered correctly (difficulty)
+- point_biserial: correlation between answering correctly and the score on
+  the remaining questions (discrimination, corrected for the item itself)
+- distractors: how often each distinct answer was chosen
+- median_time_seconds: median time_spent_seconds among attempts that answered
+
+Results are cached per (exam, version, attempt count), so repeated views are
+free until a new attempt arrives or the answer key changes.
+"""
+
+import asyncio
+import logging
+import time
+import warnings
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+from cachetools import TTLCache
+
+from answer_matrix import AnswerMatrix, MISSING, CORRECT
+from grading import GradingPlan, KIND_MULTI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+# Distinct answers listed per question; free-text questions can have thousands
+MAX_DISTRACTORS = 10
+
+_analysis_cache: TTLCache = TTLCache(maxsize=256, ttl=3600)
+
+
+def _display(value: Hashable, kind: str) -> Any:
+    if kind == KIND_MULTI:
+        return sorted(value)
+    return value
+
+
+def _round(value: float, digits: int = 4) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+def analyze(matrix: AnswerMatrix, codes: np.ndarray, times: np.ndarray) -> Dict[str, Any]:
+    """All item statistics for encoded attempts, in one pass over the matrix."""
+    n = codes.shape[0]
+    correct = (codes == CORRECT).astype(np.float64)
+    answered = codes != MISSING
+
+    p_values = correct.mean(axis=0) if n else np.full(matrix.width, np.nan)
+
+    # Corrected point-biserial: correlate each item with the rest of the score
+    totals = correct @ matrix.points
+    rest = totals[:, None] - correct * matrix.points
+    if n:
+        cov = (correct * rest).mean(axis=0) - p_values * rest.mean(axis=0)
+        denom = np.sqrt(p_values * (1 - p_values)) * rest.std(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            point_biserial = np.where(denom > 0, cov / denom, np.nan)
+    else:
+        point_biserial = np.full(matrix.width, np.nan)
+
+    with warnings.catch_warnings():
+        # All-NaN columns (nobody answered) give NaN, which is what we want
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median_times = np.nanmedian(times, axis=0) if n else np.full(matrix.width, np.nan)
+
+    items = []
+    for j, key in enumerate(matrix.keys):
+        vocab = matrix.vocab[j]
+        # Shift by one so MISSING (-1) lands in bin 0
+        counts = np.bincount(codes[:, j] + 1, minlength=len(vocab) + 1)
+        values = [None] * len(vocab)
+        for value, code in vocab.items():
+            values[code] = value
+        order = np.argsort(-counts[1:], kind='stable')[:MAX_DISTRACTORS]
+        distractors = [
+            {
+                "answer": _display(values[code], key.kind),
+                "count": int(counts[code + 1]),
+                "share": _round(counts[code + 1] / n) if n else 0.0,
+                "correct": code == CORRECT,
+            }
+            for code in order.tolist()
+            if counts[code + 1] > 0
+        ]
+        items.append({
+            "question_id": key.question_id,
+            "points": key.points,
+            "answered": int(answered[:, j].sum()),
+            "unanswered": int(counts[0]),
+            "p_value": _round(p_values[j]),
+            "point_biserial": _round(point_biserial[j]),
+            "median_time_seconds": _round(median_times[j], 2),
+            "distractors": distractors,
+        })
+    return {"attempts": n, "items": items}
+
+
+async def compute_item_analysis(db, exam_id: str, plan: GradingPlan, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    started = time.perf_counter()
+    matrix = AnswerMatrix(plan)
+    projection = {'_id': 0, 'answers.question_id': 1, 'answers.answer': 1, 'answers.time_spent_seconds': 1}
+    cursor = db.exam_attempts.find({'exam_id': exam_id}, projection).batch_size(batch_size)
+
+    code_parts: List[np.ndarray] = []
+    time_parts: List[np.ndarray] = []
+    # One batch encodes in a thread while the cursor fetches the next; one at a
+    # time, since AnswerMatrix memoizes normalized answers without locking
+    encoding: Optional[asyncio.Future] = None
+
+    async def collect():
+        codes, times = await encoding
+        code_parts.append(codes)
+        time_parts.append(times)
+
+    batch = []
+    try:
+        async for attempt in cursor:
+            batch.append(attempt)
+            if len(batch) >= batch_size:
+                if encoding is not None:
+                    await collect()
+                encoding = asyncio.ensure_future(asyncio.to_thread(matrix.encode_with_times, batch))
+                batch = []
+        if encoding is not None:
+            await collect()
+            encoding = None
+    finally:
+        if encoding is not None:
+            encoding.cancel()
+    if batch or not code_parts:
+        codes, times = await asyncio.to_thread(matrix.encode_with_times, batch)
+        code_parts.append(codes)
+        time_parts.append(times)
+
+    codes = np.concatenate(code_parts)
+    times = np.concatenate(time_parts)
+    result = await asyncio.to_thread(analyze, matrix, codes, times)
+    result["exam_id"] = exam_id
+    result["version"] = plan.version
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Item analysis of exam {exam_id}: {result['attempts']} attempts in {duration_ms}ms")
+    return result
+
+
+async def get_item_analysis(db, exam_id: str, plan: GradingPlan, attempt_count: int) -> Dict[str, Any]:
+    """Cached item analysis; recomputed when the attempt count or exam version changes"""
+    cache_key = (exam_id, plan.version, attempt_count)
+    result = _analysis_cache.get(cache_key)
+    if result is None:
+        result = await compute_item_analysis(db, exam_id, plan)
+        _analysis_cache[cache_key] = result
+    return result
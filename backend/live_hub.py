@@ -0,0 +1,108 @@
+"""
+In-process pub/sub hub for live proctoring streams.
+
+Tutor dashboards subscribe to an exam and receive its violation and
+submission events as Server-Sent Events instead of polling Mongo. publish()
+encodes an event once and appends the same frame to every subscriber's queue,
+so a hundred proctors on one exam cost one encode and a hundred deque appends.
+
+Each subscriber has a bounded queue: a slow connection loses its oldest
+events rather than growing memory, and is told how many it missed with a
+`lagged` event. Idle streams get a comment line every `heartbeat` seconds so
+proxies keep the connection open and disconnected clients are noticed.
+
+The hub only sees events handled by this worker; with several workers a
+dashboard receives the events of the worker it is connected to.
+"""
+
+import asyncio
+import itertools
+import json
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Set
+
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+def sse_frame(event: str, data: Any, event_id: int) -> bytes:
+    payload = json.dumps(data, separators=(",", ":"), default=str)
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class Subscription:
+    def __init__(self, hub: 'LiveHub', exam_id: str, queue_size: int):
+        self.hub = hub
+        self.exam_id = exam_id
+        self.frames: Deque[bytes] = deque(maxlen=queue_size)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def push(self, frame: bytes):
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1
+        self.frames.append(frame)
+        self._ready.set()
+
+    async def stream(self, heartbeat: float) -> AsyncIterator[bytes]:
+        """SSE bytes for this subscriber until the client goes away"""
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                if not self.frames:
+                    self._ready.clear()
+                    try:
+                        await asyncio.wait_for(self._ready.wait(), timeout=heartbeat)
+                    except asyncio.TimeoutError:
+                        yield HEARTBEAT_FRAME
+                        continue
+                if self.dropped:
+                    yield sse_frame("lagged", {"dropped": self.dropped}, next(self.hub._ids))
+                    self.dropped = 0
+                # Drain everything queued so far as one chunk
+                frames = list(self.frames)
+                self.frames.clear()
+                yield b"".join(frames)
+        finally:
+            self.hub.unsubscribe(self)
+
+
+class LiveHub:
+    def __init__(self, queue_size: int = 256, heartbeat: float = 15.0):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+        self.counters = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def subscribe(self, exam_id: str) -> Subscription:
+        subscription = Subscription(self, exam_id, self.queue_size)
+        self._subscribers.setdefault(exam_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.exam_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.exam_id]
+
+    def publish(self, exam_id: str, event: str, data: Any) -> int:
+        """Queue an event for every subscriber of the exam. Returns the number of subscribers."""
+        subscribers = self._subscribers.get(exam_id)
+        if not subscribers:
+            return 0
+        frame = sse_frame(event, data, next(self._ids))
+        self.counters["published"] += 1
+        for subscription in subscribers:
+            if len(subscription.frames) == subscription.frames.maxlen:
+                self.counters["dropped"] += 1
+            subscription.push(frame)
+        self.counters["delivered"] += len(subscribers)
+        return len(subscribers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "exams": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
@@ -11,6 +11,8 @@ import httpx
 import asyncio
 from pydantic import BaseModel
 
+from http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 # Ollama configuration
@@ -46,9 +48,8 @@ class ExtractedQuestion(BaseModel):
 async def check_ollama_available() -> bool:
     """Check if Ollama is running and accessible"""
     try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            response = await client.get(f"{OLLAMA_BASE_URL}/api/tags")
-            return response.status_code == 200
+        response = await http_client.get(f"{OLLAMA_BASE_URL}/api/tags", deadline=5)
+        return response.status_code == 200
     except Exception as e:
         logger.warning(f"Ollama not available: {e}")
         return False
@@ -57,14 +58,13 @@ async def check_ollama_available() -> bool:
 async def get_available_models() -> List[str]:
     """Get list of available Ollama models"""
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(f"{OLLAMA_BASE_URL}/api/tags")
-            if response.status_code == 200:
-                data = response.json()
-                models = [model["name"] for model in data.get("models", [])]
-                logger.info(f"Available Ollama models: {models}")
-                return models
-            return []
+        response = await http_client.get(f"{OLLAMA_BASE_URL}/api/tags", deadline=10)
+        if response.status_code == 200:
+            data = response.json()
+            models = [model["name"] for model in data.get("models", [])]
+            logger.info(f"Available Ollama models: {models}")
+            return models
+        return []
     except Exception as e:
         logger.error(f"Error fetching Ollama models: {e}")
         return []
@@ -113,95 +113,95 @@ Extract {max_questions} questions maximum. Return ONLY valid JSON."""
 
         logger.info(f"🤖 Calling Ollama ({OLLAMA_MODEL}) for question extraction...")
 
-        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
-            response = await client.post(
-                f"{OLLAMA_BASE_URL}/api/generate",
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "temperature": 0.2,  # Lower temperature for consistency
-                    "top_p": 0.9,
-                    "top_k": 40,
-                },
-            )
-
-            if response.status_code != 200:
-                logger.error(f"❌ Ollama error ({response.status_code}): {response.text}")
-                return None
-
-            result = response.json()
-            generated_text = result.get("response", "")
-
-            if not generated_text:
-                logger.warning("No response from Ollama")
-                return None
-
-            logger.info(f"📥 Ollama response received ({len(generated_text)} chars)")
-
-            # Clean response: extract JSON if wrapped in markdown
-            json_text = generated_text
-            if "```json" in json_text:
-                json_text = json_text.split("```json")[1].split("```")[0]
-            elif "```" in json_text:
-                json_text = json_text.split("```")[1].split("```")[0]
-
-            json_text = json_text.strip()
+        response = await http_client.post(
+            f"{OLLAMA_BASE_URL}/api/generate",
+            deadline=REQUEST_TIMEOUT,
+            json={
+                "model": OLLAMA_MODEL,
+                "prompt": prompt,
+                "stream": False,
+                "temperature": 0.2,  # Lower temperature for consistency
+                "top_p": 0.9,
+                "top_k": 40,
+            },
+        )
+
+        if response.status_code != 200:
+            logger.error(f"❌ Ollama error ({response.status_code}): {response.text}")
+            return None
+
+        result = response.json()
+        generated_text = result.get("response", "")
+
+        if not generated_text:
+            logger.warning("No response from Ollama")
+            return None
+
+        logger.info(f"📥 Ollama response received ({len(generated_text)} chars)")
 
+        # Clean response: extract JSON if wrapped in markdown
+        json_text = generated_text
+        if "```json" in json_text:
+            json_text = json_text.split("```json")[1].split("```")[0]
+        elif "```" in json_text:
+            json_text = json_text.split("```")[1].split("```")[0]
+
+        json_text = json_text.strip()
+
+        try:
+            questions_data = json.loads(json_text)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse Ollama JSON response: {e}")
+            logger.error(f"Response was: {json_text[:500]}")
+            return None
+
+        if not isinstance(questions_data, list):
+            logger.warning("Response is not a JSON array")
+            return None
+
+        if len(questions_data) == 0:
+            logger.warning("No questions in Ollama response")
+            return None
+
+        # Validate and normalize questions
+        extracted_questions = []
+        for q in questions_data:
             try:
-                questions_data = json.loads(json_text)
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse Ollama JSON response: {e}")
-                logger.error(f"Response was: {json_text[:500]}")
-                return None
-
-            if not isinstance(questions_data, list):
-                logger.warning("Response is not a JSON array")
-                return None
-
-            if len(questions_data) == 0:
-                logger.warning("No questions in Ollama response")
-                return None
-
-            # Validate and normalize questions
-            extracted_questions = []
-            for q in questions_data:
-                try:
-                    # Validate required fields
-                    if not q.get("question_text") or len(q.get("question_text", "").strip()) < 5:
-                        continue
-
-                    # Normalize type
-                    q_type = q.get("type", "multiple_choice").lower()
-                    if q_type not in ["multiple_choice", "true_false", "fill_blank", "short_answer"]:
-                        q_type = "multiple_choice"
-
-                    # Normalize difficulty
-                    difficulty = q.get("difficulty", "medium").lower()
-                    if difficulty not in ["easy", "medium", "hard"]:
-                        difficulty = "medium"
-
-                    extracted_question = ExtractedQuestion(
-                        type=q_type,
-                        question_text=q.get("question_text", "").strip(),
-                        options=q.get("options", []) or [],
-                        correct_answer=q.get("correct_answer"),
-                        points=max(1, min(100, int(q.get("points", 1)))),
-                        difficulty=difficulty,
-                    )
-                    extracted_questions.append(extracted_question)
-                except Exception as e:
-                    logger.warning(f"Skipping invalid question: {e}")
+                # Validate required fields
+                if not q.get("question_text") or len(q.get("question_text", "").strip()) < 5:
                     continue
 
-            if extracted_questions:
-                logger.info(f"✅ Successfully extracted {len(extracted_questions)} questions with Ollama")
-                return extracted_questions
-            else:
-                logger.warning("No valid questions extracted after validation")
-                return None
+                # Normalize type
+                q_type = q.get("type", "multiple_choice").lower()
+                if q_type not in ["multiple_choice", "true_false", "fill_blank", "short_answer"]:
+                    q_type = "multiple_choice"
+
+                # Normalize difficulty
+                difficulty = q.get("difficulty", "medium").lower()
+                if difficulty not in ["easy", "medium", "hard"]:
+                    difficulty = "medium"
+
+                extracted_question = ExtractedQuestion(
+                    type=q_type,
+                    question_text=q.get("question_text", "").strip(),
+                    options=q.get("options", []) or [],
+                    correct_answer=q.get("correct_answer"),
+                    points=max(1, min(100, int(q.get("points", 1)))),
+                    difficulty=difficulty,
+                )
+                extracted_questions.append(extracted_question)
+            except Exception as e:
+                logger.warning(f"Skipping invalid question: {e}")
+                continue
+
+        if extracted_questions:
+            logger.info(f"✅ Successfully extracted {len(extracted_questions)} questions with Ollama")
+            return extracted_questions
+        else:
+            logger.warning("No valid questions extracted after validation")
+            return None
 
-    except asyncio.TimeoutError:
+    except (asyncio.TimeoutError, httpx.TimeoutException):
         logger.error(f"⏱️  Ollama request timed out after {REQUEST_TIMEOUT}s - try again later")
         return None
     except httpx.ConnectError as e:
@@ -0,0 +1,56 @@
+"""
+Keyset (cursor) pagination over exam attempts.
+
+Pages are ordered by (submitted_at, id) and continue strictly after the last
+row of the previous page, so every page is an index range scan on
+(exam_id, submitted_at, id) no matter how deep the client pages, and rows
+inserted meanwhile never shift or repeat a page. The cursor is opaque to
+clients: url-safe base64 of the last row's sort key.
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+SORT_KEY = [("submitted_at", 1), ("id", 1)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([row["submitted_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        submitted_at, attempt_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    if not isinstance(submitted_at, str) or not isinstance(attempt_id, str):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return submitted_at, attempt_id
+
+
+def keyset_filter(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict `query` to rows strictly after `cursor` in (submitted_at, id) order."""
+    if not cursor:
+        return query
+    submitted_at, attempt_id = decode_cursor(cursor)
+    return {
+        **query,
+        "$or": [
+            {"submitted_at": {"$gt": submitted_at}},
+            {"submitted_at": submitted_at, "id": {"$gt": attempt_id}},
+        ],
+    }
+
+
+def build_projection(fields: List[str], always: List[str]) -> Dict[str, int]:
+    projection = {"_id": 0}
+    for field in [*always, *fields]:
+        projection[field] = 1
+    return projection
@@ -0,0 +1,117 @@
+"""
+Password hashing off the event loop, with admission control.
+
+bcrypt takes a few hundred milliseconds of CPU per call by design. Calling it
+inline in an async handler stalls every other request on the worker, so a
+wave of tutor logins before an exam would freeze students' requests too.
+
+PasswordHasher runs bcrypt on a small dedicated thread pool (bcrypt releases
+the GIL while hashing, so threads run in parallel with the event loop) and
+bounds how much work may wait for it: once `workers + max_queue` calls are
+pending, new calls fail fast with HashingOverloaded carrying a Retry-After
+estimate instead of queueing without limit. A call counts as pending until
+its thread finishes, even if the request awaiting it was cancelled. Hash latency and queue wait are
+recorded for the metrics endpoint.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+import bcrypt
+
+# Samples kept for latency percentiles
+WINDOW = 1000
+
+
+class HashingOverloaded(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Password hashing is overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _percentile(samples, q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 1)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = 2, max_queue: int = 32, rounds: int = 12):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self._latencies: Deque[float] = deque(maxlen=WINDOW)
+        self._waits: Deque[float] = deque(maxlen=WINDOW)
+        self.counters = {"hashed": 0, "verified": 0, "rejected": 0}
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        return self._executor
+
+    def retry_after(self) -> int:
+        # Time for the current backlog to drain at the observed hash latency
+        latency = sum(self._latencies) / len(self._latencies) if self._latencies else 0.3
+        return max(1, math.ceil(self.pending / self.workers * latency))
+
+    async def _submit(self, fn: Callable[..., Any], *args) -> Any:
+        if self.pending >= self.workers + self.max_queue:
+            self.counters["rejected"] += 1
+            raise HashingOverloaded(self.retry_after())
+
+        enqueued = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._waits.append(started - enqueued)
+                self._latencies.append(time.perf_counter() - started)
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future = self._pool().submit(timed)
+        # Released when the thread is done, not when the caller stops waiting:
+        # a cancelled request's hash still occupies a worker until it finishes
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._submit(
+            lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)).decode('utf-8')
+        )
+        self.counters["hashed"] += 1
+        return hashed
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        ok = await self._submit(lambda: bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8')))
+        self.counters["verified"] += 1
+        return ok
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "hash_ms_p50": _percentile(self._latencies, 0.5),
+            "hash_ms_p95": _percentile(self._latencies, 0.95),
+            "queue_wait_ms_p50": _percentile(self._waits, 0.5),
+            "queue_wait_ms_p95": _percentile(self._waits, 0.95),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
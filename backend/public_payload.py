@@ -0,0 +1,116 @@
+"""
+Ready-to-send public exam payloads.
+
+A sanitized exam is serialized to JSON once per version, together with gzip
+(and brotli, when installed) variants and a strong ETag derived from a
+SHA-256 of the JSON bytes. Cache hits then only pick a variant and write
+bytes: no re-serialization and no compression per request. Clients that
+already have the version get a 304, and every version is also addressable
+by its content hash so browsers and CDNs can cache it indefinitely.
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Small payloads are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class PublicExamPayload:
+    __slots__ = ('exam_id', 'body', 'gzip', 'br', 'digest', 'start_date', 'end_date')
+
+    def __init__(self, exam_id: str, body: bytes, start_date: Optional[str] = None, end_date: Optional[str] = None):
+        self.exam_id = exam_id
+        self.body = body
+        self.start_date = start_date
+        self.end_date = end_date
+        self.digest: str = hashlib.sha256(body).hexdigest()[:32]
+        self.gzip: Optional[bytes] = None
+        self.br: Optional[bytes] = None
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.gzip = gzip.compress(body, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.br = brotli.compress(body, quality=9)
+
+    @classmethod
+    def from_body(cls, body: bytes) -> 'PublicExamPayload':
+        """Rebuild a payload from its JSON bytes (e.g. read from the shared cache)"""
+        exam = json.loads(body)
+        settings = exam.get('settings') or {}
+        return cls(exam['id'], body, settings.get('start_date'), settings.get('end_date'))
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip or b'') + len(self.br or b'')
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        # Each content-coding is a different representation, so it gets its own strong tag
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+
+def serialize_exam(exam: Dict[str, Any]) -> bytes:
+    return json.dumps(exam, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.split(','):
+        token, _, params = part.strip().partition(';')
+        if token.strip().lower() != coding:
+            continue
+        params = params.strip().replace(' ', '')
+        return params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def _etag_matches(if_none_match: str, digest: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"').split('-', 1)[0] == digest:
+            return True
+    return False
+
+
+def payload_response(
+    payload: PublicExamPayload,
+    request: Request,
+    cache_control: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Pick the best pre-encoded variant for the request, or answer 304."""
+    accept_encoding = request.headers.get('accept-encoding', '')
+    encoding = None
+    body = payload.body
+    if payload.br is not None and _accepts(accept_encoding, 'br'):
+        encoding, body = 'br', payload.br
+    elif payload.gzip is not None and _accepts(accept_encoding, 'gzip'):
+        encoding, body = 'gzip', payload.gzip
+
+    response_headers = {
+        'ETag': payload.etag(encoding),
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+        **(headers or {}),
+    }
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and _etag_matches(if_none_match, payload.digest):
+        return Response(status_code=304, headers=response_headers)
+
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+    return Response(content=body, media_type='application/json', headers=response_headers)
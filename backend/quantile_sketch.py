@@ -0,0 +1,155 @@
+"""
+Merging t-digest for streaming quantiles.
+
+A t-digest summarizes any number of values in at most ~2 * compression
+centroids, with the finest resolution at the tails, where percentiles matter
+most. Digests merge by simply combining centroids, so per-exam digests can be
+built incrementally and persisted as a small document.
+
+Reference: Dunning & Ertl, "Computing Extremely Accurate Quantiles Using
+t-Digests" (merging variant with the k1 scale function).
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_COMPRESSION = 100
+
+
+class TDigest:
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self._centroids: List[Tuple[float, float]] = []
+        self._buffer: List[Tuple[float, float]] = []
+        self._buffer_limit = int(5 * compression)
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    @property
+    def count(self) -> float:
+        return sum(w for _, w in self._centroids) + sum(w for _, w in self._buffer)
+
+    def add(self, value: float, weight: float = 1):
+        value = float(value)
+        self._buffer.append((value, weight))
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self._buffer) >= self._buffer_limit:
+            self._compress()
+
+    def update(self, values: Iterable[float]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'TDigest'):
+        other._compress()
+        if not other._centroids:
+            return
+        self._buffer.extend(other._centroids)
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in points)
+
+        merged: List[Tuple[float, float]] = []
+        mean, weight = points[0]
+        cumulative = 0.0
+        k_lower = self._k(0.0)
+        for value, w in points[1:]:
+            q_upper = (cumulative + weight + w) / total
+            if self._k(min(q_upper, 1.0)) - k_lower <= 1:
+                # Fold into the current centroid
+                weight += w
+                mean += (value - mean) * w / weight
+            else:
+                merged.append((mean, weight))
+                cumulative += weight
+                k_lower = self._k(min(cumulative / total, 1.0))
+                mean, weight = value, w
+        merged.append((mean, weight))
+        self._centroids = merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile q (0..1), or None when empty."""
+        self._compress()
+        if not self._centroids:
+            return None
+        q = min(max(q, 0.0), 1.0)
+        centroids = self._centroids
+        total = sum(w for _, w in centroids)
+        if len(centroids) == 1:
+            return centroids[0][0]
+
+        target = q * total
+        cumulative = 0.0
+        previous_center = 0.0
+        previous_mean = self.min
+        for mean, weight in centroids:
+            center = cumulative + weight / 2
+            if target < center:
+                if center == previous_center:
+                    return mean
+                # Interpolate between the previous centroid (or min) and this one
+                t = (target - previous_center) / (center - previous_center)
+                return previous_mean + t * (mean - previous_mean)
+            cumulative += weight
+            previous_center = center
+            previous_mean = mean
+        if total == previous_center:
+            return self.max
+        t = (target - previous_center) / (total - previous_center)
+        return previous_mean + t * (self.max - previous_mean)
+
+    def cdf(self, value: float) -> Optional[float]:
+        """Estimated share of values <= value, or None when empty."""
+        self._compress()
+        if not self._centroids:
+            return None
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        total = sum(w for _, w in self._centroids)
+        cumulative = 0.0
+        previous_center = 0.0
+        previous_mean = self.min
+        for mean, weight in self._centroids:
+            center = cumulative + weight / 2
+            if value < mean:
+                span = mean - previous_mean
+                t = (value - previous_mean) / span if span > 0 else 1.0
+                return (previous_center + t * (center - previous_center)) / total
+            cumulative += weight
+            previous_center = center
+            previous_mean = mean
+        span = self.max - previous_mean
+        t = (value - previous_mean) / span if span > 0 else 1.0
+        return (previous_center + t * (total - previous_center)) / total
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._compress()
+        return {
+            "compression": self.compression,
+            "min": self.min,
+            "max": self.max,
+            "centroids": [[mean, weight] for mean, weight in self._centroids],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'TDigest':
+        if not data:
+            return cls()
+        digest = cls(data.get("compression", DEFAULT_COMPRESSION))
+        digest._centroids = [(float(mean), float(weight)) for mean, weight in data.get("centroids") or []]
+        digest.min = data.get("min")
+        digest.max = data.get("max")
+        return digest
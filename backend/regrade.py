@@ -0,0 +1,172 @@
+"""
+Bulk regrade of stored exam attempts after an answer-key change.
+
+Attempts are streamed from Mongo in batches, encoded into an attempt x
+question matrix (see answer_matrix.py), scored in one vectorized pass against
+the current key and written back with unordered bulk_write batches. Only
+attempts whose score actually changed are rewritten; when any did, the
+exam's statistics document is rebuilt and its scores_version bumped, which
+retires cached exports of the old scores.
+
+Progress is kept in `regrade_status`, one document per exam updated after
+every batch ({status, done, total, changed}), so the tutor dashboard can
+poll GET /api/exams/{exam_id}/regrade while a regrade started from the API
+or this CLI runs.
+
+Usage:
+    python regrade.py <exam_id> [--batch-size 5000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from answer_matrix import AnswerMatrix
+from exam_stats import rebuild_exam_stats
+from grading import GradingPlan, compile_plan, grading_plan_projection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+ProgressCallback = Callable[[int, int], None]
+
+
+async def _write_batch(db, attempts, matrix: AnswerMatrix) -> int:
+    codes = matrix.encode(attempts)
+    scores = matrix.score(codes)
+    max_score = matrix.plan.max_score
+    percentages = scores / max_score * 100 if max_score > 0 else np.zeros_like(scores)
+
+    updates = []
+    for attempt, score, percentage in zip(attempts, scores.tolist(), percentages.tolist()):
+        score = int(round(score))
+        if (attempt.get('score') == score and attempt.get('max_score') == max_score
+                and attempt.get('percentage') == percentage):
+            continue
+        updates.append(UpdateOne(
+            {'id': attempt['id']},
+            {'$set': {'score': score, 'max_score': max_score, 'percentage': percentage}}
+        ))
+    if updates:
+        await db.exam_attempts.bulk_write(updates, ordered=False)
+    return len(updates)
+
+
+async def ensure_indexes(db):
+    await db.regrade_status.create_index([('exam_id', 1)], unique=True)
+
+
+async def _set_status(db, exam_id: str, fields: Dict[str, Any]):
+    await db.regrade_status.update_one(
+        {'exam_id': exam_id},
+        {'$set': {**fields, 'updated_at': datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+    )
+
+
+async def get_regrade_status(db, exam_id: str) -> Optional[Dict[str, Any]]:
+    """Progress of the exam's latest regrade, or None if it was never regraded"""
+    return await db.regrade_status.find_one({'exam_id': exam_id}, {'_id': 0})
+
+
+async def regrade_exam(
+    db,
+    exam_id: str,
+    plan: Optional[GradingPlan] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    Rescore every attempt of an exam against its current answer key.
+    Returns: {exam_id, regraded, changed, duration_ms}
+    """
+    started = time.perf_counter()
+    if plan is None:
+        exam = await db.exams.find_one({'id': exam_id}, grading_plan_projection())
+        if not exam:
+            raise LookupError(f"Exam {exam_id} not found")
+        plan = compile_plan(exam)
+
+    matrix = AnswerMatrix(plan)
+    total = await db.exam_attempts.count_documents({'exam_id': exam_id})
+    projection = {'_id': 0, 'id': 1, 'answers': 1, 'score': 1, 'max_score': 1, 'percentage': 1}
+    cursor = db.exam_attempts.find({'exam_id': exam_id}, projection).batch_size(batch_size)
+
+    done = 0
+    changed = 0
+
+    async def regrade_batch(batch):
+        nonlocal done, changed
+        changed += await _write_batch(db, batch, matrix)
+        done += len(batch)
+        await _set_status(db, exam_id, {'done': done, 'changed': changed})
+        if on_progress:
+            on_progress(done, total)
+
+    await _set_status(db, exam_id, {
+        'status': STATUS_RUNNING, 'done': 0, 'total': total, 'changed': 0,
+        'started_at': datetime.now(timezone.utc).isoformat(), 'duration_ms': None, 'error': None,
+    })
+    try:
+        batch = []
+        async for attempt in cursor:
+            batch.append(attempt)
+            if len(batch) >= batch_size:
+                await regrade_batch(batch)
+                batch = []
+        if batch:
+            await regrade_batch(batch)
+
+        if changed:
+            await rebuild_exam_stats(db, exam_id)
+            await db.exams.update_one({'id': exam_id}, {'$inc': {'scores_version': 1}})
+    except Exception as e:
+        await _set_status(db, exam_id, {'status': STATUS_FAILED, 'error': str(e)})
+        raise
+
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    await _set_status(db, exam_id, {'status': STATUS_DONE, 'duration_ms': duration_ms})
+    logger.info(f"Regraded {done} attempts of exam {exam_id} ({changed} changed) in {duration_ms}ms")
+    return {'exam_id': exam_id, 'regraded': done, 'changed': changed, 'duration_ms': duration_ms}
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Regrade all attempts of an exam against its current answer key")
+    parser.add_argument('exam_id')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    def report(done: int, total: int):
+        print(f"\r{done}/{total} attempts regraded", end='', flush=True)
+
+    try:
+        result = asyncio.run(regrade_exam(db, args.exam_id, batch_size=args.batch_size, on_progress=report))
+        print()
+        print(f"✅ {result['regraded']} attempts regraded, {result['changed']} changed in {result['duration_ms']}ms")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
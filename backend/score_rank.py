@@ -0,0 +1,110 @@
+"""
+O(log n) percentile ranks of exam scores.
+
+Percentages are bucketed at 0.1-point resolution (1001 buckets). The
+authoritative bucket counts live in each exam's exam_stats document
+(`score_buckets`, $inc'd by every submission in any worker); each worker
+keeps a Fenwick tree over them so a rank is two prefix sums.
+
+When the stored attempt count shows that another worker recorded attempts
+this tree has not seen, the tree is rebuilt from the bucket counts the
+submission's own $inc returned (loaded from Mongo only if the caller has
+none). A regrade invalidates the trees in every worker; they also expire
+after a while.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+
+BUCKETS_PER_POINT = 10
+NUM_BUCKETS = 100 * BUCKETS_PER_POINT + 1
+
+BucketLoader = Callable[[str], Awaitable[Tuple[Dict[str, int], int]]]
+
+
+def score_bucket(percentage: float) -> int:
+    return min(max(int(round(percentage * BUCKETS_PER_POINT)), 0), NUM_BUCKETS - 1)
+
+
+class FenwickTree:
+    """Binary indexed tree of counts: point update and prefix sum in O(log n)."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tree = [0] * (size + 1)
+        self.total = 0
+
+    @classmethod
+    def from_counts(cls, counts: Dict[int, int], size: int) -> 'FenwickTree':
+        tree = cls(size)
+        values = [0] * (size + 1)
+        for i, count in counts.items():
+            values[i + 1] += count
+            tree.total += count
+        # O(n) construction: push each node's sum to its parent
+        for i in range(1, size + 1):
+            tree._tree[i] += values[i]
+            parent = i + (i & -i)
+            if parent <= size:
+                tree._tree[parent] += tree._tree[i]
+        return tree
+
+    def add(self, index: int, delta: int = 1):
+        self.total += delta
+        i = index + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index: int) -> int:
+        """Sum of counts at positions [0, index)."""
+        total = 0
+        i = index
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+class ScoreRanks:
+    def __init__(self, load_buckets: BucketLoader, maxsize: int = 1000, ttl: float = 300):
+        self.load_buckets = load_buckets
+        self._trees: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def record(
+        self, exam_id: str, percentage: float, stored_count: int, stored_buckets: Optional[Dict[str, int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Account for a just-stored attempt and return its rank.
+        `stored_count` and `stored_buckets` are the exam's attempt count and
+        score_buckets in exam_stats after the attempt was recorded.
+        """
+        bucket = score_bucket(percentage)
+        tree: Optional[FenwickTree] = self._trees.get(exam_id)
+        if tree is not None and tree.total + 1 == stored_count:
+            tree.add(bucket)
+        else:
+            # Other workers recorded attempts too (or first use): rebuild from the stored counts
+            counts = stored_buckets
+            if counts is None:
+                counts, _ = await self.load_buckets(exam_id)
+            tree = FenwickTree.from_counts({int(b): c for b, c in counts.items()}, NUM_BUCKETS)
+            self._trees[exam_id] = tree
+        return self.rank_in(tree, bucket)
+
+    @staticmethod
+    def rank_in(tree: FenwickTree, bucket: int) -> Dict[str, Any]:
+        below = tree.prefix_sum(bucket)
+        at_or_below = tree.prefix_sum(bucket + 1)
+        total = max(tree.total, 1)
+        return {
+            # Share of attempts with a strictly lower score ("better than X%")
+            "percentile_rank": round(100 * below / total, 1),
+            # Competition rank: 1 + number of attempts with a strictly higher score
+            "rank": tree.total - at_or_below + 1,
+            "out_of": tree.total,
+        }
+
+    def invalidate(self, exam_id: str):
+        self._trees.pop(exam_id, None)
@@ -1,26 +1,52 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, status
 from contextlib import asynccontextmanager
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse, RedirectResponse, Response
+from fastapi.responses import StreamingResponse, RedirectResponse, Response, JSONResponse, FileResponse
+from fastapi.encoders import jsonable_encoder
 from cachetools import TTLCache
 
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional, Dict, Any
 import json
 import uuid
+import tempfile
+import zipfile
+from functools import partial
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
-import requests
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from io import BytesIO
+from pymongo.errors import DuplicateKeyError
+
+from grading import compile_plan, get_cached_plan, invalidate_plan, grading_plan_projection, plan_generation
+from regrade import regrade_exam, get_regrade_status, ensure_indexes as ensure_regrade_indexes
+from supabase_outbox import SupabaseOutbox, build_outbox_entry
+from http_client import http_client
+from exam_cache import PublicExamCache, ExamPrewarmer
+from public_payload import PublicExamPayload, payload_response, serialize_exam, IMMUTABLE_CACHE_CONTROL
+from shared_cache import SharedExamTier, create_shared_cache
+import exam_stats
+from item_analysis import get_item_analysis
+from score_rank import ScoreRanks
+from xlsx_stream import ChunkSink, StreamingXlsxWriter, estimate_widths
+from export_jobs import (
+    ExportJobs, connect_sync_db, create_artifact_store, export_filename, export_headers, export_row,
+    EXPORT_BATCH_SIZE, EXPORT_PROJECTION, EXPORT_SORT, EXPORT_WIDTH_SAMPLE, XLSX_MEDIA_TYPE,
+)
+from password_hashing import PasswordHasher, HashingOverloaded
+from auth_cache import TokenCache, TutorCache
+from violation_buffer import ViolationBuffer
+from live_hub import LiveHub
+import violation_series
+from attempt_writer import BatchWriter
+from idempotency import SubmissionDeduper, submission_key, IDEMPOTENCY_HEADER, REPLAYED_HEADER
+from columnar_export import export_tutor_attempts, parse_time, FORMATS as COLUMNAR_FORMATS
+from pagination import InvalidCursor, SORT_KEY, build_projection, encode_cursor, keyset_filter
 
 
 ROOT_DIR = Path(__file__).parent
@@ -39,9 +65,38 @@ SUPABASE_SERVICE_ROLE = os.environ.get('SUPABASE_SERVICE_ROLE')
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
+# Verified tokens are remembered until their exp; profiles and exam owners briefly
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+TUTOR_CACHE_TTL_SECONDS = 60
+# Submitted attempts are inserted in groups of up to this many, waiting at most this long
+ATTEMPT_BATCH_SIZE = int(os.environ.get('ATTEMPT_BATCH_SIZE', '256'))
+ATTEMPT_BATCH_DELAY_MS = float(os.environ.get('ATTEMPT_BATCH_DELAY_MS', '5'))
+# Results of recent submissions are kept this long to answer client retries
+SUBMISSION_RESULT_TTL_SECONDS = 600
+# Violation logs are written in batches of this size, or at least this often
+VIOLATION_BATCH_SIZE = int(os.environ.get('VIOLATION_BATCH_SIZE', '500'))
+VIOLATION_FLUSH_SECONDS = float(os.environ.get('VIOLATION_FLUSH_SECONDS', '1'))
+# Most events accepted in one batch report
+VIOLATION_BATCH_MAX_EVENTS = 200
+# Violation events expire after this many days (per-minute rollups are kept)
+VIOLATION_LOG_RETENTION_DAYS = float(os.environ.get('VIOLATION_LOG_RETENTION_DAYS', str(violation_series.DEFAULT_RETENTION_DAYS)))
+# Live proctoring streams: events queued per connection, seconds between heartbeats
+LIVE_QUEUE_SIZE = int(os.environ.get('LIVE_QUEUE_SIZE', '256'))
+LIVE_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_HEARTBEAT_SECONDS', '15'))
 
 # In-memory cache for public exams (prevents DB spikes)
-exam_cache = TTLCache(maxsize=1000, ttl=60)
+PUBLIC_EXAM_TTL_SECONDS = 60
+PUBLIC_EXAM_STALE_SECONDS = 600
+# Per-worker memory budget for cached public exams (all encodings included)
+PUBLIC_EXAM_CACHE_MAX_BYTES = int(os.environ.get('PUBLIC_EXAM_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# Exams starting within this many minutes are loaded into the cache ahead of time
+EXAM_PREWARM_LEAD_MINUTES = float(os.environ.get('EXAM_PREWARM_LEAD_MINUTES', '5'))
+# Cache shared by all workers (Redis); unset means an in-process stand-in
+REDIS_URL = os.environ.get('REDIS_URL')
+# Also invalidate on writes made outside this API (requires a replica set)
+EXAM_CHANGE_STREAM = os.environ.get('EXAM_CHANGE_STREAM', '').lower() in ('1', 'true', 'yes')
+# Every worker sees each change; the first to claim it broadcasts, claims last this long
+EXAM_CHANGE_CLAIM_SECONDS = 300
 
 
 # Lifespan context manager
@@ -57,14 +112,64 @@ async def lifespan(app: FastAPI):
         # Attempts collection
         await db.exam_attempts.create_index([("exam_id", 1)])
         await db.exam_attempts.create_index([("student_data.email", 1)])
-        await db.exam_attempts.create_index([("created_at", -1)])
+        # Attempt listing pages through (exam_id, submitted_at, id) with keyset cursors
+        await db.exam_attempts.create_index([("exam_id", 1), ("submitted_at", 1), ("id", 1)])
+        # One attempt per submission; retries carry the same key
+        await db.exam_attempts.create_index(
+            [("exam_id", 1), ("idempotency_key", 1)],
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$type": "string"}}
+        )
+        
+        # Per-exam statistics
+        await exam_stats.ensure_indexes(db)
+        # Regrade progress
+        await ensure_regrade_indexes(db)
+        # Top-K rankings read this index in order instead of sorting attempts
+        await db.exam_attempts.create_index([("exam_id", 1), ("percentage", -1), ("submitted_at", 1)])
+        
+        # Supabase mirror outbox
+        await supabase_outbox.ensure_indexes()
+        
+        # Export jobs
+        await export_jobs.ensure_indexes()
+        
+        # Violation logs (time series with TTL) and their per-minute rollups
+        await violation_series.ensure_collections(db, VIOLATION_LOG_RETENTION_DAYS)
         
         logger.info("✅ MongoDB Indexes created/verified")
     except Exception as e:
         logger.error(f"❌ Failed to create indexes: {e}")
+    
+    if EXAM_CHANGE_STREAM:
+        try:
+            # Delete events carry only _id; the pre-image gives the exam id (MongoDB 6.0+)
+            await db.command("collMod", "exams", changeStreamPreAndPostImages={"enabled": True})
+        except Exception as e:
+            logger.warning(f"⚠️ Exam pre-images unavailable, external deletes will not invalidate caches: {e}")
+    
+    supabase_outbox.start()
+    exam_prewarmer.start()
+    violation_buffer.start()
+    await shared_cache_backend.start()
+    change_stream_task = asyncio.create_task(watch_exam_changes()) if EXAM_CHANGE_STREAM else None
         
     yield
     # Shutdown
+    if change_stream_task:
+        change_stream_task.cancel()
+        try:
+            await change_stream_task
+        except asyncio.CancelledError:
+            pass
+    await shared_cache_backend.close()
+    await export_jobs.shutdown()
+    await violation_buffer.stop()
+    await attempt_writer.close()
+    password_hasher.shutdown()
+    await exam_prewarmer.stop()
+    await supabase_outbox.stop()
+    await http_client.aclose()
     client.close()
 
 # Create the main app without a prefix
@@ -98,6 +203,7 @@ class Tutor(BaseModel):
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 class QuestionCreate(BaseModel):
+    id: Optional[str] = None  # keep an existing question's id when updating an exam
     type: str  # 'multiple_choice', 'true_false', 'short_answer'
     question_text: str
     options: Optional[List[str]] = None
@@ -145,6 +251,7 @@ class Exam(BaseModel):
     settings: ExamSettings
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     is_active: bool = True
+    version: int = 1  # bumped on every update; keys the compiled grading plan
 
 class ViolationLog(BaseModel):
     type: str  # 'tab_switch', 'fullscreen_exit', 'copy_attempt', 'right_click', etc.
@@ -163,6 +270,7 @@ class ExamSubmission(BaseModel):
     violations: List[ViolationLog]
     browser_info: Optional[Dict[str, Any]] = None
     ip_address: Optional[str] = None
+    session_id: Optional[str] = None  # same id the client sent with its violation reports
 
 class ExamAttempt(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -178,110 +286,69 @@ class ExamAttempt(BaseModel):
     flagged: bool = False
     browser_info: Optional[Dict[str, Any]] = None
     ip_address: Optional[str] = None
+    idempotency_key: Optional[str] = None
+    # Claimed by whichever request folds the attempt into exam_stats
+    stats_recorded: bool = False
 
 class ViolationReport(BaseModel):
     exam_id: str
     violation: ViolationLog
+    session_id: Optional[str] = None  # client-generated id of the exam session
 
-# ============ BACKGROUND TASKS ============
-
-async def mirror_submission_to_supabase(attempt: ExamAttempt, submission: ExamSubmission, exam: dict):
-    """
-    Background task to mirror submission to Supabase (Postgres).
-    Runs asynchronously to not block the student's response.
-    """
-    if not (SUPABASE_URL and SUPABASE_SERVICE_ROLE):
-        return
-
-    try:
-        # Prepare submission row
-        student_name = submission.student_data.get('name') or submission.student_data.get('student_name') or ''
-        student_email = submission.student_data.get('email') or submission.student_data.get('student_email') or ''
-
-        submissions_url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/submissions"
-        headers = {
-            'apikey': SUPABASE_SERVICE_ROLE,
-            'Authorization': f'Bearer {SUPABASE_SERVICE_ROLE}',
-            'Content-Type': 'application/json',
-            'Prefer': 'return=representation'
-        }
+class ViolationBatch(BaseModel):
+    session_id: Optional[str] = None
+    violations: List[ViolationLog]
 
-        submission_payload = {
-            'id': attempt.id,
-            'exam_id': attempt.exam_id,
-            'student_name': student_name,
-            'student_email': student_email,
-            'score': int(attempt.score),
-            'max_score': int(attempt.max_score),
-            'percentage': float(attempt.percentage),
-            'violations': submission.violations or [],
-            'browser_info': submission.browser_info or {}
-        }
+# ============ SUPABASE MIRROR ============
+
+# Attempts are mirrored to Supabase (Postgres) through a durable outbox drained
+# by a background worker, so Supabase latency never adds to submit latency and
+# nothing is lost if Supabase is down or the process restarts.
+supabase_outbox = SupabaseOutbox(lambda: db, SUPABASE_URL, SUPABASE_SERVICE_ROLE)
+
+def build_supabase_rows(attempt: ExamAttempt, submission: ExamSubmission, verdicts: List[Dict[str, Any]]):
+    student_name = submission.student_data.get('name') or submission.student_data.get('student_name') or ''
+    student_email = submission.student_data.get('email') or submission.student_data.get('student_email') or ''
+
+    submission_row = {
+        'id': attempt.id,
+        'exam_id': attempt.exam_id,
+        'student_name': student_name,
+        'student_email': student_email,
+        'score': int(attempt.score),
+        'max_score': int(attempt.max_score),
+        'percentage': float(attempt.percentage),
+        'violations': [v.model_dump() for v in submission.violations],
+        'browser_info': submission.browser_info or {}
+    }
+    # submission_answers rows come from the verdicts produced while scoring,
+    # so the attempt is never graded twice.
+    answer_rows = [{'submission_id': attempt.id, **verdict} for verdict in verdicts]
+    return submission_row, answer_rows
 
-        # Uses synchronous requests because run_in_executor or async client is preferred, 
-        # but for simplicity in background tasks standard requests is okay if volume isn't massive.
-        # For High Scalability: replace 'requests' with 'httpx' (async).
-        # We will use simple requests here as it is already in background thread/task.
-        r = requests.post(submissions_url, json=submission_payload, headers=headers, timeout=10)
-        if not (200 <= r.status_code < 300):
-            logger.warning(f"Failed to mirror submission to Supabase: {r.status_code} {r.text}")
-
-        # Prepare submission_answers bulk insert
-        answers_payload = []
-        # We recompute per-answer correctness using the same logic as above
-        # so that submission_answers.is_correct is accurate.
-        for ans in submission.answers:
-            is_correct = False
-            # find matching question
-            q = next((q for q in exam['questions'] if q['id'] == ans.question_id), None)
-            if q and q.get('correct_answer') not in (None, ''):
-                q_correct = q.get('correct_answer')
-                try:
-                    if isinstance(q_correct, list):
-                        parsed = json.loads(ans.answer) if isinstance(ans.answer, str) else ans.answer
-                        if isinstance(parsed, list):
-                            a = sorted([str(x).strip() for x in q_correct])
-                            b = sorted([str(x).strip() for x in parsed])
-                            is_correct = (a == b)
-                    else:
-                        if q.get('type') == 'numeric':
-                            try:
-                                s = float(ans.answer)
-                                c = float(q_correct)
-                                is_correct = (s == c)
-                            except Exception:
-                                is_correct = False
-                        else:
-                            is_correct = (str(ans.answer).strip().lower() == str(q_correct).strip().lower())
-                except Exception:
-                    is_correct = False
-
-            answers_payload.append({
-                'submission_id': attempt.id,
-                'question_id': ans.question_id,
-                'answer': ans.answer,
-                'is_correct': is_correct
-            })
-
-        if answers_payload:
-            answers_url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/submission_answers"
-            r2 = requests.post(answers_url, json=answers_payload, headers=headers, timeout=10)
-            if not (200 <= r2.status_code < 300):
-                logger.warning(f"Failed to mirror submission_answers to Supabase: {r2.status_code} {r2.text}")
-                
-        logger.info(f"✅ Mirrored submission {attempt.id} to Supabase")
+# ============ AUTH HELPERS ============
 
-    except Exception as e:
-        logger.exception(f"Error while mirroring submission to Supabase: {e}")
 
-# ============ AUTH HELPERS ============
+# bcrypt runs on a bounded pool so logins never block the event loop; beyond
+# workers + queue, requests are shed with 503 + Retry-After
+password_hasher = PasswordHasher(
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '2')),
+    max_queue=int(os.environ.get('PASSWORD_HASH_QUEUE', '32')),
+)
 
+@app.exception_handler(HashingOverloaded)
+async def hashing_overloaded_handler(request: Request, exc: HashingOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-in requests, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
 
 def create_jwt_token(tutor_id: str) -> str:
     payload = {
@@ -290,10 +357,26 @@ def create_jwt_token(tutor_id: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+token_cache = TokenCache(lambda token: jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]), maxsize=TOKEN_CACHE_SIZE)
+
+async def load_tutor_profile(tutor_id: str) -> Optional[Dict[str, Any]]:
+    return await db.tutors.find_one({"id": tutor_id}, {"_id": 0, "password": 0})
+
+async def load_exam_owner(exam_id: str) -> Optional[str]:
+    exam = await db.exams.find_one({"id": exam_id}, {"_id": 0, "tutor_id": 1})
+    return exam.get("tutor_id") if exam else None
+
+tutor_cache = TutorCache(load_tutor_profile, load_exam_owner, ttl=TUTOR_CACHE_TTL_SECONDS)
+
+async def require_exam_owner(exam_id: str, tutor_id: str):
+    """404 unless the exam exists and belongs to the tutor (cached ownership)"""
+    if not await tutor_cache.owns(exam_id, tutor_id):
+        raise HTTPException(status_code=404, detail="Exam not found")
+
 async def get_current_tutor(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = token_cache.verify(token)
         tutor_id = payload.get('tutor_id')
         if not tutor_id:
             raise HTTPException(status_code=401, detail="Invalid token")
@@ -319,7 +402,7 @@ async def register_tutor(tutor_data: TutorRegister):
     )
     
     doc = tutor_obj.model_dump()
-    doc['password'] = hash_password(tutor_data.password)
+    doc['password'] = await hash_password(tutor_data.password)
     
     await db.tutors.insert_one(doc)
     
@@ -339,7 +422,7 @@ async def login_tutor(login_data: TutorLogin):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Verify password
-    if not verify_password(login_data.password, tutor['password']):
+    if not await verify_password(login_data.password, tutor['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create token
@@ -355,17 +438,24 @@ async def login_tutor(login_data: TutorLogin):
 
 @api_router.get("/tutors/me")
 async def get_current_tutor_info(tutor_id: str = Depends(get_current_tutor)):
-    tutor = await db.tutors.find_one({"id": tutor_id}, {"_id": 0, "password": 0})
+    tutor = await tutor_cache.profile(tutor_id)
     if not tutor:
         raise HTTPException(status_code=404, detail="Tutor not found")
     return tutor
 
 # ============ EXAM ROUTES ============
 
+def to_question(question: QuestionCreate) -> Question:
+    data = question.model_dump()
+    # Questions sent without an id get a fresh one
+    if data['id'] is None:
+        data.pop('id')
+    return Question(**data)
+
 @api_router.post("/exams", response_model=Exam)
 async def create_exam(exam_data: ExamCreate, tutor_id: str = Depends(get_current_tutor)):
     # Convert QuestionCreate to Question
-    questions = [Question(**q.model_dump()) for q in exam_data.questions]
+    questions = [to_question(q) for q in exam_data.questions]
     
     exam_obj = Exam(
         tutor_id=tutor_id,
@@ -391,6 +481,8 @@ async def get_exam(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
     exam = await db.exams.find_one({"id": exam_id, "tutor_id": tutor_id}, {"_id": 0})
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
+    # The dashboard polls attempts/analytics next; they can skip the ownership read
+    tutor_cache.remember_owner(exam_id, tutor_id)
     return exam
 
 @api_router.put("/exams/{exam_id}", response_model=Exam)
@@ -400,7 +492,7 @@ async def update_exam(exam_id: str, exam_data: ExamCreate, tutor_id: str = Depen
     if not existing:
         raise HTTPException(status_code=404, detail="Exam not found")
     
-    questions = [Question(**q.model_dump()) for q in exam_data.questions]
+    questions = [to_question(q) for q in exam_data.questions]
     
     update_data = {
         "title": exam_data.title,
@@ -410,116 +502,276 @@ async def update_exam(exam_id: str, exam_data: ExamCreate, tutor_id: str = Depen
         "settings": exam_data.settings.model_dump()
     }
     
-    await db.exams.update_one({"id": exam_id}, {"$set": update_data})
+    await db.exams.update_one({"id": exam_id}, {"$set": update_data, "$inc": {"version": 1}})
+    await broadcast_exam_change(exam_id)
     
     updated_exam = await db.exams.find_one({"id": exam_id}, {"_id": 0})
     return updated_exam
 
+@api_router.post("/exams/{exam_id}/regrade")
+async def regrade_exam_attempts(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
+    """Rescore every stored attempt against the exam's current answer key; GET the same path for progress"""
+    exam = await db.exams.find_one({"id": exam_id, "tutor_id": tutor_id}, grading_plan_projection())
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    
+    def log_progress(done: int, total: int):
+        logger.info(f"Regrading exam {exam_id}: {done}/{total} attempts")
+    
+    result = await regrade_exam(db, exam_id, plan=compile_plan(exam), on_progress=log_progress)
+    if result["changed"]:
+        # Every worker's ranking tree holds the old scores
+        await broadcast_exam_change(exam_id)
+    return result
+
+@api_router.get("/exams/{exam_id}/regrade")
+async def get_regrade_progress(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
+    """Progress of the exam's latest regrade: {status, done, total, changed}; poll while one runs"""
+    await require_exam_owner(exam_id, tutor_id)
+    status = await get_regrade_status(db, exam_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Exam has not been regraded")
+    return status
+
 @api_router.delete("/exams/{exam_id}")
 async def delete_exam(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
     result = await db.exams.delete_one({"id": exam_id, "tutor_id": tutor_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Exam not found")
+    await db.exam_stats.delete_one({"exam_id": exam_id})
+    await db.regrade_status.delete_one({"exam_id": exam_id})
+    await broadcast_exam_change(exam_id)
     return {"message": "Exam deleted successfully"}
 
 # ============ STUDENT EXAM ROUTES (NO AUTH) ============
 
 
 
-@api_router.get("/exams/{exam_id}/public")
-async def get_public_exam(exam_id: str, response: Response):
-    # Check cache first
-    if exam_id in exam_cache:
-        response.headers["Cache-Control"] = "public, max-age=60"
-        response.headers["X-Cache"] = "HIT"
-        return exam_cache[exam_id]
-        
-    exam = await db.exams.find_one({"id": exam_id, "is_active": True}, {"_id": 0})
-    if not exam:
-        raise HTTPException(status_code=404, detail="Exam not found or inactive")
-    
-    # Check if exam is within date range
-    settings = exam.get('settings', {})
+async def read_public_exam_body(exam_id: str) -> Optional[bytes]:
+    """Active exam with correct answers removed, as JSON bytes, or None"""
+    exam = await db.exams.find_one(
+        {"id": exam_id, "is_active": True},
+        {"_id": 0, "questions.correct_answer": 0}
+    )
+    return serialize_exam(exam) if exam else None
+
+async def load_public_exam(exam_id: str) -> Optional[PublicExamPayload]:
+    """Local cache loader: shared tier first, Mongo only for the worker holding the fill lock"""
+    body = await shared_exam_tier.get_or_load(exam_id, lambda: read_public_exam_body(exam_id))
+    if body is None:
+        return None
+    payload = await asyncio.to_thread(PublicExamPayload.from_body, body)
+    # Keep recent versions reachable at their content-addressed URL
+    public_exam_versions[payload.digest] = payload
+    return payload
+
+async def find_exams_starting(start: datetime, end: datetime) -> List[str]:
+    exams = await db.exams.find(
+        {"is_active": True, "settings.start_date": {"$gt": start.isoformat(), "$lte": end.isoformat()}},
+        {"_id": 0, "id": 1}
+    ).to_list(1000)
+    return [exam["id"] for exam in exams]
+
+exam_cache = PublicExamCache(
+    load_public_exam,
+    ttl=PUBLIC_EXAM_TTL_SECONDS,
+    stale_ttl=PUBLIC_EXAM_STALE_SECONDS,
+    max_bytes=PUBLIC_EXAM_CACHE_MAX_BYTES,
+    getsizeof=lambda payload: payload.size,
+)
+exam_prewarmer = ExamPrewarmer(exam_cache, find_exams_starting, lead_minutes=EXAM_PREWARM_LEAD_MINUTES)
+# Content digest -> payload, for /exams/{exam_id}/public/{digest}
+public_exam_versions = TTLCache(maxsize=2000, ttl=24 * 3600)
+shared_cache_backend = create_shared_cache(REDIS_URL)
+shared_exam_tier = SharedExamTier(shared_cache_backend)
+
+def drop_local_exam_state(exam_id: str):
+    # Runs in every worker when any of them publishes an exam change
+    exam_cache.invalidate(exam_id)
+    invalidate_plan(exam_id)
+    tutor_cache.invalidate_exam(exam_id)
+    score_ranks.invalidate(exam_id)
+
+shared_cache_backend.add_listener(drop_local_exam_state)
+
+async def broadcast_exam_change(exam_id: str):
+    drop_local_exam_state(exam_id)
+    try:
+        await shared_exam_tier.invalidate(exam_id)
+    except Exception as e:
+        logger.error(f"Failed to broadcast change of exam {exam_id}: {e}")
+
+async def handle_exam_change(change: Dict[str, Any]):
+    document = change.get("fullDocument") or change.get("fullDocumentBeforeChange") or {}
+    exam_id = document.get("id")
+    if not exam_id:
+        if change.get("operationType") == "delete":
+            logger.warning("Exam deleted without a pre-image; cached copies expire with their TTL")
+        return
+    # Every worker's stream delivers this change; only the worker that claims it broadcasts
+    try:
+        claimed = await shared_cache_backend.acquire_lock(
+            f"exam-change:{change['_id']['_data']}", EXAM_CHANGE_CLAIM_SECONDS
+        )
+    except Exception as e:
+        logger.warning(f"Could not claim exam change, broadcasting anyway: {e}")
+        claimed = True
+    if claimed:
+        await broadcast_exam_change(exam_id)
+
+async def watch_exam_changes():
+    """Invalidate caches for exam writes made outside this API (Mongo change stream)"""
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+    while True:
+        try:
+            async with db.exams.watch(
+                pipeline, full_document="updateLookup", full_document_before_change="whenAvailable"
+            ) as stream:
+                async for change in stream:
+                    await handle_exam_change(change)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Exam change stream interrupted, retrying: {e}")
+            await asyncio.sleep(5)
+
+def check_exam_window(payload: PublicExamPayload):
+    # Check if exam is within date range (on every request, cached or not)
     now = datetime.now(timezone.utc).isoformat()
     
-    if settings.get('start_date') and now < settings['start_date']:
+    if payload.start_date and now < payload.start_date:
         raise HTTPException(status_code=403, detail="Exam has not started yet")
     
-    if settings.get('end_date') and now > settings['end_date']:
+    if payload.end_date and now > payload.end_date:
         raise HTTPException(status_code=403, detail="Exam has ended")
+
+@api_router.get("/exams/{exam_id}/public")
+async def get_public_exam(exam_id: str, request: Request):
+    # Served from memory; concurrent misses share one read, stale entries refresh in the background
+    payload, cache_status = await exam_cache.get(exam_id)
+    if not payload:
+        raise HTTPException(status_code=404, detail="Exam not found or inactive")
+    
+    check_exam_window(payload)
     
-    # Remove correct answers from questions
-    exam_copy = exam.copy()
-    for question in exam_copy['questions']:
-        question.pop('correct_answer', None)
+    return payload_response(payload, request, "public, max-age=60", {
+        "X-Cache": cache_status,
+        # Immutable URL of this exact version
+        "Content-Location": f"/api/exams/{exam_id}/public/{payload.digest}",
+    })
+
+@api_router.get("/exams/{exam_id}/public/{digest}")
+async def get_public_exam_version(exam_id: str, digest: str, request: Request):
+    """One exam version addressed by its content hash; safe to cache forever"""
+    # Older versions stay reachable only while the exam itself is live
+    current, _ = await exam_cache.get(exam_id)
+    if current is None:
+        raise HTTPException(status_code=404, detail="Exam not found or inactive")
+    payload = current if current.digest == digest else public_exam_versions.get(digest)
+    if payload is None or payload.exam_id != exam_id:
+        raise HTTPException(status_code=404, detail="Exam version not found")
     
-    # Store in cache
-    exam_cache[exam_id] = exam_copy
+    check_exam_window(payload)
     
-    response.headers["Cache-Control"] = "public, max-age=60"
-    response.headers["X-Cache"] = "MISS"
-    return exam_copy
+    return payload_response(payload, request, IMMUTABLE_CACHE_CONTROL)
+
+# Concurrent submissions share one insert_many (group commit); each request
+# still gets its own document's outcome
+attempt_writer = BatchWriter(lambda: db.exam_attempts, max_batch=ATTEMPT_BATCH_SIZE, max_delay=ATTEMPT_BATCH_DELAY_MS / 1000)
+
+async def get_grading_plan(exam_id: str):
+    """Compiled answer key and settings (one Mongo read per exam change, not per request)"""
+    plan = get_cached_plan(exam_id)
+    if plan is None:
+        generation = plan_generation(exam_id)
+        exam = await db.exams.find_one({"id": exam_id}, grading_plan_projection())
+        if not exam:
+            raise HTTPException(status_code=404, detail="Exam not found")
+        plan = compile_plan(exam, generation)
+    return plan
+
+# Retried submissions get the original result instead of a second attempt
+submission_deduper = SubmissionDeduper(ttl=SUBMISSION_RESULT_TTL_SECONDS)
 
 @api_router.post("/exams/{exam_id}/submit")
-async def submit_exam(exam_id: str, submission: ExamSubmission, background_tasks: BackgroundTasks):
-    # Get exam
-    exam = await db.exams.find_one({"id": exam_id})
-    if not exam:
-        raise HTTPException(status_code=404, detail="Exam not found")
+async def submit_exam(exam_id: str, submission: ExamSubmission, request: Request, response: Response):
+    client_key = request.headers.get(IDEMPOTENCY_HEADER)
+    key = submission_key(exam_id, client_key, submission.model_dump(mode="json", include={"student_data", "answers"}))
+    # Client keys are stored under the unique index; a body hash only dedupes
+    # retries while this worker still has the result cached
+    stored_key = key if client_key else None
+    result, replayed = await submission_deduper.run(
+        key, lambda: grade_and_store_submission(exam_id, submission, stored_key)
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+def submission_result(attempt: ExamAttempt) -> Dict[str, Any]:
+    return {
+        "attempt_id": attempt.id,
+        "score": attempt.score,
+        "max_score": attempt.max_score,
+        "percentage": attempt.percentage,
+        "flagged": attempt.flagged,
+        "violations_count": len(attempt.violations)
+    }
+
+async def finish_stored_attempt(
+    attempt: ExamAttempt, submission: ExamSubmission, verdicts: List[Dict[str, Any]], with_buckets: bool = False
+):
+    """
+    Steps after the attempt is stored; returns the exam's stats if this call recorded it.
+    Safe to repeat, so a retry can finish an attempt whose original request died midway.
+    """
+    # Mirror to Supabase (Postgres) if service role is configured. This lets
+    # iOS/Safari clients submit via backend even when client auth/session is
+    # blocked. Use REST API with the service role key so this runs server-side
+    # and does not expose credentials to browsers.
+    # The outbox entry shares the attempt id, so it is written right after the
+    # attempt (standalone Mongo has no multi-document transactions) and at most once.
+    if supabase_outbox.enabled:
+        submission_row, answer_rows = build_supabase_rows(attempt, submission, verdicts)
+        try:
+            await supabase_outbox.enqueue(build_outbox_entry(submission_row, answer_rows))
+        except DuplicateKeyError:
+            pass
+    # Claimed before counting: a crash in between undercounts (repaired by a
+    # rebuild) rather than letting a retry count the attempt twice
+    claimed = await db.exam_attempts.update_one(
+        {"id": attempt.id, "stats_recorded": False}, {"$set": {"stats_recorded": True}}
+    )
+    if claimed.modified_count == 0:
+        return None
+    return await exam_stats.record_attempt(db, attempt.exam_id, attempt.percentage, attempt.flagged, with_buckets)
+
+async def resume_stored_submission(exam_id: str, key: str, plan) -> Dict[str, Any]:
+    """Result of the attempt stored under `key`, finishing its post-insert steps if they never ran"""
+    attempt = ExamAttempt(**await db.exam_attempts.find_one({"exam_id": exam_id, "idempotency_key": key}, {"_id": 0}))
+    if not attempt.stats_recorded:
+        original = ExamSubmission(
+            exam_id=exam_id,
+            student_data=attempt.student_data,
+            answers=attempt.answers,
+            violations=attempt.violations,
+            browser_info=attempt.browser_info,
+        )
+        await finish_stored_attempt(attempt, original, plan.grade(attempt.answers).verdicts)
+    return submission_result(attempt)
+
+async def grade_and_store_submission(exam_id: str, submission: ExamSubmission, key: Optional[str]):
+    """(response, replayed): replayed when an attempt with this key was already stored"""
+    plan = await get_grading_plan(exam_id)
+    
+    # Calculate score and per-answer verdicts in one pass
+    result = plan.grade(submission.answers)
+    score = result.score
+    max_score = result.max_score
+    percentage = result.percentage
     
-    # Calculate score
-    score = 0
-    max_score = 0
-
-    for question in exam['questions']:
-        # Only count auto-graded questions (those with a correct_answer present)
-        q_correct = question.get('correct_answer', None)
-        if q_correct is None or q_correct == '':
-            # skip open-ended questions from auto-grading
-            continue
-
-        max_score += question.get('points', 0)
-
-        # Find student's answer
-        student_answer = next((a for a in submission.answers if a.question_id == question['id']), None)
-        if not student_answer:
-            continue
-
-        # Handle list correct answers (multiple_select)
-        if isinstance(q_correct, list):
-            # student's answer may be a JSON string representing a list
-            student_val = student_answer.answer
-            try:
-                parsed = json.loads(student_val) if isinstance(student_val, str) else student_val
-            except Exception:
-                parsed = None
-            if isinstance(parsed, list):
-                # compare as sets (after trimming)
-                a = sorted([str(x).strip() for x in q_correct])
-                b = sorted([str(x).strip() for x in parsed])
-                if a == b:
-                    score += question.get('points', 0)
-        else:
-            try:
-                # numeric questions: compare numerically
-                if question.get('type') == 'numeric':
-                    try:
-                        s = float(student_answer.answer)
-                        c = float(q_correct)
-                        if s == c:
-                            score += question.get('points', 0)
-                    except Exception:
-                        pass
-                else:
-                    if str(student_answer.answer).strip().lower() == str(q_correct).strip().lower():
-                        score += question.get('points', 0)
-            except Exception:
-                pass
-    
-    percentage = (score / max_score * 100) if max_score > 0 else 0
-    
-    # Check if flagged (too many violations)
-    flagged = len(submission.violations) >= exam['settings']['max_violations']
+    # Check if flagged (too many violations, as submitted or as reported live)
+    violations_seen = max(len(submission.violations), violation_buffer.count(exam_id, submission.session_id))
+    flagged = violations_seen >= plan.max_violations
     
     # Create attempt
     attempt = ExamAttempt(
@@ -532,165 +784,365 @@ async def submit_exam(exam_id: str, submission: ExamSubmission, background_tasks
         percentage=percentage,
         flagged=flagged,
         browser_info=submission.browser_info,
-        ip_address=submission.ip_address
+        ip_address=submission.ip_address,
+        idempotency_key=key
     )
     
     doc = attempt.model_dump()
-    await db.exam_attempts.insert_one(doc)
+    try:
+        await attempt_writer.insert(doc)
+    except DuplicateKeyError:
+        # Stored by an earlier try (possibly through another worker)
+        return await resume_stored_submission(exam_id, key, plan), True
+    stats = await finish_stored_attempt(
+        attempt, submission, result.verdicts, with_buckets=plan.show_results_immediately
+    )
+    
+    response = submission_result(attempt)
+    if plan.show_results_immediately and stats:
+        try:
+            response.update(await score_ranks.record(exam_id, percentage, stats["count"], stats.get("score_buckets")))
+        except Exception as e:
+            logger.warning(f"Failed to rank attempt {attempt.id}: {e}")
+    live_hub.publish(exam_id, "submission", {
+        **response,
+        "session_id": submission.session_id,
+        "student_data": attempt.student_data,
+        "submitted_at": attempt.submitted_at,
+    })
+    return response, False
 
-    # Mirror to Supabase (Postgres) if service role is configured. This lets
-    # iOS/Safari clients submit via backend even when client auth/session is
-    # blocked. Use REST API with the service role key so this runs server-side
-    # and does not expose credentials to browsers.
-    # Add background task to mirror to Supabase
-    background_tasks.add_task(mirror_submission_to_supabase, attempt, submission, exam)
+# Tutor dashboards receive violations and submissions over SSE from this hub
+live_hub = LiveHub(queue_size=LIVE_QUEUE_SIZE, heartbeat=LIVE_HEARTBEAT_SECONDS)
 
-    
-    return {
-        "attempt_id": attempt.id,
-        "score": score,
-        "max_score": max_score,
-        "percentage": percentage,
-        "flagged": flagged,
-        "violations_count": len(submission.violations)
+@api_router.get("/exams/{exam_id}/live")
+async def stream_exam_events(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
+    """Server-Sent Events: `violation` and `submission` as they happen, `lagged` if some were dropped"""
+    await require_exam_owner(exam_id, tutor_id)
+    subscription = live_hub.subscribe(exam_id)
+    return StreamingResponse(
+        subscription.stream(live_hub.heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Violation logs are buffered and written with insert_many; the buffer also
+# keeps live per-session counts for max_violations flagging
+violation_buffer = ViolationBuffer(
+    lambda: db,
+    max_batch=VIOLATION_BATCH_SIZE,
+    flush_interval=VIOLATION_FLUSH_SECONDS,
+    on_written=lambda docs: violation_series.record_rollups(db, docs),
+)
+
+async def log_violations(exam_id: str, session_id: Optional[str], violations: List[ViolationLog]) -> Dict[str, Any]:
+    plan = await get_grading_plan(exam_id)
+    logged_at = datetime.now(timezone.utc)
+    docs = [
+        {"exam_id": exam_id, "session_id": session_id, "violation": v.model_dump(), "logged_at": logged_at}
+        for v in violations
+    ]
+    count = violation_buffer.add(docs, (exam_id, session_id) if session_id else None)
+    result = {
+        "logged": len(docs),
+        "violations_count": count,
+        "flagged": count is not None and count >= plan.max_violations,
     }
+    live_hub.publish(exam_id, "violation", {
+        "session_id": session_id,
+        "violations": [doc["violation"] for doc in docs],
+        "logged_at": logged_at.isoformat(),
+        **result,
+    })
+    return result
 
 @api_router.post("/exams/{exam_id}/violations")
 async def report_violation(exam_id: str, report: ViolationReport):
-    # Just log it for now, could be used for real-time monitoring
-    await db.violation_logs.insert_one({
-        "exam_id": exam_id,
-        "violation": report.violation.model_dump(),
-        "logged_at": datetime.now(timezone.utc).isoformat()
-    })
-    return {"message": "Violation logged"}
+    result = await log_violations(exam_id, report.session_id, [report.violation])
+    return {"message": "Violation logged", **result}
+
+@api_router.post("/exams/{exam_id}/violations/batch")
+async def report_violations(exam_id: str, batch: ViolationBatch):
+    """Several violation events of one session in one request"""
+    if len(batch.violations) > VIOLATION_BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {VIOLATION_BATCH_MAX_EVENTS} violations per batch")
+    return await log_violations(exam_id, batch.session_id, batch.violations)
+
+@api_router.get("/exams/{exam_id}/violations/timeline")
+async def get_violation_timeline(
+    exam_id: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    tutor_id: str = Depends(get_current_tutor)
+):
+    """Violations per minute and type (from the rollups, not the raw events)"""
+    await require_exam_owner(exam_id, tutor_id)
+    return await violation_series.get_timeline(db, exam_id, since, until)
 
 # ============ RESULTS ROUTES ============
 
+# Per-worker Fenwick trees over exam_stats.score_buckets
+score_ranks = ScoreRanks(lambda exam_id: exam_stats.get_score_buckets(db, exam_id))
+
+# Fields returned by default when listing attempts (answers and violations are opt-in)
+ATTEMPT_SUMMARY_FIELDS = ["id", "exam_id", "student_data", "score", "max_score", "percentage", "flagged", "submitted_at"]
+ATTEMPT_OPTIONAL_FIELDS = {"answers", "violations", "browser_info", "ip_address"}
+ATTEMPTS_PAGE_SIZE = 100
+ATTEMPTS_MAX_PAGE_SIZE = 1000
+
+async def stream_attempts_ndjson(cursor):
+    # One JSON document per line, written in small batches straight off the Mongo cursor
+    lines = []
+    async for attempt in cursor:
+        lines.append(json.dumps(attempt, default=str))
+        if len(lines) >= 200:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
 @api_router.get("/exams/{exam_id}/attempts")
-async def get_exam_attempts(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
-    # Verify exam belongs to tutor
-    exam = await db.exams.find_one({"id": exam_id, "tutor_id": tutor_id})
-    if not exam:
-        raise HTTPException(status_code=404, detail="Exam not found")
+async def get_exam_attempts(
+    exam_id: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+    tutor_id: str = Depends(get_current_tutor)
+):
+    """
+    Attempts in submission order, one keyset page at a time.
+    JSON pages carry the cursor for the next page in X-Next-Cursor;
+    format=ndjson streams every remaining attempt (or `limit` of them).
+    `fields` adds comma-separated optional fields (answers, violations, ...).
+    """
+    await require_exam_owner(exam_id, tutor_id)
+    
+    extra_fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else []
+    unknown = set(extra_fields) - ATTEMPT_OPTIONAL_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    
+    try:
+        query = keyset_filter({"exam_id": exam_id}, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    projection = build_projection(extra_fields, ATTEMPT_SUMMARY_FIELDS)
+    
+    if format == "ndjson":
+        attempts = db.exam_attempts.find(query, projection).sort(SORT_KEY)
+        if limit:
+            attempts = attempts.limit(max(limit, 1))
+        return StreamingResponse(stream_attempts_ndjson(attempts), media_type="application/x-ndjson")
     
-    attempts = await db.exam_attempts.find({"exam_id": exam_id}, {"_id": 0}).to_list(1000)
-    return attempts
+    page_size = min(max(limit or ATTEMPTS_PAGE_SIZE, 1), ATTEMPTS_MAX_PAGE_SIZE)
+    # One extra row tells whether another page follows
+    rows = await db.exam_attempts.find(query, projection).sort(SORT_KEY).limit(page_size + 1).to_list(page_size + 1)
+    headers = {}
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+    return JSONResponse(content=jsonable_encoder(rows), headers=headers)
 
 @api_router.get("/exams/{exam_id}/analytics")
 async def get_exam_analytics(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
-    # Verify exam belongs to tutor
-    exam = await db.exams.find_one({"id": exam_id, "tutor_id": tutor_id})
+    await require_exam_owner(exam_id, tutor_id)
+    
+    return exam_stats.summarize(await exam_stats.get_exam_stats(db, exam_id))
+
+@api_router.get("/exams/{exam_id}/leaderboard")
+async def get_exam_leaderboard(exam_id: str, limit: int = 10, tutor_id: str = Depends(get_current_tutor)):
+    """Top-K attempts by percentage (earliest submission first on ties), read off the ranking index"""
+    await require_exam_owner(exam_id, tutor_id)
+    
+    limit = min(max(limit, 1), 100)
+    projection = {"_id": 0, "id": 1, "student_data": 1, "score": 1, "max_score": 1, "percentage": 1, "submitted_at": 1}
+    cursor = db.exam_attempts.find({"exam_id": exam_id}, projection).sort(
+        [("percentage", -1), ("submitted_at", 1)]
+    ).limit(limit)
+    return await cursor.to_list(limit)
+
+@api_router.get("/exams/{exam_id}/item-analysis")
+async def get_exam_item_analysis(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
+    """Per-question difficulty, discrimination, distractor frequencies and median time"""
+    exam = await db.exams.find_one({"id": exam_id, "tutor_id": tutor_id}, grading_plan_projection())
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
-    attempts = await db.exam_attempts.find({"exam_id": exam_id}, {"_id": 0}).to_list(1000)
+    stats = await exam_stats.get_exam_stats(db, exam_id)
+    attempt_count = stats["count"] if stats else 0
+    return await get_item_analysis(db, exam_id, compile_plan(exam), attempt_count)
+
+async def stream_export_xlsx(exam: Dict[str, Any]):
+    """Yield XLSX bytes as attempts are read; memory stays flat for any number of attempts"""
+    required_fields = exam.get('required_fields', [])
+    headers = export_headers(exam)
+    cursor = db.exam_attempts.find({"exam_id": exam['id']}, EXPORT_PROJECTION).sort(EXPORT_SORT).batch_size(EXPORT_BATCH_SIZE)
     
-    if not attempts:
-        return {
-            "total_attempts": 0,
-            "average_score": 0,
-            "flagged_count": 0,
-            "completion_rate": 0
-        }
+    # Column widths precede the rows in the sheet, so size them from the first rows
+    sample = []
+    async for attempt in cursor:
+        sample.append(export_row(attempt, required_fields))
+        if len(sample) >= EXPORT_WIDTH_SAMPLE:
+            break
     
-    total = len(attempts)
-    avg_score = sum(a['percentage'] for a in attempts) / total
-    flagged = sum(1 for a in attempts if a['flagged'])
+    sink = ChunkSink()
+    writer = StreamingXlsxWriter(sink, "Exam Results", estimate_widths([headers, *sample], len(headers)))
+    writer.write_header(headers)
+    writer.write_rows(sample)
+    yield sink.drain()
     
-    return {
-        "total_attempts": total,
-        "average_score": round(avg_score, 2),
-        "flagged_count": flagged,
-        "completion_rate": 100.0,
-        "highest_score": max(a['percentage'] for a in attempts),
-        "lowest_score": min(a['percentage'] for a in attempts)
-    }
+    batch = []
+    async for attempt in cursor:
+        batch.append(export_row(attempt, required_fields))
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            await asyncio.to_thread(writer.write_rows, batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        await asyncio.to_thread(writer.write_rows, batch)
+    writer.close()
+    yield sink.drain()
 
 @api_router.get("/exams/{exam_id}/export")
 async def export_exam_results(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
     # Verify exam belongs to tutor
-    exam = await db.exams.find_one({"id": exam_id, "tutor_id": tutor_id})
+    exam = await db.exams.find_one({"id": exam_id, "tutor_id": tutor_id}, {"_id": 0, "id": 1, "title": 1, "required_fields": 1})
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
-    attempts = await db.exam_attempts.find({"exam_id": exam_id}, {"_id": 0}).to_list(1000)
-    
-    # Create Excel workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Exam Results"
-    
-    # Header styling
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True)
-    
-    # Define headers based on required fields
-    required_fields = exam.get('required_fields', [])
-    headers = []
-    for field in required_fields:
-        headers.append(field.replace('_', ' ').title())
-    
-    headers.extend(['Score', 'Max Score', 'Percentage', 'Violations', 'Flagged', 'Submitted At'])
-    
-    # Write headers
-    for col, header in enumerate(headers, start=1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Write data
-    for row_idx, attempt in enumerate(attempts, start=2):
-        col = 1
-        # Student data
-        for field in required_fields:
-            ws.cell(row=row_idx, column=col, value=attempt['student_data'].get(field, ''))
-            col += 1
-        
-        # Scores
-        ws.cell(row=row_idx, column=col, value=attempt['score'])
-        col += 1
-        ws.cell(row=row_idx, column=col, value=attempt['max_score'])
-        col += 1
-        ws.cell(row=row_idx, column=col, value=f"{attempt['percentage']:.2f}%")
-        col += 1
-        ws.cell(row=row_idx, column=col, value=len(attempt['violations']))
-        col += 1
-        ws.cell(row=row_idx, column=col, value='Yes' if attempt['flagged'] else 'No')
-        col += 1
-        ws.cell(row=row_idx, column=col, value=attempt['submitted_at'])
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to BytesIO
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    # Return as streaming response
-    filename = f"{exam['title'].replace(' ', '_')}_results.xlsx"
     headers = {
-        'Content-Disposition': f'attachment; filename="{filename}"'
+        'Content-Disposition': f'attachment; filename="{export_filename(exam)}"'
     }
     
     return StreamingResponse(
-        output,
-        media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        stream_export_xlsx(exam),
+        media_type=XLSX_MEDIA_TYPE,
         headers=headers
     )
 
+# Large exports run as background jobs in a separate process; finished files
+# are cached per (exam, version, scores version, attempt count)
+EXPORT_DIR = os.environ.get('EXPORT_DIR', str(ROOT_DIR / 'exports'))
+export_jobs = ExportJobs(
+    lambda: db,
+    partial(connect_sync_db, mongo_url, os.environ['DB_NAME']),
+    create_artifact_store(EXPORT_DIR, os.environ.get('EXPORT_S3_BUCKET')),
+    max_workers=int(os.environ.get('EXPORT_PROCESSES', '2')),
+)
+
+@api_router.post("/exams/{exam_id}/exports")
+async def create_export_job(exam_id: str, tutor_id: str = Depends(get_current_tutor)):
+    """Start (or reuse) an XLSX export; poll GET /exports/{job_id} for progress"""
+    exam = await db.exams.find_one(
+        {"id": exam_id, "tutor_id": tutor_id},
+        {"_id": 0, "id": 1, "title": 1, "required_fields": 1, "version": 1, "scores_version": 1}
+    )
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    
+    stats = await exam_stats.get_exam_stats(db, exam_id)
+    return await export_jobs.create(exam, tutor_id, stats["count"] if stats else 0)
+
+@api_router.get("/exports/{job_id}")
+async def get_export_job(job_id: str, tutor_id: str = Depends(get_current_tutor)):
+    job = await export_jobs.get(job_id, tutor_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+@api_router.get("/exports/{job_id}/download")
+async def download_export(job_id: str, tutor_id: str = Depends(get_current_tutor)):
+    job = await export_jobs.get(job_id, tutor_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    
+    url = await export_jobs.store.download_url(job["artifact_key"])
+    if url:
+        return RedirectResponse(url)
+    path = export_jobs.store.local_path(job["artifact_key"])
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Export file is no longer available")
+    return FileResponse(path, media_type=XLSX_MEDIA_TYPE, filename=job["filename"])
+
+@api_router.get("/warehouse/export")
+async def export_attempts_columnar(
+    since: Optional[str] = None,
+    format: str = "parquet",
+    tutor_id: str = Depends(get_current_tutor)
+):
+    """
+    Attempts, answers and violations of all the tutor's exams as partitioned
+    Parquet (or Arrow IPC) files in a zip, with manifest.json. Pass the
+    X-Export-Watermark of the previous export as `since` for an incremental one;
+    it repeats the last few minutes before `since`, so load by attempt_id.
+    """
+    if format not in COLUMNAR_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(COLUMNAR_FORMATS)}")
+    try:
+        parse_time(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be an ISO-8601 timestamp")
+    
+    with tempfile.TemporaryDirectory() as out_dir:
+        try:
+            manifest = await export_tutor_attempts(db, tutor_id, out_dir, since=since, fmt=format)
+        except RuntimeError as e:
+            raise HTTPException(status_code=501, detail=str(e))
+        
+        def build_zip():
+            # Parquet/Arrow files are already compressed, so they are stored as is
+            archive = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+            with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_STORED) as zf:
+                zf.writestr('manifest.json', json.dumps(manifest, indent=2))
+                for name in manifest['files']:
+                    zf.write(os.path.join(out_dir, name), name)
+            archive.seek(0)
+            return archive
+        
+        archive = await asyncio.to_thread(build_zip)
+    
+    def read_archive():
+        with archive:
+            while chunk := archive.read(1024 * 1024):
+                yield chunk
+    
+    headers = {'Content-Disposition': 'attachment; filename="attempts_export.zip"'}
+    if manifest['watermark']:
+        headers['X-Export-Watermark'] = manifest['watermark']
+    return StreamingResponse(read_archive(), media_type='application/zip', headers=headers)
+
+# ============ METRICS ROUTES ============
+
+@api_router.get("/metrics/outbox")
+async def outbox_metrics(tutor_id: str = Depends(get_current_tutor)):
+    """Supabase mirror backlog: pending/dead entries and lag of the oldest one"""
+    return await supabase_outbox.stats()
+
+@api_router.get("/metrics/auth")
+async def auth_metrics(tutor_id: str = Depends(get_current_tutor)):
+    """This worker's password hashing pool (pending, shed, latency) and auth caches"""
+    return {**password_hasher.stats(), "tokens": token_cache.stats(), "tutors": tutor_cache.stats()}
+
+@api_router.get("/metrics/violations")
+async def violation_metrics(tutor_id: str = Depends(get_current_tutor)):
+    """Violation log buffer (queued, written, dropped, live sessions) and live stream hub of this worker"""
+    return {**violation_buffer.stats(), "live": live_hub.stats()}
+
+@api_router.get("/metrics/submissions")
+async def submission_metrics(tutor_id: str = Depends(get_current_tutor)):
+    """Attempt group-commit writer and submission dedupe of this worker"""
+    return {**attempt_writer.stats(), "dedupe": submission_deduper.stats()}
+
+@api_router.get("/metrics/exam-cache")
+async def exam_cache_metrics(tutor_id: str = Depends(get_current_tutor)):
+    """Public exam cache of this worker: hit ratio, bytes used, evictions and rejected admissions"""
+    return exam_cache.stats()
+
 @api_router.get("/")
 async def root():
     return {"message": "ExamShield API is running"}
@@ -704,6 +1156,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Cache", "ETag", "Content-Location", "X-Export-Watermark", REPLAYED_HEADER],
 )
 
 # Configure logging
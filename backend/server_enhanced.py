@@ -5,6 +5,7 @@ from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
 from contextlib import asynccontextmanager
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import StreamingResponse, RedirectResponse, JSONResponse
+from cachetools import LRUCache, TTLCache
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -12,17 +13,21 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
-import json
+from typing import List, Optional, Dict, Any, Tuple
+import itertools
 import uuid
+import hmac
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
-import requests
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from io import BytesIO
 
+from grading import GradingPlan
+from http_client import http_client
+from singleflight import SingleFlight
+
 # Configure logging first
 logging.basicConfig(
     level=logging.INFO,
@@ -53,6 +58,10 @@ except Exception as e:
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_SERVICE_ROLE = os.environ.get('SUPABASE_SERVICE_ROLE')
 
+# Exam definitions (with questions) are immutable while an exam is running,
+# so they are cached per process instead of fetched from Supabase per submission
+EXAM_CACHE_TTL_SECONDS = int(os.environ.get('EXAM_CACHE_TTL_SECONDS', '300'))
+
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
@@ -65,6 +74,7 @@ async def lifespan(app: FastAPI):
     logger.info("Application starting up...")
     yield
     # Shutdown
+    await http_client.aclose()
     if client:
         client.close()
     logger.info("Application shutting down...")
@@ -210,87 +220,75 @@ async def get_current_tutor(credentials: HTTPAuthorizationCredentials = Depends(
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-# ============ GRADING HELPER ============
+# ============ EXAM CACHE ============
 
-def grade_submission(exam: Dict, answers: List[StudentAnswer]) -> Dict[str, Any]:
-    """
-    Server-side grading function
-    Returns: {score, max_score, percentage, graded_answers}
-    """
-    score = 0
-    max_score = 0
-    graded_answers = []
-
-    for question in exam['questions']:
-        # Skip short answer questions (manual grading required)
-        if question['type'] == 'short_answer':
-            continue
-
-        max_score += question.get('points', 0)
-
-        # Find student's answer
-        student_answer = next((a for a in answers if a.question_id == question['id']), None)
-        
-        if not student_answer:
-            graded_answers.append({
-                'question_id': question['id'],
-                'answer': None,
-                'is_correct': False
-            })
-            continue
-
-        is_correct = False
-        answer_value = student_answer.answer
-
-        # Handle multiple select (array answers)
-        if isinstance(question.get('correct_answer'), list):
-            student_arr = []
-            
-            if isinstance(answer_value, list):
-                student_arr = answer_value
-            elif isinstance(answer_value, str):
-                try:
-                    student_arr = json.loads(answer_value)
-                except:
-                    student_arr = answer_value.split('||')
-            
-            correct_sorted = sorted([str(x).strip().lower() for x in question['correct_answer']])
-            student_sorted = sorted([str(x).strip().lower() for x in student_arr])
-            
-            is_correct = correct_sorted == student_sorted
-        else:
-            # Handle single answer questions
-            correct_answer = str(question.get('correct_answer', '')).strip().lower()
-            student_answer_str = str(answer_value).strip().lower()
-
-            if question['type'] == 'numeric':
-                try:
-                    correct_num = float(question['correct_answer'])
-                    student_num = float(answer_value)
-                    is_correct = correct_num == student_num
-                except:
-                    is_correct = correct_answer == student_answer_str
-            else:
-                is_correct = correct_answer == student_answer_str
-
-        if is_correct:
-            score += question.get('points', 0)
-
-        graded_answers.append({
-            'question_id': question['id'],
-            'answer': json.dumps(answer_value) if isinstance(answer_value, list) else str(answer_value),
-            'is_correct': is_correct
-        })
-
-    percentage = (score / max_score * 100) if max_score > 0 else 0
+exam_cache = TTLCache(maxsize=500, ttl=EXAM_CACHE_TTL_SECONDS)
+exam_loads = SingleFlight()
+# Renewed on invalidation so a fetch that was already in flight is not cached;
+# bounded, and a fetch whose exam was evicted meanwhile is not cached either
+exam_generations = LRUCache(maxsize=10000)
+exam_generation_counter = itertools.count(1)
 
+def supabase_headers() -> Dict[str, str]:
     return {
-        'score': score,
-        'max_score': max_score,
-        'percentage': percentage,
-        'graded_answers': graded_answers
+        'apikey': SUPABASE_SERVICE_ROLE,
+        'Authorization': f'Bearer {SUPABASE_SERVICE_ROLE}',
+        'Content-Type': 'application/json'
     }
 
+async def fetch_exam_with_questions(exam_id: str) -> Tuple[Dict[str, Any], GradingPlan]:
+    """Fetch an exam and its questions in one round trip (PostgREST resource embedding)"""
+    exam_url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/exams?id=eq.{exam_id}&select=*,questions(*)"
+    exam_response = await http_client.get(exam_url, headers=supabase_headers(), deadline=10)
+
+    if exam_response.status_code != 200:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    exams = exam_response.json()
+    if not exams:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    exam = exams[0]
+    exam['questions'] = exam.get('questions') or []
+    return exam, GradingPlan(exam)
+
+async def get_exam_definition(exam_id: str) -> Tuple[Dict[str, Any], GradingPlan]:
+    """
+    Read-through cache of the exam + questions payload and its grading plan.
+    Concurrent misses for the same exam share a single Supabase fetch.
+    """
+    cached = exam_cache.get(exam_id)
+    if cached is not None:
+        return cached
+
+    async def load():
+        generation = exam_generations.get(exam_id)
+        if generation is None:
+            generation = exam_generations[exam_id] = next(exam_generation_counter)
+        entry = await fetch_exam_with_questions(exam_id)
+        if exam_generations.get(exam_id) == generation:
+            exam_cache[exam_id] = entry
+        return entry
+
+    return await exam_loads.do(exam_id, load)
+
+def invalidate_exam(exam_id: str):
+    exam_generations[exam_id] = next(exam_generation_counter)
+    exam_cache.pop(exam_id, None)
+
+async def verify_service_role(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if not SUPABASE_SERVICE_ROLE or not hmac.compare_digest(credentials.credentials, SUPABASE_SERVICE_ROLE):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+@api_router.post("/exams/{exam_id}/invalidate", dependencies=[Depends(verify_service_role)])
+async def invalidate_exam_cache(exam_id: str):
+    """
+    Drop a cached exam definition. Called by a Supabase database webhook on
+    changes to exams/questions, authenticated with the service role key.
+    """
+    invalidate_exam(exam_id)
+    return {"success": True, "exam_id": exam_id}
+
 # ============ EXAM SUBMISSION ROUTE (IMPROVED) ============
 
 @api_router.post("/exams/{exam_id}/submit")
@@ -310,33 +308,8 @@ async def submit_exam(exam_id: str, submission: ExamSubmission, request: Request
         if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
             raise HTTPException(status_code=500, detail="Supabase not configured")
 
-        headers = {
-            'apikey': SUPABASE_SERVICE_ROLE,
-            'Authorization': f'Bearer {SUPABASE_SERVICE_ROLE}',
-            'Content-Type': 'application/json'
-        }
-
-        # Fetch exam
-        exam_url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/exams?id=eq.{exam_id}&select=*"
-        exam_response = requests.get(exam_url, headers=headers, timeout=10)
-        
-        if exam_response.status_code != 200:
-            raise HTTPException(status_code=404, detail="Exam not found")
-
-        exams = exam_response.json()
-        if not exams:
-            raise HTTPException(status_code=404, detail="Exam not found")
-
-        exam = exams[0]
-
-        # Fetch questions
-        questions_url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/questions?exam_id=eq.{exam_id}&select=*"
-        questions_response = requests.get(questions_url, headers=headers, timeout=10)
-        
-        if questions_response.status_code == 200:
-            exam['questions'] = questions_response.json()
-        else:
-            exam['questions'] = []
+        # Exam + questions from the read-through cache (one Supabase round trip on a miss)
+        exam, grading_plan = await get_exam_definition(exam_id)
 
         # Validate time-based access
         settings = exam.get('settings', {})
@@ -364,8 +337,8 @@ async def submit_exam(exam_id: str, submission: ExamSubmission, request: Request
             except ValueError:
                 logger.warning(f"Invalid end_time format: {settings.get('end_time')}")
 
-        # Grade the submission
-        grading_result = grade_submission(exam, submission.answers)
+        # Grade the submission (score and per-answer verdicts in one pass)
+        grading_result = grading_plan.grade(submission.answers)
 
         # Prepare student info
         student_name = submission.student_data.get('name') or submission.student_data.get('student_id') or 'Anonymous'
@@ -376,21 +349,21 @@ async def submit_exam(exam_id: str, submission: ExamSubmission, request: Request
             'exam_id': exam_id,
             'student_name': student_name,
             'student_email': student_email,
-            'score': int(grading_result['score']),
-            'max_score': int(grading_result['max_score']),
-            'percentage': float(grading_result['percentage']),
+            'score': int(grading_result.score),
+            'max_score': int(grading_result.max_score),
+            'percentage': float(grading_result.percentage),
             'violations': [v.model_dump() for v in submission.violations],
             'browser_info': submission.browser_info or {}
         }
 
         submissions_url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/submissions"
-        headers['Prefer'] = 'return=representation'
+        headers = {**supabase_headers(), 'Prefer': 'return=representation'}
 
-        submission_response = requests.post(
+        submission_response = await http_client.post(
             submissions_url,
             json=submission_payload,
             headers=headers,
-            timeout=10
+            deadline=10
         )
 
         if submission_response.status_code not in (200, 201):
@@ -407,21 +380,21 @@ async def submit_exam(exam_id: str, submission: ExamSubmission, request: Request
             submission_id = submission_data.get('id')
 
         # Save graded answers
-        if submission_id and grading_result['graded_answers']:
+        if submission_id and grading_result.verdicts:
             answers_payload = [
                 {
                     'submission_id': submission_id,
-                    **answer
+                    **verdict
                 }
-                for answer in grading_result['graded_answers']
+                for verdict in grading_result.verdicts
             ]
 
             answers_url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/submission_answers"
-            answers_response = requests.post(
+            answers_response = await http_client.post(
                 answers_url,
                 json=answers_payload,
                 headers=headers,
-                timeout=10
+                deadline=10
             )
 
             if answers_response.status_code not in (200, 201):
@@ -431,9 +404,9 @@ async def submit_exam(exam_id: str, submission: ExamSubmission, request: Request
         return {
             "success": True,
             "submission_id": submission_id,
-            "score": grading_result['score'],
-            "max_score": grading_result['max_score'],
-            "percentage": grading_result['percentage'],
+            "score": grading_result.score,
+            "max_score": grading_result.max_score,
+            "percentage": grading_result.percentage,
             "violations_count": len(submission.violations)
         }
 
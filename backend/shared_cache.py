@@ -0,0 +1,237 @@
+"""
+Shared exam cache tier between each worker's local cache and Mongo.
+
+With several uvicorn workers every process has its own in-memory cache.
+SharedExamTier puts one cache all workers can see in front of Mongo (Redis
+when REDIS_URL is set, otherwise an in-process stand-in used for tests and
+single-worker deployments) and broadcasts invalidations:
+
+- Values live under a per-exam generation. Invalidating an exam replaces the
+  generation with a new random token, so a reload that raced with the write
+  can only fill a key nobody reads any more. Generation keys expire after
+  `generation_ttl` (never shorter than the value ttl), and an exam with no
+  generation reads its values under '0': every value stored under '0' before
+  the exam was last invalidated has expired by the time its token does.
+- A fill lock per (exam, generation) lets exactly one worker reload a changed
+  exam; the others wait briefly for the shared copy.
+- Invalidations are published on a channel; every worker's listeners drop
+  their local copies at once.
+
+Any failure of the shared backend degrades to loading straight from Mongo.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'exam-cache:invalidate'
+
+Listener = Callable[[str], None]
+
+
+class LocalSharedCache:
+    """In-process stand-in for Redis with the same semantics."""
+
+    # Expired keys are swept once the store doubles past this size
+    PURGE_THRESHOLD = 1024
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, float]] = {}
+        self._listeners: List[Listener] = []
+        self._purge_at = self.PURGE_THRESHOLD
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at and time.monotonic() >= expires_at:
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._values[key] = (value, time.monotonic() + ttl if ttl else 0)
+        if len(self._values) >= self._purge_at:
+            self._purge()
+
+    def _purge(self):
+        now = time.monotonic()
+        for key in [key for key, (_, expires_at) in self._values.items() if expires_at and now >= expires_at]:
+            del self._values[key]
+        self._purge_at = max(self.PURGE_THRESHOLD, 2 * len(self._values))
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        if await self.get(key) is not None:
+            return None
+        token = uuid.uuid4().hex
+        await self.set(key, token.encode(), ttl)
+        return token
+
+    async def release_lock(self, key: str, token: str):
+        if await self.get(key) == token.encode():
+            self._values.pop(key, None)
+
+    def add_listener(self, listener: Listener):
+        self._listeners.append(listener)
+
+    async def publish(self, exam_id: str):
+        for listener in self._listeners:
+            listener(exam_id)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class RedisSharedCache:
+    """Redis backend; invalidations travel over Redis pub/sub."""
+
+    _RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis_asyncio
+
+        self._redis = redis_asyncio.from_url(url)
+        self._listeners: List[Listener] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        await self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = await self._redis.set(key, token, nx=True, px=int(ttl * 1000))
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str):
+        await self._redis.eval(self._RELEASE_SCRIPT, 1, key, token)
+
+    def add_listener(self, listener: Listener):
+        self._listeners.append(listener)
+
+    async def publish(self, exam_id: str):
+        await self._redis.publish(INVALIDATION_CHANNEL, exam_id)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    exam_id = message['data'].decode() if isinstance(message['data'], bytes) else message['data']
+                    for listener in self._listeners:
+                        listener(exam_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Exam cache invalidation subscription lost, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._redis.close()
+
+
+def create_shared_cache(redis_url: Optional[str]):
+    if redis_url:
+        try:
+            backend = RedisSharedCache(redis_url)
+            logger.info("Shared exam cache: Redis")
+            return backend
+        except ImportError:
+            logger.warning("REDIS_URL is set but the redis package is not installed; using in-process cache")
+    return LocalSharedCache()
+
+
+class SharedExamTier:
+    """Generation-keyed, fill-locked exam payload cache over a shared backend."""
+
+    def __init__(
+        self,
+        backend,
+        ttl: float = 300,
+        missing_ttl: float = 5,
+        lock_ttl: float = 10,
+        generation_ttl: float = 86400,
+        wait_timeout: float = 2.0,
+        poll_interval: float = 0.05,
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.lock_ttl = lock_ttl
+        # Outlives every value stored under the previous generation
+        self.generation_ttl = max(generation_ttl, ttl, missing_ttl)
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+    async def _generation(self, exam_id: str) -> str:
+        generation = await self.backend.get(f"exam-cache:gen:{exam_id}")
+        return generation.decode() if generation else '0'
+
+    async def get_or_load(self, exam_id: str, load: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        """Shared copy of an exam payload; only one worker runs `load` per generation."""
+        try:
+            generation = await self._generation(exam_id)
+            key = f"exam-cache:public:{exam_id}:{generation}"
+            value = await self.backend.get(key)
+            if value is not None:
+                # An empty value caches "not found" briefly
+                return value or None
+
+            lock_key = f"exam-cache:lock:{exam_id}:{generation}"
+            token = await self.backend.acquire_lock(lock_key, self.lock_ttl)
+            if token is None:
+                # Another worker is reloading this exam; wait for its copy
+                deadline = time.monotonic() + self.wait_timeout
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(self.poll_interval)
+                    value = await self.backend.get(key)
+                    if value is not None:
+                        return value or None
+                return await load()
+        except Exception as e:
+            logger.warning(f"Shared exam cache unavailable, loading exam {exam_id} directly: {e}")
+            return await load()
+
+        try:
+            value = await load()
+            try:
+                await self.backend.set(key, value or b'', self.ttl if value else self.missing_ttl)
+            except Exception as e:
+                logger.warning(f"Failed to store exam {exam_id} in shared cache: {e}")
+            return value
+        finally:
+            try:
+                await self.backend.release_lock(lock_key, token)
+            except Exception as e:
+                logger.warning(f"Failed to release exam cache fill lock: {e}")
+
+    async def invalidate(self, exam_id: str):
+        """Retire the current shared copy and tell every worker to drop its local one."""
+        await self.backend.set(f"exam-cache:gen:{exam_id}", uuid.uuid4().hex.encode(), self.generation_ttl)
+        await self.backend.publish(exam_id)
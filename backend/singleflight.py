@@ -0,0 +1,34 @@
+"""
+Single-flight coalescing of concurrent async loads.
+
+While a load for a key is in flight, every other caller asking for the same
+key awaits that load instead of starting its own, so a burst of cache misses
+causes exactly one upstream fetch.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        # Shielded so a cancelled caller does not cancel the load for the others
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved; callers that are still waiting get it re-raised
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,280 @@
+"""
+Durable outbox for mirroring exam attempts into Supabase (Postgres).
+
+submit_exam writes an outbox entry next to every exam_attempts document
+instead of calling Supabase inline. A worker drains the outbox in batches:
+all pending submissions are upserted with one bulk POST to
+/rest/v1/submissions, then all of their verdicts with one bulk POST to
+/rest/v1/submission_answers. Both are upserts keyed on the rows' unique
+columns, so resending a batch after a lost reply is harmless.
+
+A batch Supabase rejects outright (a 4xx response, e.g. one malformed row) is
+split in halves and each half posted again, so only the offending entry is
+retried; other failures (5xx, timeouts) retry the whole batch. Retries use
+exponential backoff and jitter; entries that keep failing are dead-lettered
+(kept with status 'dead' for inspection) instead of being dropped.
+"""
+
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PENDING = 'pending'
+OUTBOX_INFLIGHT = 'inflight'
+OUTBOX_DEAD = 'dead'
+
+
+class RowsRejected(RuntimeError):
+    """Supabase refused the rows themselves (4xx); resending them unchanged will not help"""
+
+
+def build_outbox_entry(submission_row: Dict[str, Any], answer_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Outbox document for one attempt; submission_row['id'] is the attempt id."""
+    now = datetime.now(timezone.utc)
+    return {
+        'id': submission_row['id'],
+        'status': OUTBOX_PENDING,
+        'submission': submission_row,
+        'answers': answer_rows,
+        # Set once the submissions row is upserted, so a retry only resends answers
+        'submission_mirrored': False,
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now,
+        'last_error': None,
+    }
+
+
+class SupabaseOutbox:
+    def __init__(
+        self,
+        get_db: Callable[[], Any],
+        supabase_url: Optional[str],
+        service_role: Optional[str],
+        batch_size: int = 200,
+        poll_interval: float = 1.0,
+        max_attempts: int = 8,
+        base_backoff: float = 2.0,
+        max_backoff: float = 300.0,
+        lease_seconds: float = 60.0,
+    ):
+        self.get_db = get_db
+        self.supabase_url = supabase_url.rstrip('/') if supabase_url else None
+        self.service_role = service_role
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            'mirrored_total': 0,
+            'failed_batches': 0,
+            'dead_lettered': 0,
+            'last_batch_size': 0,
+            'last_drain_at': None,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.supabase_url and self.service_role)
+
+    @property
+    def collection(self):
+        return self.get_db().supabase_outbox
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("id", 1)], unique=True)
+        await self.collection.create_index([("status", 1), ("next_attempt_at", 1)])
+
+    async def enqueue(self, entry: Dict[str, Any]):
+        await self.collection.insert_one(entry)
+        self._wakeup.set()
+
+    # ---- worker ----
+
+    def start(self):
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        logger.info("📤 Supabase outbox worker started")
+        while True:
+            try:
+                drained = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Supabase outbox drain failed: {e}")
+                drained = 0
+            # Keep draining while full batches come back, otherwise wait for new work
+            if drained < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _due_filter(self, now: datetime) -> Dict[str, Any]:
+        return {'$or': [
+            {'status': OUTBOX_PENDING, 'next_attempt_at': {'$lte': now}},
+            # Entries whose worker died mid-batch become claimable again
+            {'status': OUTBOX_INFLIGHT, 'lease_until': {'$lte': now}},
+        ]}
+
+    async def _claim_batch(self) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        due = self._due_filter(now)
+        candidates = await self.collection.find(due, {'_id': 0, 'id': 1}) \
+            .sort('next_attempt_at', 1).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+
+        token = uuid.uuid4().hex
+        await self.collection.update_many(
+            {'id': {'$in': [c['id'] for c in candidates]}, **due},
+            {'$set': {
+                'status': OUTBOX_INFLIGHT,
+                'lease_token': token,
+                'lease_until': now + timedelta(seconds=self.lease_seconds),
+            }}
+        )
+        return await self.collection.find({'lease_token': token, 'status': OUTBOX_INFLIGHT}, {'_id': 0}) \
+            .to_list(self.batch_size)
+
+    async def drain_once(self) -> int:
+        """Mirror one batch of due entries. Returns the number of entries claimed."""
+        if not self.enabled:
+            return 0
+        entries = await self._claim_batch()
+        if not entries:
+            return 0
+
+        self.counters['last_batch_size'] = len(entries)
+        self.counters['last_drain_at'] = datetime.now(timezone.utc).isoformat()
+        failures = await self._mirror(entries)
+        failed_ids = set()
+        for failed, error in failures:
+            await self._schedule_retry(failed, error)
+            failed_ids.update(e['id'] for e in failed)
+
+        mirrored = [e['id'] for e in entries if e['id'] not in failed_ids]
+        if mirrored:
+            await self.collection.delete_many({'id': {'$in': mirrored}})
+            self.counters['mirrored_total'] += len(mirrored)
+            logger.info(f"✅ Mirrored {len(mirrored)} submissions to Supabase")
+        return len(entries)
+
+    async def _mirror(self, entries: List[Dict[str, Any]]) -> List[Tuple[List[Dict[str, Any]], str]]:
+        """Post `entries`; returns the groups that failed, bisecting rejected batches down to the bad entry"""
+        try:
+            await self._post_entries(entries)
+        except RowsRejected as e:
+            if len(entries) == 1:
+                return [(entries, str(e))]
+            middle = len(entries) // 2
+            return await self._mirror(entries[:middle]) + await self._mirror(entries[middle:])
+        except Exception as e:
+            return [(entries, str(e))]
+        return []
+
+    async def _post_entries(self, entries: List[Dict[str, Any]]):
+        unmirrored = [e for e in entries if not e.get('submission_mirrored')]
+        if unmirrored:
+            await self._post(
+                'submissions?on_conflict=id',
+                [e['submission'] for e in unmirrored],
+                prefer='resolution=merge-duplicates,return=minimal'
+            )
+            await self.collection.update_many(
+                {'id': {'$in': [e['id'] for e in unmirrored]}},
+                {'$set': {'submission_mirrored': True}}
+            )
+            for entry in unmirrored:
+                entry['submission_mirrored'] = True
+
+        answer_rows = [row for e in entries for row in e.get('answers') or []]
+        if answer_rows:
+            await self._post(
+                'submission_answers?on_conflict=submission_id,question_id',
+                answer_rows,
+                prefer='resolution=merge-duplicates,return=minimal'
+            )
+
+    async def _post(self, path: str, rows: List[Dict[str, Any]], prefer: str):
+        headers = {
+            'apikey': self.service_role,
+            'Authorization': f'Bearer {self.service_role}',
+            'Content-Type': 'application/json',
+            'Prefer': prefer,
+        }
+        url = f"{self.supabase_url}/rest/v1/{path}"
+        r = await http_client.post(url, json=rows, headers=headers, deadline=10)
+        if 400 <= r.status_code < 500 and r.status_code not in (408, 429):
+            raise RowsRejected(f"POST {path} rejected: {r.status_code} {r.text[:500]}")
+        if not (200 <= r.status_code < 300):
+            raise RuntimeError(f"POST {path} failed: {r.status_code} {r.text[:500]}")
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _schedule_retry(self, entries: List[Dict[str, Any]], error: str):
+        self.counters['failed_batches'] += 1
+        logger.warning(f"Supabase mirroring failed for {len(entries)} submissions: {error}")
+        now = datetime.now(timezone.utc)
+        for entry in entries:
+            attempts = entry.get('attempts', 0) + 1
+            update = {'attempts': attempts, 'last_error': error, 'lease_token': None}
+            if attempts >= self.max_attempts:
+                update['status'] = OUTBOX_DEAD
+                self.counters['dead_lettered'] += 1
+                logger.error(f"❌ Dead-lettered Supabase mirror of submission {entry['id']} after {attempts} attempts")
+            else:
+                update['status'] = OUTBOX_PENDING
+                update['next_attempt_at'] = now + timedelta(seconds=self._backoff(attempts))
+            await self.collection.update_one({'id': entry['id']}, {'$set': update})
+
+    # ---- metrics ----
+
+    async def stats(self) -> Dict[str, Any]:
+        coll = self.collection
+        pending = await coll.count_documents({'status': {'$in': [OUTBOX_PENDING, OUTBOX_INFLIGHT]}})
+        dead = await coll.count_documents({'status': OUTBOX_DEAD})
+        oldest = await coll.find(
+            {'status': {'$in': [OUTBOX_PENDING, OUTBOX_INFLIGHT]}}, {'_id': 0, 'created_at': 1}
+        ).sort('created_at', 1).limit(1).to_list(1)
+
+        lag_seconds = 0.0
+        if oldest:
+            created_at = oldest[0]['created_at']
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            lag_seconds = round((datetime.now(timezone.utc) - created_at).total_seconds(), 3)
+
+        return {
+            'enabled': self.enabled,
+            'worker_running': self._task is not None and not self._task.done(),
+            'pending': pending,
+            'dead': dead,
+            'lag_seconds': lag_seconds,
+            **self.counters,
+        }
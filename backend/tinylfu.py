@@ -0,0 +1,224 @@
+"""
+Byte-budgeted cache with W-TinyLFU admission.
+
+Entries are bounded by their total size rather than their count, so one exam
+with hundreds of image-heavy questions costs what it weighs. Layout:
+
+- A small LRU window (1% of the budget) absorbs new entries and short bursts.
+- The main region is a segmented LRU: probation (20%) and protected (80%).
+  A hit in probation promotes the entry to protected.
+- When the window overflows, its oldest entry only enters the main region if
+  a count-min sketch says it is accessed more often than the entries it would
+  evict. A scan of one-off exam IDs therefore cannot push out live exams.
+
+The sketch is halved periodically so popularity from yesterday's exams fades.
+Not thread-safe; it is used from the event loop only.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List
+
+WINDOW = 'window'
+PROBATION = 'probation'
+PROTECTED = 'protected'
+
+
+class FrequencySketch:
+    """Count-min sketch with 4-bit saturating counters and periodic aging."""
+
+    DEPTH = 4
+    MAX_COUNT = 15
+
+    def __init__(self, expected_entries: int = 10000):
+        width = 1
+        while width < max(expected_entries, 16):
+            width <<= 1
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(self.DEPTH)]
+        self._sample_size = 10 * width
+        self._additions = 0
+
+    def _indexes(self, key: Hashable):
+        h = hash(key)
+        for i in range(self.DEPTH):
+            # Cheap independent-enough index per row from one hash
+            h = (h * 0x9E3779B1 + i * 0x85EBCA77) & 0xFFFFFFFFFFFF
+            yield i, (h ^ (h >> 17)) & self._mask
+
+    def frequency(self, key: Hashable) -> int:
+        return min(self._rows[i][j] for i, j in self._indexes(key))
+
+    def increment(self, key: Hashable):
+        for i, j in self._indexes(key):
+            if self._rows[i][j] < self.MAX_COUNT:
+                self._rows[i][j] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._age()
+
+    def _age(self):
+        for row in self._rows:
+            for j in range(len(row)):
+                row[j] >>= 1
+        self._additions //= 2
+
+
+class TinyLFUCache:
+    def __init__(
+        self,
+        max_bytes: int,
+        getsizeof: Callable[[Any], int],
+        expected_entries: int = 10000,
+        window_ratio: float = 0.01,
+        protected_ratio: float = 0.8,
+    ):
+        self.max_bytes = max_bytes
+        self.getsizeof = getsizeof
+        self.window_max = max(1, int(max_bytes * window_ratio))
+        self.main_max = max_bytes - self.window_max
+        self.protected_max = int(self.main_max * protected_ratio)
+
+        self._segments: Dict[str, OrderedDict] = {
+            WINDOW: OrderedDict(),
+            PROBATION: OrderedDict(),
+            PROTECTED: OrderedDict(),
+        }
+        self._bytes = {WINDOW: 0, PROBATION: 0, PROTECTED: 0}
+        # key -> (segment, size)
+        self._index: Dict[Hashable, List] = {}
+        self._sketch = FrequencySketch(expected_entries)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    @property
+    def currsize(self) -> int:
+        return sum(self._bytes.values())
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        self._sketch.increment(key)
+        slot = self._index.get(key)
+        if slot is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        segment = slot[0]
+        value = self._segments[segment][key]
+        if segment == PROBATION:
+            self._move(key, PROBATION, PROTECTED)
+            self._rebalance_protected()
+        else:
+            self._segments[segment].move_to_end(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        size = self.getsizeof(value)
+        slot = self._index.get(key)
+        if slot is not None:
+            # Replace in place, keeping the entry's segment and recency
+            segment, old_size = slot
+            self._segments[segment][key] = value
+            self._segments[segment].move_to_end(key)
+            self._bytes[segment] += size - old_size
+            slot[1] = size
+            self._enforce_main_budget()
+            self._evict_window()
+            return
+        if size > self.main_max:
+            # Could never be admitted without emptying the whole cache
+            self.rejections += 1
+            return
+        self._sketch.increment(key)
+        self._segments[WINDOW][key] = value
+        self._bytes[WINDOW] += size
+        self._index[key] = [WINDOW, size]
+        self._evict_window()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        slot = self._index.pop(key, None)
+        if slot is None:
+            return default
+        segment, size = slot
+        self._bytes[segment] -= size
+        return self._segments[segment].pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "bytes": self.currsize,
+            "max_bytes": self.max_bytes,
+            "window_bytes": self._bytes[WINDOW],
+            "probation_bytes": self._bytes[PROBATION],
+            "protected_bytes": self._bytes[PROTECTED],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+        }
+
+    def _move(self, key: Hashable, source: str, target: str):
+        value = self._segments[source].pop(key)
+        slot = self._index[key]
+        self._bytes[source] -= slot[1]
+        self._segments[target][key] = value
+        self._bytes[target] += slot[1]
+        slot[0] = target
+
+    def _rebalance_protected(self):
+        # Overflow from protected goes back to probation, not out of the cache
+        while self._bytes[PROTECTED] > self.protected_max and len(self._segments[PROTECTED]) > 1:
+            oldest = next(iter(self._segments[PROTECTED]))
+            self._move(oldest, PROTECTED, PROBATION)
+
+    def _evict_window(self):
+        window = self._segments[WINDOW]
+        while self._bytes[WINDOW] > self.window_max and window:
+            candidate = next(iter(window))
+            size = self._index[candidate][1]
+            if self._admit(candidate, size):
+                self._move(candidate, WINDOW, PROBATION)
+            else:
+                self._evict(candidate, rejected=True)
+
+    def _admit(self, candidate: Hashable, size: int) -> bool:
+        """Make room in the main region for `candidate` if it is worth more than the victims."""
+        free = self.main_max - self._bytes[PROBATION] - self._bytes[PROTECTED]
+        if size <= free:
+            return True
+        victims = []
+        needed = size - free
+        for segment in (PROBATION, PROTECTED):
+            for key in self._segments[segment]:
+                if needed <= 0:
+                    break
+                victims.append(key)
+                needed -= self._index[key][1]
+        candidate_frequency = self._sketch.frequency(candidate)
+        if needed > 0 or any(self._sketch.frequency(v) >= candidate_frequency for v in victims):
+            return False
+        for victim in victims:
+            self._evict(victim)
+        return True
+
+    def _enforce_main_budget(self):
+        for segment in (PROBATION, PROTECTED):
+            entries = self._segments[segment]
+            while self._bytes[PROBATION] + self._bytes[PROTECTED] > self.main_max and entries:
+                self._evict(next(iter(entries)))
+
+    def _evict(self, key: Hashable, rejected: bool = False):
+        self.pop(key)
+        if rejected:
+            self.rejections += 1
+        else:
+            self.evictions += 1
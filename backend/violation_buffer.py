@@ -0,0 +1,194 @@
+"""
+Buffered ingestion of proctoring violations.
+
+Clients report every tab switch or right-click as it happens, so a class that
+alt-tabs at once used to become thousands of one-document inserts per second.
+ViolationBuffer queues the log documents in memory and a background task
+writes them with one unordered insert_many whenever `max_batch` documents are
+waiting or `flush_interval` seconds have passed. Stop() flushes what is left.
+
+The buffer also counts violations per (exam_id, session_id) as they arrive,
+so a session can be flagged against the exam's max_violations the moment it
+crosses the limit, without querying the log. Counters live in this worker
+only (sessions that hit several workers are counted per worker) and expire
+after `session_ttl` seconds of inactivity; submit still flags from the
+violations it receives.
+
+If Mongo is unavailable, failed documents are put back in front of the
+queue and retried up to `max_attempts` times, then dropped (and counted as
+dead); the queue is capped at `max_pending` documents and the oldest are
+dropped beyond that. insert_many sets `_id` on every document it is given, so
+a retried document that the server had already stored fails with a
+duplicate key error: those count as written rather than failed.
+`on_written` runs with the documents each flush stored; if it fails they are
+not retried, so it must be repairable from the logs.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class ViolationBuffer:
+    def __init__(
+        self,
+        get_db: Callable[[], Any],
+        max_batch: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 50000,
+        session_ttl: float = 6 * 3600,
+        max_sessions: int = 100000,
+        on_written: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None,
+        max_attempts: int = 5,
+    ):
+        self.get_db = get_db
+        # Called with every batch once it is stored (e.g. to update rollups)
+        self.on_written = on_written
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        # [document, failed attempts so far]
+        self._pending: Deque[List[Any]] = deque()
+        self._sessions: TTLCache = TTLCache(maxsize=max_sessions, ttl=session_ttl)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.counters = {
+            "received": 0, "written": 0, "batches": 0, "dropped": 0, "dead": 0,
+            "failed_batches": 0, "failed_callbacks": 0,
+        }
+
+    @property
+    def collection(self):
+        return self.get_db().violation_logs
+
+    def add(self, docs: List[Dict[str, Any]], session: Optional[Tuple[str, str]] = None) -> Optional[int]:
+        """
+        Queue violation log documents. With a (exam_id, session_id) key, returns
+        that session's running violation count.
+        """
+        self._pending.extend([doc, 0] for doc in docs)
+        self.counters["received"] += len(docs)
+        self._trim()
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+        if session is None:
+            return None
+        count = self._sessions.get(session, 0) + len(docs)
+        self._sessions[session] = count
+        return count
+
+    def count(self, exam_id: str, session_id: Optional[str]) -> int:
+        if not session_id:
+            return 0
+        return self._sessions.get((exam_id, session_id), 0)
+
+    def _trim(self):
+        overflow = len(self._pending) - self.max_pending
+        for _ in range(max(overflow, 0)):
+            self._pending.popleft()
+        if overflow > 0:
+            self.counters["dropped"] += overflow
+
+    async def _insert(self, docs: List[Dict[str, Any]]) -> Dict[int, Optional[Exception]]:
+        """Insert `docs`; returns {index: error} of the documents that were not stored"""
+        try:
+            await self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {}
+            for error in e.details.get('writeErrors', []):
+                # Already stored by an earlier attempt whose reply was lost
+                if error.get('code') != DUPLICATE_KEY:
+                    failed[error['index']] = None
+            return failed
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {i: e for i in range(len(docs))}
+        return {}
+
+    async def flush(self) -> int:
+        """Write everything queued so far in batches of `max_batch`. Returns documents written."""
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                try:
+                    failed = await self._insert([doc for doc, _ in batch])
+                except asyncio.CancelledError:
+                    self._pending.extendleft(reversed(batch))
+                    raise
+
+                stored = [doc for i, (doc, _) in enumerate(batch) if i not in failed]
+                written += len(stored)
+                self.counters["written"] += len(stored)
+                self.counters["batches"] += 1
+                if stored and self.on_written is not None:
+                    try:
+                        await self.on_written(stored)
+                    except Exception as e:
+                        # The logs are stored; retrying would write them twice
+                        self.counters["failed_callbacks"] += 1
+                        logger.error(f"Post-write step for {len(stored)} violation logs failed: {e}")
+                if not failed:
+                    continue
+
+                self.counters["failed_batches"] += 1
+                error = next((e for e in failed.values() if e is not None), None)
+                logger.error(f"Failed to write {len(failed)} of {len(batch)} violation logs: {error or 'write errors'}")
+                retry = []
+                for i in failed:
+                    entry = batch[i]
+                    entry[1] += 1
+                    if entry[1] >= self.max_attempts:
+                        self.counters["dead"] += 1
+                    else:
+                        retry.append(entry)
+                # Back in front, in order, for the next flush
+                self._pending.extendleft(reversed(retry))
+                self._trim()
+                break
+        return written
+
+    # ---- flusher ----
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Violation log flush failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "pending": len(self._pending), "sessions": len(self._sessions)}
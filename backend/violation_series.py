@@ -0,0 +1,250 @@
+"""
+Time-series storage and per-minute rollups of proctoring violations.
+
+`violation_logs` is a MongoDB time-series collection (timeField `logged_at`,
+metaField `exam_id`): events of one exam are stored together in compressed
+buckets and expire after the retention period. Each flushed batch of logs is
+also folded into `violation_rollups`, one document per (exam, minute,
+violation type) incremented with $inc, so proctor charts read a few hundred
+rollups instead of scanning the events.
+
+Rollups can be rebuilt from the logs still retained. A rebuild only rewrites
+minutes that ended at least `settle_seconds` ago: flushes still $inc the
+current minutes, and rewriting those could drop their increments. It also
+leaves minutes older than the retention period alone, since their events
+have expired while their rollups are kept. Rollups are overwritten in place
+with $set, never deleted and re-inserted.
+
+Databases created before the time-series layout keep a plain
+`violation_logs` collection until it is migrated with --migrate: the old
+collection is renamed to `violation_logs_legacy`, its events are moved into
+the time-series collection in batches (string timestamps become dates) and
+rollups are rebuilt. Events keep their _id, and each batch skips events
+already copied, so re-running resumes an interrupted migration without
+duplicates. The migration must run with the API stopped: a violation flushed
+between the rename and the creation of the time-series collection would
+recreate a plain `violation_logs`, and the migration stops with an error
+rather than mix the two layouts.
+
+Requires MongoDB 5.0+ for time-series collections.
+
+Usage:
+    python violation_series.py --migrate            # move a plain violation_logs collection (API stopped)
+    python violation_series.py --rebuild <exam_id>  # recompute one exam's rollups
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+LOGS = 'violation_logs'
+LEGACY_LOGS = 'violation_logs_legacy'
+DEFAULT_RETENTION_DAYS = 180
+MIGRATE_BATCH_SIZE = 5000
+# Longer than a flush takes to reach the rollups, retries included
+ROLLUP_SETTLE_SECONDS = 120
+
+
+def _utc(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+def minute_of(moment: datetime) -> datetime:
+    return _utc(moment).replace(second=0, microsecond=0)
+
+
+def _as_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+async def _collection_type(db, name: str) -> Optional[str]:
+    cursor = await db.list_collections(filter={'name': name})
+    infos = await cursor.to_list(1)
+    return infos[0].get('type', 'collection') if infos else None
+
+
+async def ensure_collections(db, retention_days: float = DEFAULT_RETENTION_DAYS):
+    expire_after = int(retention_days * 86400)
+    kind = await _collection_type(db, LOGS)
+    if kind is None:
+        await db.create_collection(
+            LOGS,
+            timeseries={'timeField': 'logged_at', 'metaField': 'exam_id', 'granularity': 'seconds'},
+            expireAfterSeconds=expire_after,
+        )
+    elif kind == 'timeseries':
+        # Keep retention in line with the configuration
+        await db.command('collMod', LOGS, expireAfterSeconds=expire_after)
+    else:
+        logger.warning(f"⚠️ {LOGS} is a plain collection; run `python violation_series.py --migrate`")
+    await db.violation_rollups.create_index([('exam_id', 1), ('minute', 1), ('type', 1)], unique=True)
+
+
+def rollup_counts(docs: Iterable[Dict[str, Any]]) -> Counter:
+    counts: Counter = Counter()
+    for doc in docs:
+        violation_type = (doc.get('violation') or {}).get('type') or 'unknown'
+        counts[(doc['exam_id'], minute_of(_as_datetime(doc['logged_at'])), violation_type)] += 1
+    return counts
+
+
+async def record_rollups(db, docs: List[Dict[str, Any]]):
+    """Fold a batch of violation log documents into the per-minute rollups"""
+    counts = rollup_counts(docs)
+    if not counts:
+        return
+    await db.violation_rollups.bulk_write([
+        UpdateOne(
+            {'exam_id': exam_id, 'minute': minute, 'type': violation_type},
+            {'$inc': {'count': count}},
+            upsert=True,
+        )
+        for (exam_id, minute, violation_type), count in counts.items()
+    ], ordered=False)
+
+
+async def get_timeline(
+    db, exam_id: str, since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """Violations per minute and type, oldest first"""
+    query: Dict[str, Any] = {'exam_id': exam_id}
+    if since or until:
+        query['minute'] = {}
+        if since:
+            query['minute']['$gte'] = minute_of(since)
+        if until:
+            query['minute']['$lte'] = _utc(until)
+    cursor = db.violation_rollups.find(query, {'_id': 0, 'minute': 1, 'type': 1, 'count': 1}).sort(
+        [('minute', 1), ('type', 1)]
+    )
+    return await cursor.to_list(None)
+
+
+async def rebuild_rollups(
+    db, exam_id: str, settle_seconds: float = ROLLUP_SETTLE_SECONDS, retention_days: float = DEFAULT_RETENTION_DAYS
+) -> int:
+    """Recompute an exam's settled, retained rollups from its logs; returns the number of rollup documents"""
+    now = datetime.now(timezone.utc)
+    cutoff = minute_of(now - timedelta(seconds=settle_seconds))
+    # First minute whose events are all still retained
+    retained_from = minute_of(now - timedelta(days=retention_days)) + timedelta(minutes=1)
+    counts: Counter = Counter()
+    query = {'exam_id': exam_id, 'logged_at': {'$gte': retained_from, '$lt': cutoff}}
+    async for doc in db[LOGS].find(query, {'_id': 0, 'exam_id': 1, 'logged_at': 1, 'violation.type': 1}):
+        counts.update(rollup_counts([doc]))
+
+    writes: List[Any] = [
+        UpdateOne({'exam_id': exam_id, 'minute': minute, 'type': violation_type}, {'$set': {'count': count}}, upsert=True)
+        for (_, minute, violation_type), count in counts.items()
+    ]
+    # Settled, retained rollups with no events behind them
+    existing = db.violation_rollups.find(
+        {'exam_id': exam_id, 'minute': {'$gte': retained_from, '$lt': cutoff}}, {'minute': 1, 'type': 1}
+    )
+    async for rollup in existing:
+        if (exam_id, _utc(rollup['minute']), rollup['type']) not in counts:
+            writes.append(DeleteOne({'_id': rollup['_id']}))
+    if writes:
+        await db.violation_rollups.bulk_write(writes, ordered=False)
+    return len(counts)
+
+
+async def migrate_legacy(db, retention_days: float = DEFAULT_RETENTION_DAYS, batch_size: int = MIGRATE_BATCH_SIZE) -> Tuple[int, int]:
+    """Move a plain violation_logs collection into the time-series layout; returns (events, exams)"""
+    kind = await _collection_type(db, LOGS)
+    legacy = await _collection_type(db, LEGACY_LOGS)
+    if kind == 'timeseries':
+        if legacy is None:
+            return 0, 0
+    elif kind is not None:
+        if legacy is not None:
+            raise RuntimeError(
+                f"{LOGS} was recreated as a plain collection while {LEGACY_LOGS} was being migrated; "
+                f"stop the API, move its events into {LEGACY_LOGS} and re-run --migrate"
+            )
+        await db[LOGS].rename(LEGACY_LOGS)
+    await ensure_collections(db, retention_days)
+    if await _collection_type(db, LOGS) != 'timeseries':
+        raise RuntimeError(f"{LOGS} was recreated as a plain collection during the migration; stop the API and re-run --migrate")
+
+    moved = 0
+
+    async def copy(batch: List[Dict[str, Any]]):
+        # Time-series collections have no unique _id, so skip events an interrupted run already copied
+        ids = [doc['_id'] for doc in batch]
+        copied = await db[LOGS].distinct('_id', {
+            'exam_id': {'$in': list({doc['exam_id'] for doc in batch})},
+            'logged_at': {'$gte': min(doc['logged_at'] for doc in batch), '$lte': max(doc['logged_at'] for doc in batch)},
+            '_id': {'$in': ids},
+        })
+        copied = set(copied)
+        missing = [doc for doc in batch if doc['_id'] not in copied]
+        if missing:
+            await db[LOGS].insert_many(missing, ordered=False)
+        # Copied events leave the legacy collection, so an interrupted run can resume
+        await db[LEGACY_LOGS].delete_many({'_id': {'$in': ids}})
+
+    batch: List[Dict[str, Any]] = []
+    async for doc in db[LEGACY_LOGS].find({}).sort('_id', 1).batch_size(batch_size):
+        doc['logged_at'] = _utc(_as_datetime(doc['logged_at']))
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await copy(batch)
+            moved += len(batch)
+            batch = []
+            logger.info(f"Migrated {moved} violation logs")
+    if batch:
+        await copy(batch)
+        moved += len(batch)
+
+    # Includes exams moved by an earlier, interrupted run
+    exam_ids = await db[LOGS].distinct('exam_id')
+    for exam_id in exam_ids:
+        # Nothing is being written, so every minute is settled
+        await rebuild_rollups(db, exam_id, settle_seconds=0, retention_days=retention_days)
+    await db[LEGACY_LOGS].drop()
+    return moved, len(exam_ids)
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Maintain the violation_logs time series and its rollups")
+    parser.add_argument('--migrate', action='store_true',
+                        help="move a plain violation_logs collection to time-series; stop the API first")
+    parser.add_argument('--rebuild', metavar='EXAM_ID', help="recompute one exam's per-minute rollups")
+    args = parser.parse_args()
+    if not args.migrate and not args.rebuild:
+        parser.error("pass --migrate or --rebuild EXAM_ID")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    retention = float(os.environ.get('VIOLATION_LOG_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+
+    try:
+        if args.migrate:
+            moved, exams = asyncio.run(migrate_legacy(db, retention))
+            print(f"✅ Moved {moved} violation logs of {exams} exams to the time-series collection")
+        else:
+            count = asyncio.run(rebuild_rollups(db, args.rebuild, retention_days=retention))
+            print(f"✅ Rebuilt {count} rollups for exam {args.rebuild}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
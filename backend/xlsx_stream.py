@@ -0,0 +1,164 @@
+"""
+Streaming XLSX writer.
+
+openpyxl (even in write-only mode) only assembles the zip container when the
+workbook is saved, so nothing can be sent before the last row is written.
+This writer produces a minimal single-sheet workbook directly into a zip
+stream: rows are compressed as they are written and the produced bytes can be
+drained after every batch, so a download starts immediately and memory stays
+flat however many rows there are.
+
+Cells are numbers or inline strings; the header row uses a bold white on
+blue style. Column widths must be known up front (they precede the rows in
+the sheet XML), so callers estimate them from a sample.
+"""
+
+import re
+import zipfile
+from typing import Any, BinaryIO, Iterable, List, Optional, Sequence
+from xml.sax.saxutils import escape, quoteattr
+
+# Characters XML 1.0 does not allow, which Excel refuses to open
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+MAX_COLUMN_WIDTH = 50
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Style 0: default; style 1: header (bold white text on blue, centered)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font></fonts>'
+    '<fills count="3"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF4472C4"/><bgColor rgb="FF4472C4"/></patternFill></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def column_letter(index: int) -> str:
+    """1-based column index -> A, B, ..., Z, AA, ..."""
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def estimate_widths(rows: Iterable[Sequence[Any]], columns: int) -> List[float]:
+    widths = [0] * columns
+    for row in rows:
+        for i, value in enumerate(row[:columns]):
+            widths[i] = max(widths[i], len(str(value)) if value is not None else 0)
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+
+class ChunkSink:
+    """Write-only, non-seekable file object that buffers bytes until drained."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class StreamingXlsxWriter:
+    def __init__(self, sink: BinaryIO, sheet_title: str, widths: Optional[List[float]] = None):
+        self.sink = sink
+        self._zip = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        self._zip.writestr('_rels/.rels', _ROOT_RELS)
+        self._zip.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        self._zip.writestr('xl/styles.xml', _STYLES)
+        self._zip.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name={quoteattr(sheet_title[:31])} sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        self._sheet = self._zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self._rows = 0
+        self._letters: List[str] = []
+        head = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        )
+        if widths:
+            head += '<cols>' + ''.join(
+                f'<col min="{i}" max="{i}" width="{width}" customWidth="1"/>'
+                for i, width in enumerate(widths, start=1)
+            ) + '</cols>'
+        self._sheet.write((head + '<sheetData>').encode('utf-8'))
+
+    def _cell(self, ref: str, value: Any, style: int) -> str:
+        s = f' s="{style}"' if style else ''
+        if value is None or value == '':
+            return f'<c r="{ref}"{s}/>' if style else ''
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f'<c r="{ref}"{s}><v>{value}</v></c>'
+        text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+        return f'<c r="{ref}"{s} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+    def write_rows(self, rows: Iterable[Sequence[Any]], style: int = 0):
+        parts = []
+        letters = self._letters
+        cell = self._cell
+        for row in rows:
+            self._rows += 1
+            r = self._rows
+            while len(letters) < len(row):
+                letters.append(column_letter(len(letters) + 1))
+            cells = ''.join(cell(f'{letters[i]}{r}', value, style) for i, value in enumerate(row))
+            parts.append(f'<row r="{r}">{cells}</row>')
+        self._sheet.write(''.join(parts).encode('utf-8'))
+
+    def write_header(self, headers: Sequence[str]):
+        self.write_rows([headers], style=1)
+
+    def close(self):
+        self._sheet.write(b'</sheetData></worksheet>')
+        self._sheet.close()
+        self._zip.close()
@@ -0,0 +1,12 @@
+-- Make the backend's submission_answers mirror an upsert
+-- The outbox posts with on_conflict=submission_id,question_id, which needs a unique index;
+-- remove duplicates left by earlier retried batches first
+
+DELETE FROM submission_answers a
+USING submission_answers b
+WHERE a.submission_id = b.submission_id
+  AND a.question_id = b.question_id
+  AND a.ctid < b.ctid;
+
+CREATE UNIQUE INDEX IF NOT EXISTS submission_answers_submission_question_key
+    ON submission_answers (submission_id, question_id);
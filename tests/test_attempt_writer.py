@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError
+
+from attempt_writer import BatchWriter
+
+
+@pytest.mark.asyncio
+async def test_concurrent_inserts_share_batches():
+    db = AsyncMongoMockClient().test_db
+    writer = BatchWriter(lambda: db.exam_attempts, max_batch=10, max_delay=0.01)
+    await asyncio.gather(*(writer.insert({"id": str(i)}) for i in range(25)))
+    assert await db.exam_attempts.count_documents({}) == 25
+    stats = writer.stats()
+    assert stats["batches"] == 3 and stats["largest_batch"] == 10
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_rejected_document_fails_only_its_request():
+    db = AsyncMongoMockClient().test_db
+    await db.exam_attempts.create_index([("id", 1)], unique=True)
+    await db.exam_attempts.insert_one({"id": "taken"})
+    writer = BatchWriter(lambda: db.exam_attempts, max_batch=10, max_delay=0.01)
+
+    results = await asyncio.gather(
+        writer.insert({"id": "a"}), writer.insert({"id": "taken"}), writer.insert({"id": "b"}),
+        return_exceptions=True,
+    )
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], DuplicateKeyError)
+    assert await db.exam_attempts.count_documents({}) == 3
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_fails_every_request_and_close_drains():
+    class Down:
+        async def insert_many(self, docs, ordered=True):
+            raise ConnectionError("primary unreachable")
+
+    writer = BatchWriter(lambda: Down(), max_batch=10, max_delay=0.01)
+    results = await asyncio.gather(*(writer.insert({"id": str(i)}) for i in range(3)), return_exceptions=True)
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert writer.stats()["failed"] == 3
+
+    db = AsyncMongoMockClient().test_db
+    writer = BatchWriter(lambda: db.exam_attempts, max_batch=10, max_delay=10)
+    pending = asyncio.ensure_future(writer.insert({"id": "late"}))
+    await asyncio.sleep(0)
+    await writer.close()
+    await pending
+    assert await db.exam_attempts.count_documents({}) == 1
+
+
+@pytest.mark.asyncio
+async def test_write_concern_error_reaches_every_caller():
+    class Unacknowledged:
+        async def insert_many(self, docs, ordered=True):
+            raise BulkWriteError({
+                "writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}],
+                "writeConcernErrors": [{"code": 64, "errmsg": "waiting for replication timed out"}],
+                "nInserted": 2,
+            })
+
+    writer = BatchWriter(lambda: Unacknowledged(), max_batch=10, max_delay=0.01)
+    results = await asyncio.gather(*(writer.insert({"id": str(i)}) for i in range(3)), return_exceptions=True)
+    assert isinstance(results[0], WriteConcernError) and isinstance(results[2], WriteConcernError)
+    assert isinstance(results[1], DuplicateKeyError)
+    await writer.close()
@@ -60,3 +60,14 @@ async def test_get_current_tutor(client: AsyncClient, test_tutor_data):
     response = await client.get("/api/tutors/me", headers=headers)
     assert response.status_code == 200
     assert response.json()["email"] == test_tutor_data["email"]
+
+@pytest.mark.asyncio
+async def test_login_shed_when_hashing_overloaded(client: AsyncClient, test_tutor_data, monkeypatch):
+    from backend import server
+    await client.post("/api/tutors/register", json=test_tutor_data)
+
+    monkeypatch.setattr(server.password_hasher, "pending", server.password_hasher.workers + server.password_hasher.max_queue)
+    response = await client.post("/api/tutors/login", json=test_tutor_data)
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+    assert server.password_hasher.counters["rejected"] >= 1
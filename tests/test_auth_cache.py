@@ -0,0 +1,74 @@
+import time
+
+import jwt
+import pytest
+
+from auth_cache import TokenCache, TutorCache
+
+SECRET = "test_secret"
+
+
+def make_token(tutor_id: str, exp: float) -> str:
+    return jwt.encode({"tutor_id": tutor_id, "exp": int(exp)}, SECRET, algorithm="HS256")
+
+
+def test_token_cache_verifies_once_until_exp():
+    decodes = []
+
+    now = [time.time()]
+
+    def decode(token):
+        decodes.append(token)
+        payload = jwt.decode(token, SECRET, algorithms=["HS256"], options={"verify_exp": False})
+        if payload["exp"] <= now[0]:
+            raise jwt.ExpiredSignatureError("expired")
+        return payload
+
+    cache = TokenCache(decode, timer=lambda: now[0])
+    token = make_token("t1", now[0] + 3600)
+    assert cache.verify(token)["tutor_id"] == "t1"
+    assert cache.verify(token)["tutor_id"] == "t1"
+    assert len(decodes) == 1
+    assert cache.stats()["hits"] == 1
+
+    # Past exp the entry is gone and the token goes back to jwt.decode (which rejects it)
+    short = make_token("t2", now[0] + 60)
+    cache.verify(short)
+    now[0] += 61
+    with pytest.raises(jwt.ExpiredSignatureError):
+        cache.verify(short)
+    assert len(decodes) == 3
+
+    with pytest.raises(jwt.InvalidTokenError):
+        cache.verify("not-a-token")
+    with pytest.raises(jwt.InvalidTokenError):
+        cache.verify("not-a-token")
+    assert cache.stats()["size"] == 1
+
+
+@pytest.mark.asyncio
+async def test_tutor_cache_owner_lookup_and_invalidation():
+    owners = {"e1": "t1"}
+    loads = []
+
+    async def load_owner(exam_id):
+        loads.append(exam_id)
+        return owners.get(exam_id)
+
+    async def load_profile(tutor_id):
+        return {"id": tutor_id}
+
+    cache = TutorCache(load_profile, load_owner)
+    assert await cache.owns("e1", "t1")
+    assert not await cache.owns("e1", "t2")
+    assert loads == ["e1"]
+
+    # Unknown exams are looked up every time
+    assert not await cache.owns("e2", "t1")
+    owners["e2"] = "t1"
+    assert await cache.owns("e2", "t1")
+
+    del owners["e1"]
+    cache.invalidate_exam("e1")
+    assert not await cache.owns("e1", "t1")
+
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from exam_cache import PublicExamCache, ExamPrewarmer, CACHE_HIT, CACHE_MISS, CACHE_STALE
+
+
+def _counting_loader(payload=None):
+    calls = []
+
+    async def load(exam_id):
+        calls.append(exam_id)
+        await asyncio.sleep(0.01)
+        return payload if payload is not None else {"id": exam_id, "version": len(calls)}
+
+    return load, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once():
+    load, calls = _counting_loader()
+    cache = PublicExamCache(load)
+
+    results = await asyncio.gather(*[cache.get("exam-1") for _ in range(100)])
+    assert calls == ["exam-1"]
+    assert {status for _, status in results} == {CACHE_MISS}
+
+    _, status = await cache.get("exam-1")
+    assert status == CACHE_HIT
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_refreshing():
+    load, calls = _counting_loader()
+    cache = PublicExamCache(load, ttl=0, stale_ttl=60)
+    await cache.get("exam-1")
+
+    exam, status = await cache.get("exam-1")
+    assert status == CACHE_STALE
+    assert exam["version"] == 1
+
+    await asyncio.sleep(0.05)
+    assert len(calls) == 2
+    exam, _ = await cache.get("exam-1")
+    assert exam["version"] == 2
+
+
+@pytest.mark.asyncio
+async def test_missing_exam_is_not_cached():
+    async def load(exam_id):
+        return None
+
+    cache = PublicExamCache(load)
+    exam, status = await cache.get("missing")
+    assert exam is None
+    assert status == CACHE_MISS
+
+
+@pytest.mark.asyncio
+async def test_generations_are_bounded_and_evicted_loads_are_not_cached():
+    load, calls = _counting_loader()
+    cache = PublicExamCache(load, max_generations=2)
+
+    first = asyncio.ensure_future(cache.get("exam-1"))
+    await asyncio.sleep(0.001)
+    # exam-1's generation is evicted while its load is in flight
+    cache.invalidate("exam-2")
+    cache.invalidate("exam-3")
+    await first
+    assert len(cache._generations) == 2
+
+    _, status = await cache.get("exam-1")
+    assert status == CACHE_MISS
+    assert calls == ["exam-1", "exam-1"]
+
+
+@pytest.mark.asyncio
+async def test_prewarmer_loads_exams_about_to_start():
+    load, calls = _counting_loader()
+    cache = PublicExamCache(load)
+
+    async def find_starting(start, end):
+        assert end > start
+        return ["exam-1", "exam-2"]
+
+    prewarmer = ExamPrewarmer(cache, find_starting)
+    assert await prewarmer.warm_upcoming() == 2
+    assert sorted(calls) == ["exam-1", "exam-2"]
+
+    # Already fresh, so a second pass does not reload
+    await prewarmer.warm_upcoming()
+    assert len(calls) == 2
+    _, status = await cache.get("exam-1")
+    assert status == CACHE_HIT
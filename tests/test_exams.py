@@ -1,3 +1,4 @@
+import json
 import pytest
 from httpx import AsyncClient
 
@@ -92,3 +93,512 @@ async def test_submit_exam(client: AsyncClient, auth_token, exam_data):
     result = submit_res.json()
     assert result["score"] == 5
     assert result["percentage"] == 100.0
+
+@pytest.mark.asyncio
+async def test_submit_uses_updated_answer_key(client: AsyncClient, auth_token, exam_data):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    create_res = await client.post("/api/exams", json=exam_data, headers=headers)
+    exam = create_res.json()
+    exam_id = exam["id"]
+    question_id = exam["questions"][0]["id"]
+
+    submission_data = {
+        "exam_id": exam_id,
+        "student_data": {"name": "Student 1", "email": "student@test.com"},
+        "answers": [{"question_id": question_id, "answer": "5", "time_spent_seconds": 10}],
+        "violations": []
+    }
+
+    # Grade once so the compiled plan is cached
+    first = await client.post(f"/api/exams/{exam_id}/submit", json=submission_data)
+    assert first.json()["score"] == 0
+
+    # Fix the answer key; the cached plan must be invalidated
+    exam_data["questions"][0]["correct_answer"] = "5"
+    update_res = await client.put(f"/api/exams/{exam_id}", json=exam_data, headers=headers)
+    assert update_res.status_code == 200
+    assert update_res.json()["version"] == 2
+
+    # update_exam regenerates question ids, so answer the new one
+    submission_data["answers"][0]["question_id"] = update_res.json()["questions"][0]["id"]
+    second = await client.post(f"/api/exams/{exam_id}/submit", json=submission_data)
+    assert second.json()["score"] == 5
+
+@pytest.mark.asyncio
+async def test_regrade_after_answer_key_fix(client: AsyncClient, auth_token, exam_data):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    question_id = exam["questions"][0]["id"]
+
+    for i, answer in enumerate(["4", "5", "5"]):
+        await client.post(f"/api/exams/{exam_id}/submit", json={
+            "exam_id": exam_id,
+            "student_data": {"name": "Student", "email": f"student{i}@test.com"},
+            "answers": [{"question_id": question_id, "answer": answer, "time_spent_seconds": 10}],
+            "violations": []
+        })
+
+    # Fix the key while keeping the question id
+    exam_data["questions"][0]["id"] = question_id
+    exam_data["questions"][0]["correct_answer"] = "5"
+    await client.put(f"/api/exams/{exam_id}", json=exam_data, headers=headers)
+
+    never = await client.get(f"/api/exams/{exam_id}/regrade", headers=headers)
+    assert never.status_code == 404
+
+    regrade_res = await client.post(f"/api/exams/{exam_id}/regrade", headers=headers)
+    assert regrade_res.status_code == 200
+    assert regrade_res.json()["regraded"] == 3
+    assert regrade_res.json()["changed"] == 3
+
+    progress = (await client.get(f"/api/exams/{exam_id}/regrade", headers=headers)).json()
+    assert progress["status"] == "done"
+    assert (progress["done"], progress["total"], progress["changed"]) == (3, 3, 3)
+
+    attempts = (await client.get(f"/api/exams/{exam_id}/attempts", headers=headers)).json()
+    assert sorted(a["score"] for a in attempts) == [0, 5, 5]
+
+    # Statistics are rebuilt from the regraded attempts
+    analytics = (await client.get(f"/api/exams/{exam_id}/analytics", headers=headers)).json()
+    assert analytics["highest_score"] == 100.0
+    assert analytics["lowest_score"] == 0.0
+
+@pytest.mark.asyncio
+async def test_analytics_maintained_on_submit(client: AsyncClient, auth_token, exam_data):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    question_id = exam["questions"][0]["id"]
+
+    empty = (await client.get(f"/api/exams/{exam_id}/analytics", headers=headers)).json()
+    assert empty["total_attempts"] == 0
+
+    for i, (answer, violations) in enumerate([("4", 0), ("5", 0), ("4", 5)]):
+        await client.post(f"/api/exams/{exam_id}/submit", json={
+            "exam_id": exam_id,
+            "student_data": {"name": "Student", "email": f"student{i}@test.com"},
+            "answers": [{"question_id": question_id, "answer": answer, "time_spent_seconds": 10}],
+            "violations": [{"type": "tab_switch", "timestamp": "2025-01-01T00:00:00Z"}] * violations
+        })
+
+    analytics = (await client.get(f"/api/exams/{exam_id}/analytics", headers=headers)).json()
+    assert analytics["total_attempts"] == 3
+    assert analytics["average_score"] == 66.67
+    assert analytics["flagged_count"] == 1
+    assert analytics["highest_score"] == 100.0
+    assert analytics["lowest_score"] == 0.0
+    assert analytics["median_score"] == 100.0
+    assert analytics["histogram"][0]["count"] == 1
+    assert analytics["histogram"][-1]["count"] == 2
+
+@pytest.mark.asyncio
+async def test_exam_stats_backfilled_from_existing_attempts(client: AsyncClient, mock_db, auth_token, exam_data):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    question_id = exam["questions"][0]["id"]
+
+    for i, answer in enumerate(["4", "5"]):
+        await client.post(f"/api/exams/{exam_id}/submit", json={
+            "exam_id": exam_id,
+            "student_data": {"name": "Student", "email": f"student{i}@test.com"},
+            "answers": [{"question_id": question_id, "answer": answer, "time_spent_seconds": 10}],
+            "violations": []
+        })
+    # As if the attempts were stored before exam_stats existed
+    await mock_db.exam_stats.delete_many({})
+
+    await client.post(f"/api/exams/{exam_id}/submit", json={
+        "exam_id": exam_id,
+        "student_data": {"name": "Student", "email": "student2@test.com"},
+        "answers": [{"question_id": question_id, "answer": "4", "time_spent_seconds": 10}],
+        "violations": []
+    })
+    # Submissions only count themselves; the backfill counts everything
+    analytics = (await client.get(f"/api/exams/{exam_id}/analytics", headers=headers)).json()
+    assert analytics["total_attempts"] == 1
+
+    import exam_stats
+    assert await exam_stats.rebuild_all_exam_stats(mock_db) == 1
+    analytics = (await client.get(f"/api/exams/{exam_id}/analytics", headers=headers)).json()
+    assert analytics["total_attempts"] == 3
+    assert analytics["average_score"] == 66.67
+
+    await client.delete(f"/api/exams/{exam_id}", headers=headers)
+    assert await mock_db.exam_stats.find_one({"exam_id": exam_id}) is None
+
+@pytest.mark.asyncio
+async def test_concurrent_first_attempts_are_counted_once(mock_db):
+    import exam_stats
+    await mock_db.exam_attempts.insert_many([
+        {"exam_id": "e1", "percentage": 40.0, "flagged": False},
+        {"exam_id": "e1", "percentage": 60.0, "flagged": False},
+    ])
+    # The second attempt was stored before the first was recorded
+    await exam_stats.record_attempt(mock_db, "e1", 40.0, False)
+    await exam_stats.record_attempt(mock_db, "e1", 60.0, False)
+    stats = await mock_db.exam_stats.find_one({"exam_id": "e1"})
+    assert stats["count"] == 2
+    assert stats["sum_percentage"] == 100.0
+
+@pytest.mark.asyncio
+async def test_score_digest_folds_buffer(client: AsyncClient, mock_db, auth_token, exam_data, monkeypatch):
+    import exam_stats
+    monkeypatch.setattr(exam_stats, "DIGEST_FLUSH_EVERY", 4)
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    question_id = exam["questions"][0]["id"]
+
+    # The first four are buffered and folded, the last stays buffered
+    for i, answer in enumerate(["4", "5", "4", "4", "5"]):
+        await client.post(f"/api/exams/{exam_id}/submit", json={
+            "exam_id": exam_id,
+            "student_data": {"name": "Student", "email": f"student{i}@test.com"},
+            "answers": [{"question_id": question_id, "answer": answer, "time_spent_seconds": 10}],
+            "violations": []
+        })
+
+    stats = await mock_db.exam_stats.find_one({"exam_id": exam_id})
+    assert len(stats["digest_buffer"]) == 1
+    assert sum(w for _, w in stats["digest"]["centroids"]) == 4
+
+    analytics = (await client.get(f"/api/exams/{exam_id}/analytics", headers=headers)).json()
+    assert analytics["median_score"] == 100.0
+    assert analytics["percentiles"]["p10"] == 0.0
+
+@pytest.mark.asyncio
+async def test_digest_flush_keeps_values_pushed_during_flush(mock_db):
+    import exam_stats
+    await mock_db.exam_stats.insert_one(
+        {"exam_id": "e1", "count": 3, "digest_buffer": [10.0, 20.0, 30.0], "digest_pending": 3}
+    )
+    collection = mock_db.exam_stats
+
+    class SubmitDuringFlush:
+        async def find_one(self, *args, **kwargs):
+            stats = await collection.find_one(*args, **kwargs)
+            # A submission lands between the flush's read and its update
+            await collection.update_one(
+                {"exam_id": "e1"}, {"$push": {"digest_buffer": 40.0}, "$inc": {"count": 1, "digest_pending": 1}}
+            )
+            return stats
+
+        def __getattr__(self, name):
+            return getattr(collection, name)
+
+    class Db:
+        exam_stats = SubmitDuringFlush()
+
+    assert await exam_stats.flush_digest(Db(), "e1")
+
+    stats = await mock_db.exam_stats.find_one({"exam_id": "e1"})
+    assert stats["digest_buffer"] == [40.0]
+    assert stats["digest_pending"] == 1
+    assert sum(w for _, w in stats["digest"]["centroids"]) == 3
+
+def test_summarize_without_digest():
+    import exam_stats
+    summary = exam_stats.summarize({
+        "count": 2, "sum_percentage": 100.0, "flagged_count": 0, "highest_percentage": 60.0, "lowest_percentage": 40.0
+    })
+    assert summary["median_score"] is None
+    assert summary["percentiles"] == {}
+
+@pytest.mark.asyncio
+async def test_public_exam_etag_and_versioned_url(client: AsyncClient, auth_token, exam_data):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    # Enough questions for the payload to be worth compressing
+    exam_data["questions"] = exam_data["questions"] * 40
+    exam_id = (await client.post("/api/exams", json=exam_data, headers=headers)).json()["id"]
+
+    first = await client.get(f"/api/exams/{exam_id}/public", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    assert first.headers["content-encoding"] == "gzip"
+    assert len(first.json()["questions"]) == 40
+    etag = first.headers["etag"]
+
+    not_modified = await client.get(f"/api/exams/{exam_id}/public", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["x-cache"] == "HIT"
+
+    versioned = await client.get(first.headers["content-location"])
+    assert versioned.status_code == 200
+    assert "immutable" in versioned.headers["cache-control"]
+    assert versioned.json() == first.json()
+
+    missing = await client.get(f"/api/exams/{exam_id}/public/{'0' * 32}")
+    assert missing.status_code == 404
+
+    await client.delete(f"/api/exams/{exam_id}", headers=headers)
+    deleted = await client.get(first.headers["content-location"])
+    assert deleted.status_code == 404
+
+@pytest.mark.asyncio
+async def test_item_analysis(client: AsyncClient, auth_token, exam_data):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    question_id = exam["questions"][0]["id"]
+
+    for i, answer in enumerate(["4", "4", "5"]):
+        await client.post(f"/api/exams/{exam_id}/submit", json={
+            "exam_id": exam_id,
+            "student_data": {"name": "Student", "email": f"student{i}@test.com"},
+            "answers": [{"question_id": question_id, "answer": answer, "time_spent_seconds": 12}],
+            "violations": []
+        })
+
+    res = await client.get(f"/api/exams/{exam_id}/item-analysis", headers=headers)
+    assert res.status_code == 200
+    body = res.json()
+    assert body["attempts"] == 3
+    item = body["items"][0]
+    assert item["question_id"] == question_id
+    assert item["p_value"] == 0.6667
+    assert item["median_time_seconds"] == 12.0
+    assert [d["count"] for d in item["distractors"]] == [2, 1]
+
+@pytest.mark.asyncio
+async def test_percentile_rank_and_leaderboard(client: AsyncClient, auth_token, exam_data):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    question_id = exam["questions"][0]["id"]
+
+    results = []
+    for name, answer in [("Ana", "5"), ("Ben", "4"), ("Cy", "3"), ("Dee", "4")]:
+        res = await client.post(f"/api/exams/{exam_id}/submit", json={
+            "exam_id": exam_id,
+            "student_data": {"name": name, "email": f"{name.lower()}@test.com"},
+            "answers": [{"question_id": question_id, "answer": answer, "time_spent_seconds": 10}],
+            "violations": []
+        })
+        results.append(res.json())
+
+    assert results[1]["percentile_rank"] == 50.0
+    assert results[1]["rank"] == 1
+    assert results[3]["rank"] == 1 and results[3]["out_of"] == 4
+    assert results[2]["percentile_rank"] == 0.0 and results[2]["rank"] == 2
+
+    board = (await client.get(f"/api/exams/{exam_id}/leaderboard?limit=2", headers=headers)).json()
+    assert [a["student_data"]["name"] for a in board] == ["Ben", "Dee"]
+
+@pytest.mark.asyncio
+async def test_attempts_keyset_pagination(client: AsyncClient, auth_token, exam_data):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    question_id = exam["questions"][0]["id"]
+
+    for i in range(5):
+        await client.post(f"/api/exams/{exam_id}/submit", json={
+            "exam_id": exam_id,
+            "student_data": {"name": f"Student {i}", "email": "student@test.com"},
+            "answers": [{"question_id": question_id, "answer": "4", "time_spent_seconds": 10}],
+            "violations": []
+        })
+
+    names = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        res = await client.get(f"/api/exams/{exam_id}/attempts", params=params, headers=headers)
+        assert res.status_code == 200
+        page = res.json()
+        assert all("answers" not in a for a in page)
+        names += [a["student_data"]["name"] for a in page]
+        pages += 1
+        cursor = res.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert names == [f"Student {i}" for i in range(5)]
+    assert pages == 3
+
+    res = await client.get(f"/api/exams/{exam_id}/attempts?format=ndjson&fields=answers", headers=headers)
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    assert len(rows) == 5
+    assert rows[0]["answers"][0]["answer"] == "4"
+
+    bad = await client.get(f"/api/exams/{exam_id}/attempts?cursor=garbage", headers=headers)
+    assert bad.status_code == 400
+
+@pytest.mark.asyncio
+async def test_export_streams_valid_xlsx(client: AsyncClient, auth_token, exam_data):
+    from io import BytesIO
+    from openpyxl import load_workbook
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    question_id = exam["questions"][0]["id"]
+
+    for i, answer in enumerate(["4", "5"]):
+        await client.post(f"/api/exams/{exam_id}/submit", json={
+            "exam_id": exam_id,
+            "student_data": {"name": f"Student {i}", "email": f"s{i}@test.com"},
+            "answers": [{"question_id": question_id, "answer": answer, "time_spent_seconds": 10}],
+            "violations": [{"type": "tab_switch", "timestamp": "2025-01-01T00:00:00Z"}]
+        })
+
+    res = await client.get(f"/api/exams/{exam_id}/export", headers=headers)
+    assert res.status_code == 200
+    ws = load_workbook(BytesIO(res.content)).active
+    rows = list(ws.values)
+    assert rows[0][:4] == ("Name", "Email", "Score", "Max Score")
+    assert rows[1][:5] == ("Student 0", "s0@test.com", 5, 5, "100.00%")
+    assert rows[2][2] == 0
+    assert rows[1][5] == 1
+    assert ws["A1"].font.b
+
+@pytest.mark.asyncio
+async def test_ownership_cache_follows_deletes(client: AsyncClient, auth_token, exam_data, test_tutor_data):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam_id = (await client.post("/api/exams", json=exam_data, headers=headers)).json()["id"]
+    
+    assert (await client.get(f"/api/exams/{exam_id}", headers=headers)).status_code == 200
+    assert (await client.get(f"/api/exams/{exam_id}/analytics", headers=headers)).status_code == 200
+    
+    other = await client.post("/api/tutors/register", json={**test_tutor_data, "email": "other@example.com"})
+    other_headers = {"Authorization": f"Bearer {other.json()['token']}"}
+    assert (await client.get("/api/tutors/me", headers=other_headers)).json()["email"] == "other@example.com"
+    assert (await client.get(f"/api/exams/{exam_id}/leaderboard", headers=other_headers)).status_code == 404
+    
+    await client.delete(f"/api/exams/{exam_id}", headers=headers)
+    assert (await client.get(f"/api/exams/{exam_id}/attempts", headers=headers)).status_code == 404
+
+@pytest.mark.asyncio
+async def test_batched_violations_flag_session_live(client: AsyncClient, mock_db, auth_token, exam_data):
+    from backend import server
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam_id = (await client.post("/api/exams", json=exam_data, headers=headers)).json()["id"]
+    
+    event = {"type": "tab_switch", "timestamp": "2025-01-01T00:00:00Z"}
+    response = await client.post(f"/api/exams/{exam_id}/violations/batch", json={"session_id": "s1", "violations": [event, event]})
+    assert response.json() == {"logged": 2, "violations_count": 2, "flagged": False}
+    response = await client.post(f"/api/exams/{exam_id}/violations", json={"exam_id": exam_id, "session_id": "s1", "violation": event})
+    assert response.json()["flagged"] is True
+    
+    # Submitting with fewer violations still flags the session seen live
+    submission = {
+        "exam_id": exam_id, "session_id": "s1",
+        "student_data": {"name": "Student", "email": "s@example.com"},
+        "answers": [], "violations": []
+    }
+    assert (await client.post(f"/api/exams/{exam_id}/submit", json=submission)).json()["flagged"] is True
+    
+    await server.violation_buffer.flush()
+    assert await mock_db.violation_logs.count_documents({"exam_id": exam_id, "session_id": "s1"}) == 3
+
+@pytest.mark.asyncio
+async def test_violation_timeline_reads_rollups(client: AsyncClient, auth_token, exam_data):
+    from backend import server
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam_id = (await client.post("/api/exams", json=exam_data, headers=headers)).json()["id"]
+    
+    events = [{"type": "tab_switch"}, {"type": "tab_switch"}, {"type": "right_click"}]
+    await client.post(f"/api/exams/{exam_id}/violations/batch", json={"session_id": "s1", "violations": events})
+    await server.violation_buffer.flush()
+    
+    response = await client.get(f"/api/exams/{exam_id}/violations/timeline", headers=headers)
+    assert response.status_code == 200
+    assert sorted((row["type"], row["count"]) for row in response.json()) == [("right_click", 1), ("tab_switch", 2)]
+
+@pytest.mark.asyncio
+async def test_retried_submission_returns_original_result(client: AsyncClient, mock_db, auth_token, exam_data):
+    from backend import server
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    submission = {
+        "exam_id": exam_id,
+        "student_data": {"name": "Student", "email": "student@test.com"},
+        "answers": [{"question_id": exam["questions"][0]["id"], "answer": "4", "time_spent_seconds": 10}],
+        "violations": []
+    }
+    
+    first = await client.post(f"/api/exams/{exam_id}/submit", json=submission)
+    retry = await client.post(f"/api/exams/{exam_id}/submit", json=submission)
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    
+    # A client key identifies the submission even if the body changed
+    keyed = {"Idempotency-Key": "attempt-42"}
+    original = await client.post(f"/api/exams/{exam_id}/submit", json={**submission, "violations": [{"type": "tab_switch"}]}, headers=keyed)
+    again = await client.post(f"/api/exams/{exam_id}/submit", json={**submission, "violations": []}, headers=keyed)
+    assert again.json()["attempt_id"] == original.json()["attempt_id"]
+    assert again.json()["violations_count"] == 1
+    assert await mock_db.exam_attempts.count_documents({"exam_id": exam_id}) == 2
+    
+    # Once the result cache has forgotten it, the unique index still prevents a second attempt
+    server.submission_deduper._results.clear()
+    await mock_db.exam_attempts.create_index(
+        [("exam_id", 1), ("idempotency_key", 1)], unique=True,
+        partialFilterExpression={"idempotency_key": {"$type": "string"}}
+    )
+    late = await client.post(f"/api/exams/{exam_id}/submit", json=submission, headers=keyed)
+    assert late.headers["Idempotent-Replayed"] == "true"
+    assert late.json()["attempt_id"] == original.json()["attempt_id"]
+    assert await mock_db.exam_attempts.count_documents({"exam_id": exam_id}) == 2
+    
+    # A body hash only dedupes while the result is cached: the same answers later are a new attempt
+    resubmitted = await client.post(f"/api/exams/{exam_id}/submit", json=submission)
+    assert "Idempotent-Replayed" not in resubmitted.headers
+    assert resubmitted.json()["attempt_id"] != first.json()["attempt_id"]
+    stats = (await client.get(f"/api/exams/{exam_id}/analytics", headers=headers)).json()
+    assert stats["total_attempts"] == 3
+
+@pytest.mark.asyncio
+async def test_retry_finishes_attempt_whose_request_died(client: AsyncClient, mock_db, auth_token, exam_data):
+    from backend import server
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    exam_id = exam["id"]
+    submission = {
+        "exam_id": exam_id,
+        "student_data": {"name": "Student", "email": "student@test.com"},
+        "answers": [{"question_id": exam["questions"][0]["id"], "answer": "4", "time_spent_seconds": 10}],
+        "violations": []
+    }
+    keyed = {"Idempotency-Key": "attempt-7"}
+    await mock_db.exam_attempts.create_index(
+        [("exam_id", 1), ("idempotency_key", 1)], unique=True,
+        partialFilterExpression={"idempotency_key": {"$type": "string"}}
+    )
+    first = (await client.post(f"/api/exams/{exam_id}/submit", json=submission, headers=keyed)).json()
+    # As if the worker died after storing the attempt but before recording it
+    await mock_db.exam_attempts.update_one({"id": first["attempt_id"]}, {"$set": {"stats_recorded": False}})
+    await mock_db.exam_stats.update_one({"exam_id": exam_id}, {"$inc": {"count": -1}})
+    server.submission_deduper._results.clear()
+    
+    retry = await client.post(f"/api/exams/{exam_id}/submit", json=submission, headers=keyed)
+    assert retry.json()["attempt_id"] == first["attempt_id"]
+    assert (await mock_db.exam_stats.find_one({"exam_id": exam_id}))["count"] == 1
+    # Finished once: a further retry does not count it again
+    server.submission_deduper._results.clear()
+    await client.post(f"/api/exams/{exam_id}/submit", json=submission, headers=keyed)
+    assert (await mock_db.exam_stats.find_one({"exam_id": exam_id}))["count"] == 1
+
+@pytest.mark.asyncio
+async def test_exam_change_is_broadcast_once_including_deletes(monkeypatch):
+    from backend import server
+    broadcasts = []
+
+    async def record(exam_id):
+        broadcasts.append(exam_id)
+
+    monkeypatch.setattr(server, "broadcast_exam_change", record)
+    update = {"_id": {"_data": "token-1"}, "operationType": "update", "fullDocument": {"id": "exam-1"}}
+    # The same event delivered to two workers' streams
+    await server.handle_exam_change(update)
+    await server.handle_exam_change(dict(update))
+    await server.handle_exam_change({
+        "_id": {"_data": "token-2"}, "operationType": "delete",
+        "documentKey": {"_id": "oid"}, "fullDocumentBeforeChange": {"id": "exam-2"},
+    })
+    await server.handle_exam_change({"_id": {"_data": "token-3"}, "operationType": "delete", "documentKey": {"_id": "oid"}})
+    assert broadcasts == ["exam-1", "exam-2"]
@@ -0,0 +1,152 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from openpyxl import load_workbook
+
+from export_jobs import ExportJobs, LocalArtifactStore
+
+
+@pytest_asyncio.fixture
+async def auth_token(client: AsyncClient, test_tutor_data):
+    await client.post("/api/tutors/register", json=test_tutor_data)
+    response = await client.post("/api/tutors/login", json=test_tutor_data)
+    return response.json()["token"]
+
+
+@pytest.fixture
+def export_jobs(mock_db, tmp_path, monkeypatch):
+    from backend import server
+    # Threads instead of processes: the mock database cannot be shared with a child process
+    sync_db = mock_db._AsyncMongoMockDatabase__database
+    jobs = ExportJobs(lambda: mock_db, lambda: sync_db, LocalArtifactStore(str(tmp_path)),
+                      executor=ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(server, "export_jobs", jobs)
+    return jobs
+
+
+async def _wait_for(client, job_id, headers):
+    for _ in range(100):
+        job = (await client.get(f"/api/exports/{job_id}", headers=headers)).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError("export did not finish")
+
+
+@pytest.mark.asyncio
+async def test_export_job_runs_and_artifact_is_reused(client: AsyncClient, auth_token, export_jobs):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam = (await client.post("/api/exams", json={
+        "title": "Export Exam",
+        "description": "",
+        "required_fields": ["name"],
+        "questions": [{"type": "multiple_choice", "question_text": "2+2?", "options": ["4", "5"],
+                       "correct_answer": "4", "points": 1}],
+        "settings": {},
+    }, headers=headers)).json()
+    for i in range(3):
+        await client.post(f"/api/exams/{exam['id']}/submit", json={
+            "exam_id": exam["id"],
+            "student_data": {"name": f"Student {i}"},
+            "answers": [{"question_id": exam["questions"][0]["id"], "answer": "4", "time_spent_seconds": 5}],
+            "violations": []
+        })
+
+    job = (await client.post(f"/api/exams/{exam['id']}/exports", headers=headers)).json()
+    assert job["status"] == "queued" and not job["cached"]
+    job = await _wait_for(client, job["job_id"], headers)
+    assert job["status"] == "done"
+    assert job["progress"]["rows"] == 3
+
+    download = await client.get(f"/api/exports/{job['job_id']}/download", headers=headers)
+    assert download.status_code == 200
+    rows = list(load_workbook(BytesIO(download.content)).active.values)
+    assert [r[0] for r in rows] == ["Name", "Student 0", "Student 1", "Student 2"]
+
+    # Unchanged exam: the artifact is reused without running a job
+    again = (await client.post(f"/api/exams/{exam['id']}/exports", headers=headers)).json()
+    assert again["status"] == "done" and again["cached"]
+    assert again["artifact_key"] == job["artifact_key"]
+
+    missing = await client.get("/api/exports/nope", headers=headers)
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_job_and_stale_jobs_are_replaced(mock_db, export_jobs):
+    await export_jobs.ensure_indexes()
+    exam = {"id": "exam-1", "title": "Quiz", "required_fields": [], "version": 2, "scores_version": 1}
+    first, second = await asyncio.gather(
+        export_jobs.create(exam, "tutor-1", 0), export_jobs.create(exam, "tutor-1", 0)
+    )
+    assert first["job_id"] == second["job_id"]
+    assert first["artifact_key"] == "exam-1/v2-s1-n0.xlsx"
+    await asyncio.gather(*export_jobs._tasks)
+
+    # A job left running by a worker that died: its lease has run out
+    stale = {"id": "stale", "exam_id": "exam-1", "tutor_id": "tutor-1", "artifact_key": "exam-1/v2-s1-n5.xlsx",
+             "filename": "Quiz_results.xlsx", "status": "running", "progress": {"rows": 0, "total": 5},
+             "active_key": "exam-1/v2-s1-n5.xlsx", "lease_until": datetime.now(timezone.utc) - timedelta(seconds=1)}
+    await mock_db.export_jobs.insert_one(stale)
+    job = await export_jobs.create(exam, "tutor-1", 5)
+    assert job["job_id"] != "stale"
+    assert (await export_jobs.get("stale", "tutor-1"))["status"] == "failed"
+    await asyncio.gather(*export_jobs._tasks)
+
+
+@pytest.mark.asyncio
+async def test_regrade_retires_cached_export(client: AsyncClient, auth_token, export_jobs):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    exam_data = {
+        "title": "Regrade Export",
+        "description": "",
+        "required_fields": ["name"],
+        "questions": [{"type": "multiple_choice", "question_text": "2+2?", "options": ["4", "5"],
+                       "correct_answer": "4", "points": 1}],
+        "settings": {},
+    }
+    exam = (await client.post("/api/exams", json=exam_data, headers=headers)).json()
+    await client.post(f"/api/exams/{exam['id']}/submit", json={
+        "exam_id": exam["id"],
+        "student_data": {"name": "Student"},
+        "answers": [{"question_id": exam["questions"][0]["id"], "answer": "5", "time_spent_seconds": 5}],
+        "violations": []
+    })
+    job = (await client.post(f"/api/exams/{exam['id']}/exports", headers=headers)).json()
+    job = await _wait_for(client, job["job_id"], headers)
+
+    from backend import server
+    await server.db.exams.update_one(
+        {"id": exam["id"]}, {"$set": {"questions.0.correct_answer": "5"}, "$inc": {"version": 1}}
+    )
+    result = (await client.post(f"/api/exams/{exam['id']}/regrade", headers=headers)).json()
+    assert result["changed"] == 1
+    assert (await server.db.exams.find_one({"id": exam["id"]}))["scores_version"] == 1
+
+    again = (await client.post(f"/api/exams/{exam['id']}/exports", headers=headers)).json()
+    assert not again["cached"]
+    assert again["artifact_key"] == f"{exam['id']}/v2-s1-n1.xlsx" != job["artifact_key"]
+    await _wait_for(client, again["job_id"], headers)
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    import mongomock
+    import export_jobs
+
+    db = mongomock.MongoClient().db
+    db.exam_attempts.insert_one({"id": "a1", "exam_id": "e1", "student_data": {}, "score": 1, "max_score": 1,
+                                 "percentage": 100.0, "flagged": False, "submitted_at": "2026-01-01T00:00:00+00:00"})
+
+    def fail(*_):
+        raise OSError("disk full")
+
+    # The file is complete but cannot be moved into place
+    monkeypatch.setattr(export_jobs.os, "replace", fail)
+    with pytest.raises(OSError):
+        export_jobs.write_export_file(lambda: db, "job-1", {"id": "e1"}, str(tmp_path / "e1.xlsx"))
+    assert list(tmp_path.iterdir()) == []
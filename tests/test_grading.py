@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+from grading import GradingPlan, compile_plan, get_cached_plan, invalidate_plan, plan_generation
+
+
+def _answer(question_id, answer):
+    return SimpleNamespace(question_id=question_id, answer=answer)
+
+
+def _exam(questions, max_violations=3):
+    return {"id": "exam-1", "questions": questions, "settings": {"max_violations": max_violations}}
+
+
+def test_plan_skips_open_ended_questions():
+    plan = GradingPlan(_exam([
+        {"id": "q1", "type": "multiple_choice", "correct_answer": "4", "points": 2},
+        {"id": "q2", "type": "short_answer", "correct_answer": "anything", "points": 5},
+        {"id": "q3", "type": "fill_blank", "correct_answer": None, "points": 5},
+    ]))
+    assert set(plan.keys) == {"q1"}
+    assert plan.max_score == 2
+
+
+def test_plan_grades_each_question_kind():
+    plan = GradingPlan(_exam([
+        {"id": "text", "type": "multiple_choice", "correct_answer": " Paris ", "points": 1},
+        {"id": "num", "type": "numeric", "correct_answer": "3.50", "points": 2},
+        {"id": "multi", "type": "multiple_select", "correct_answer": ["a", " b"], "points": 4},
+    ]))
+    result = plan.grade([
+        _answer("text", "paris"),
+        _answer("num", "3.5"),
+        _answer("multi", '["B", "a"]'),
+    ])
+    assert result.score == 7
+
+
+def test_plan_first_answer_per_question_wins():
+    plan = GradingPlan(_exam([{"id": "q1", "type": "true_false", "correct_answer": "true", "points": 1}]))
+    assert plan.grade([_answer("q1", "false"), _answer("q1", "true")]).score == 0
+
+
+def test_plan_normalizes_like_the_edge_function():
+    plan = GradingPlan(_exam([
+        {"id": "text", "type": "fill_blank", "correct_answer": "New  York", "points": 1},
+        {"id": "num", "type": "numeric", "correct_answer": "n/a", "points": 1},
+        {"id": "multi", "type": "multiple_select", "correct_answer": ["A", "b"], "points": 1},
+    ]))
+    assert plan.is_correct("text", " new york ")
+    # Non-numeric keys fall back to text comparison
+    assert plan.is_correct("num", "N/A")
+    assert plan.is_correct("multi", "b||a")
+    assert plan.is_correct("multi", ["a", "B"])
+    assert not plan.is_correct("multi", "a")
+    # Repeated selections do not collapse
+    assert not plan.is_correct("multi", ["a", "a", "b"])
+    assert not plan.is_correct("unknown", "a")
+
+
+def test_plan_returns_verdicts_in_exam_order():
+    plan = GradingPlan(_exam([
+        {"id": "q1", "type": "multiple_choice", "correct_answer": "4", "points": 2},
+        {"id": "q2", "type": "short_answer", "correct_answer": None, "points": 5},
+        {"id": "q3", "type": "multiple_select", "correct_answer": ["a", "b"], "points": 3},
+        {"id": "q4", "type": "short_answer", "correct_answer": None, "points": 5},
+    ]))
+    result = plan.grade([
+        _answer("q3", ["b", "a"]),
+        _answer("q2", "an essay"),
+        _answer("stale", "4"),
+    ])
+    assert result.score == 3
+    assert result.max_score == 5
+    assert result.percentage == 60.0
+    # Only answered questions get a row
+    assert result.verdicts == [
+        {"question_id": "q2", "answer": "an essay", "is_correct": False},
+        {"question_id": "q3", "answer": '["b", "a"]', "is_correct": True},
+    ]
+
+
+def test_plan_read_before_invalidation_is_not_cached():
+    exam = {"id": "exam-race", "questions": [{"id": "q1", "type": "true_false", "correct_answer": "true", "points": 1}],
+            "settings": {}}
+    generation = plan_generation("exam-race")
+    # The exam changes while the old document is being read
+    invalidate_plan("exam-race")
+    compile_plan(exam, generation)
+    assert get_cached_plan("exam-race") is None
+
+    plan = compile_plan(exam, plan_generation("exam-race"))
+    assert get_cached_plan("exam-race") is plan
+    invalidate_plan("exam-race")
+    assert get_cached_plan("exam-race") is None
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from idempotency import SubmissionDeduper, submission_key
+
+
+def test_key_comes_from_client_key_or_payload():
+    payload = {"student_data": {"name": "A"}, "answers": [{"question_id": "q", "answer": "x"}]}
+    reordered = {"answers": [{"answer": "x", "question_id": "q"}], "student_data": {"name": "A"}}
+    assert submission_key("e1", None, payload) == submission_key("e1", None, reordered)
+    assert submission_key("e1", None, payload) != submission_key("e2", None, payload)
+    assert submission_key("e1", "k", payload) == submission_key("e1", "k", {})
+    assert submission_key("e1", "k", payload) != submission_key("e1", None, payload)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_retries_share_one_processing():
+    deduper = SubmissionDeduper()
+    calls = []
+
+    async def process():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"attempt_id": "a1"}, False
+
+    results = await asyncio.gather(*(deduper.run("k", process) for _ in range(5)))
+    assert len(calls) == 1
+    assert [replayed for _, replayed in results] == [False, True, True, True, True]
+    assert await deduper.run("k", process) == ({"attempt_id": "a1"}, True)
+    assert deduper.stats()["joined"] == 4 and deduper.stats()["cached"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached():
+    deduper = SubmissionDeduper()
+    outcomes = [RuntimeError("down"), ({"attempt_id": "a1"}, False)]
+
+    async def process():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with pytest.raises(RuntimeError):
+        await deduper.run("k", process)
+    assert await deduper.run("k", process) == ({"attempt_id": "a1"}, False)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from answer_matrix import AnswerMatrix
+from grading import GradingPlan
+from item_analysis import analyze, compute_item_analysis
+
+
+def _plan():
+    return GradingPlan({
+        "id": "exam-1",
+        "questions": [
+            {"id": "q1", "type": "multiple_choice", "correct_answer": "A", "points": 1},
+            {"id": "q2", "type": "multiple_choice", "correct_answer": "B", "points": 1},
+            {"id": "q3", "type": "short_answer", "points": 5},
+        ],
+    })
+
+
+def _attempt(q1=None, q2=None, t=10):
+    answers = []
+    if q1 is not None:
+        answers.append({"question_id": "q1", "answer": q1, "time_spent_seconds": t})
+    if q2 is not None:
+        answers.append({"question_id": "q2", "answer": q2, "time_spent_seconds": t * 2})
+    return {"answers": answers}
+
+
+def test_item_statistics():
+    matrix = AnswerMatrix(_plan())
+    attempts = [
+        _attempt("A", "B", 10),
+        _attempt("A", "B", 20),
+        _attempt("a ", "C", 30),
+        _attempt("C", None, 40),
+        _attempt(None, "D", 50),
+    ]
+    codes, times = matrix.encode_with_times(attempts)
+    result = analyze(matrix, codes, times)
+
+    assert result["attempts"] == 5
+    q1, q2 = result["items"]
+    assert q1["question_id"] == "q1"
+    assert q1["p_value"] == 0.6
+    assert q1["answered"] == 4 and q1["unanswered"] == 1
+    assert q1["median_time_seconds"] == 25.0
+    assert q1["distractors"][0] == {"answer": "a", "count": 3, "share": 0.6, "correct": True}
+    assert q1["distractors"][1]["answer"] == "c"
+
+    assert q2["p_value"] == 0.4
+    # Students who got q2 right also did better on q1
+    assert q2["point_biserial"] > 0
+
+
+def test_constant_item_has_no_discrimination():
+    matrix = AnswerMatrix(_plan())
+    codes, times = matrix.encode_with_times([_attempt("A", "B"), _attempt("A", "C")])
+    q1 = analyze(matrix, codes, times)["items"][0]
+    assert q1["p_value"] == 1.0
+    assert q1["point_biserial"] is None
+
+
+def test_large_exam_is_vectorized():
+    questions = [{"id": f"q{j}", "type": "multiple_choice", "correct_answer": "A", "points": 1} for j in range(100)]
+    matrix = AnswerMatrix(GradingPlan({"id": "big", "questions": questions}))
+    rng = np.random.default_rng(0)
+    choices = np.array(list("ABCD"))[rng.integers(0, 4, size=(20000, 100))]
+    attempts = [
+        {"answers": [{"question_id": f"q{j}", "answer": row[j], "time_spent_seconds": 5} for j in range(100)]}
+        for row in choices.tolist()
+    ]
+    codes, times = matrix.encode_with_times(attempts)
+    result = analyze(matrix, codes, times)
+    assert result["attempts"] == 20000
+    assert all(0.2 < item["p_value"] < 0.3 for item in result["items"])
+
+
+@pytest.mark.asyncio
+async def test_batched_reads_give_the_same_analysis():
+    db = AsyncMongoMockClient().test_db
+    attempts = [_attempt("A", "B"), _attempt("C", "B"), _attempt("A"), _attempt(None, "D"), _attempt("A", "B", 30)]
+    await db.exam_attempts.insert_many([{"exam_id": "exam-1", **a} for a in attempts])
+
+    whole = await compute_item_analysis(db, "exam-1", _plan(), batch_size=100)
+    batched = await compute_item_analysis(db, "exam-1", _plan(), batch_size=2)
+    assert batched == whole
+    assert whole["attempts"] == 5
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import pytest
+
+from live_hub import LiveHub, HEARTBEAT_FRAME
+
+
+def events(chunk: bytes):
+    out = []
+    for frame in chunk.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines() if ": " in line and not line.startswith(":"))
+        if "event" in fields:
+            out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+
+@pytest.mark.asyncio
+async def test_publish_fans_out_to_exam_subscribers():
+    hub = LiveHub(heartbeat=5)
+    a, b, other = hub.subscribe("e1"), hub.subscribe("e1"), hub.subscribe("e2")
+    streams = [s.stream(hub.heartbeat) for s in (a, b)]
+    for stream in streams:
+        assert await stream.__anext__() == b"retry: 3000\n\n"
+
+    assert hub.publish("e1", "violation", {"n": 1}) == 2
+    assert hub.publish("e3", "violation", {"n": 1}) == 0
+    for stream in streams:
+        assert events(await stream.__anext__()) == [("violation", {"n": 1})]
+    assert not other.frames
+
+    for stream in streams:
+        await stream.aclose()
+    assert hub.stats()["subscribers"] == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_drops_oldest_and_gets_heartbeats():
+    hub = LiveHub(queue_size=3, heartbeat=0.01)
+    subscription = hub.subscribe("e1")
+    stream = subscription.stream(hub.heartbeat)
+    await stream.__anext__()
+
+    for n in range(5):
+        hub.publish("e1", "submission", {"n": n})
+    lagged = events(await stream.__anext__())
+    assert lagged == [("lagged", {"dropped": 2})]
+    assert [data["n"] for _, data in events(await stream.__anext__())] == [2, 3, 4]
+    assert hub.stats()["dropped"] == 2
+
+    assert await asyncio.wait_for(stream.__anext__(), 1) == HEARTBEAT_FRAME
+    await stream.aclose()
+    assert hub.stats()["subscribers"] == 0
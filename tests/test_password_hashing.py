@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from password_hashing import PasswordHasher, HashingOverloaded
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_off_loop():
+    hasher = PasswordHasher(workers=2, rounds=4)
+    hashed = await hasher.hash("secret")
+    assert await hasher.verify("secret", hashed)
+    assert not await hasher.verify("wrong", hashed)
+    stats = hasher.stats()
+    assert stats["hashed"] == 1 and stats["verified"] == 2
+    assert stats["hash_ms_p50"] is not None and stats["pending"] == 0
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_excess_calls_are_shed():
+    hasher = PasswordHasher(workers=1, max_queue=1, rounds=10)
+    results = await asyncio.gather(*[hasher.hash("pw") for _ in range(5)], return_exceptions=True)
+    shed = [r for r in results if isinstance(r, HashingOverloaded)]
+    assert len(shed) == 3
+    assert all(r.retry_after >= 1 for r in shed)
+    assert hasher.counters["rejected"] == 3
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_stays_pending_until_its_thread_finishes():
+    hasher = PasswordHasher(workers=1, rounds=4)
+    started, release = asyncio.Event(), asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def block():
+        loop.call_soon_threadsafe(started.set)
+        asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+
+    call = asyncio.ensure_future(hasher._submit(block))
+    await started.wait()
+    call.cancel()
+    await asyncio.sleep(0.01)
+    assert hasher.pending == 1
+
+    release.set()
+    for _ in range(100):
+        if hasher.pending == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert hasher.pending == 0
+    hasher.shutdown()
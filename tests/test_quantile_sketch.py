@@ -0,0 +1,37 @@
+import numpy as np
+
+from quantile_sketch import TDigest
+
+
+def test_quantiles_within_bounded_error():
+    values = np.random.default_rng(1).normal(60, 15, 50_000).clip(0, 100)
+    digest = TDigest()
+    digest.update(values.tolist())
+
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        assert abs(digest.quantile(q) - np.quantile(values, q)) < 0.5
+    assert abs(digest.cdf(float(np.median(values))) - 0.5) < 0.01
+    # Bounded size regardless of how many values were added
+    assert len(digest.to_dict()["centroids"]) <= 2 * digest.compression
+
+
+def test_merge_and_round_trip():
+    values = np.random.default_rng(2).uniform(0, 100, 20_000)
+    left, right = TDigest(), TDigest()
+    left.update(values[:7_000].tolist())
+    right.update(values[7_000:].tolist())
+    left.merge(right)
+
+    restored = TDigest.from_dict(left.to_dict())
+    assert restored.count == 20_000
+    assert abs(restored.quantile(0.5) - np.median(values)) < 1.0
+    assert restored.min == values.min() and restored.max == values.max()
+
+
+def test_small_and_empty():
+    assert TDigest().quantile(0.5) is None
+    digest = TDigest()
+    digest.update([1, 2, 3, 4])
+    assert digest.quantile(0) == 1
+    assert digest.quantile(0.5) == 2.5
+    assert digest.quantile(1) == 4
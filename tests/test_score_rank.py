@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from score_rank import FenwickTree, ScoreRanks, score_bucket, NUM_BUCKETS
+
+
+def test_fenwick_matches_brute_force():
+    rng = random.Random(0)
+    counts = {}
+    tree = FenwickTree(NUM_BUCKETS)
+    for _ in range(2000):
+        bucket = rng.randrange(NUM_BUCKETS)
+        counts[bucket] = counts.get(bucket, 0) + 1
+        tree.add(bucket)
+
+    rebuilt = FenwickTree.from_counts(counts, NUM_BUCKETS)
+    for index in (0, 1, 250, 500, 999, NUM_BUCKETS):
+        expected = sum(c for b, c in counts.items() if b < index)
+        assert tree.prefix_sum(index) == expected
+        assert rebuilt.prefix_sum(index) == expected
+    assert tree.total == rebuilt.total == 2000
+
+
+@pytest.mark.asyncio
+async def test_ranks_reload_when_other_workers_recorded():
+    stored = {}
+    loads = []
+
+    async def load_buckets(exam_id):
+        loads.append(exam_id)
+        return {str(b): c for b, c in stored.items()}, sum(stored.values())
+
+    def store(percentage):
+        bucket = score_bucket(percentage)
+        stored[bucket] = stored.get(bucket, 0) + 1
+        return sum(stored.values())
+
+    ranks = ScoreRanks(load_buckets)
+    for percentage in (40, 60, 80):
+        result = await ranks.record("exam-1", percentage, store(percentage))
+    assert result == {"percentile_rank": 66.7, "rank": 1, "out_of": 3}
+    assert len(loads) == 1
+
+    # Another worker stored an attempt this tree has not seen
+    store(90)
+    result = await ranks.record("exam-1", 60, store(60))
+    assert result == {"percentile_rank": 20.0, "rank": 3, "out_of": 5}
+    assert len(loads) == 2
+
+
+@pytest.mark.asyncio
+async def test_returned_buckets_refresh_without_reloading():
+    async def load_buckets(exam_id):
+        raise AssertionError("buckets were passed in")
+
+    ranks = ScoreRanks(load_buckets)
+    buckets = {str(score_bucket(50)): 1, str(score_bucket(70)): 2}
+    assert await ranks.record("exam-1", 70, 3, buckets) == {"percentile_rank": 33.3, "rank": 1, "out_of": 3}
+    # Another worker's attempts show up in the next returned buckets
+    buckets[str(score_bucket(90))] = 1
+    buckets[str(score_bucket(50))] = 2
+    assert await ranks.record("exam-1", 50, 5, buckets) == {"percentile_rank": 0.0, "rank": 4, "out_of": 5}
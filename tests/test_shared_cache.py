@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from shared_cache import LocalSharedCache, SharedExamTier
+
+
+def _counting_loader(body=b'{"id":"exam-1"}'):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return body
+
+    return load, calls
+
+
+@pytest.mark.asyncio
+async def test_workers_sharing_a_backend_load_once():
+    backend = LocalSharedCache()
+    workers = [SharedExamTier(backend, poll_interval=0.005) for _ in range(4)]
+    load, calls = _counting_loader()
+
+    results = await asyncio.gather(*[w.get_or_load("exam-1", load) for w in workers for _ in range(10)])
+    assert set(results) == {b'{"id":"exam-1"}'}
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_exam_is_cached_as_not_found():
+    tier = SharedExamTier(LocalSharedCache())
+    load, calls = _counting_loader(body=None)
+
+    assert await tier.get_or_load("gone", load) is None
+    assert await tier.get_or_load("gone", load) is None
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_renews_generation_and_notifies_listeners():
+    backend = LocalSharedCache()
+    tier = SharedExamTier(backend)
+    notified = []
+    backend.add_listener(notified.append)
+
+    load, calls = _counting_loader()
+    await tier.get_or_load("exam-1", load)
+    await tier.invalidate("exam-1")
+    await tier.get_or_load("exam-1", load)
+
+    assert notified == ["exam-1"]
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_generation_keys_expire():
+    backend = LocalSharedCache()
+    tier = SharedExamTier(backend, ttl=0.05, missing_ttl=0.01, generation_ttl=0.05)
+    load, calls = _counting_loader()
+
+    await tier.get_or_load("exam-1", load)
+    await tier.invalidate("exam-1")
+    assert await backend.get("exam-cache:gen:exam-1") is not None
+    await asyncio.sleep(0.06)
+    assert await backend.get("exam-cache:gen:exam-1") is None
+
+    # Values under the expired generation are gone too, so the exam is reloaded
+    await tier.get_or_load("exam-1", load)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_local_backend_sweeps_expired_keys():
+    backend = LocalSharedCache()
+    for i in range(LocalSharedCache.PURGE_THRESHOLD - 1):
+        await backend.set(f"key-{i}", b"x", ttl=0.01)
+    await asyncio.sleep(0.02)
+    await backend.set("live", b"x")
+    assert len(backend._values) == 1
+
+
+@pytest.mark.asyncio
+async def test_backend_failure_falls_back_to_direct_load():
+    class BrokenBackend(LocalSharedCache):
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+    tier = SharedExamTier(BrokenBackend())
+    load, calls = _counting_loader()
+    assert await tier.get_or_load("exam-1", load) == b'{"id":"exam-1"}'
+    assert len(calls) == 1
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_load():
+    flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": "exam-1"}
+
+    results = await asyncio.gather(*[flight.do("exam-1", load) for _ in range(50)])
+    assert calls == 1
+    assert all(r is results[0] for r in results)
+    assert not flight.in_flight("exam-1")
+
+
+@pytest.mark.asyncio
+async def test_failed_load_is_raised_to_every_caller_and_not_kept():
+    flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise LookupError("exam-1")
+
+    results = await asyncio.gather(*[flight.do("exam-1", load) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(r, LookupError) for r in results)
+
+    async def retry():
+        return "ok"
+
+    assert await flight.do("exam-1", retry) == "ok"
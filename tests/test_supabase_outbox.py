@@ -0,0 +1,104 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from supabase_outbox import SupabaseOutbox, RowsRejected, build_outbox_entry, OUTBOX_DEAD, OUTBOX_PENDING
+
+ANSWERS_PATH = "submission_answers?on_conflict=submission_id,question_id"
+
+
+def _entry(attempt_id):
+    submission_row = {"id": attempt_id, "exam_id": "exam-1", "score": 1, "max_score": 1, "percentage": 100.0}
+    answer_rows = [{"submission_id": attempt_id, "question_id": "q1", "answer": "4", "is_correct": True}]
+    return build_outbox_entry(submission_row, answer_rows)
+
+
+def _outbox(db, **kwargs):
+    return SupabaseOutbox(lambda: db, "https://example.supabase.co", "service-role", **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_drain_coalesces_batch_into_two_posts():
+    db = AsyncMongoMockClient().test_db
+    outbox = _outbox(db)
+    posts = []
+
+    async def fake_post(path, rows, prefer):
+        posts.append((path, len(rows)))
+
+    outbox._post = fake_post
+    for i in range(3):
+        await outbox.enqueue(_entry(f"attempt-{i}"))
+
+    assert await outbox.drain_once() == 3
+    assert posts == [("submissions?on_conflict=id", 3), (ANSWERS_PATH, 3)]
+    assert await db.supabase_outbox.count_documents({}) == 0
+    assert outbox.counters["mirrored_total"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_answers_post_retries_without_resending_submission():
+    db = AsyncMongoMockClient().test_db
+    outbox = _outbox(db, base_backoff=0)
+    posts = []
+
+    async def flaky_post(path, rows, prefer):
+        posts.append(path)
+        if path == ANSWERS_PATH and posts.count(path) == 1:
+            raise RuntimeError("POST submission_answers failed: 503")
+
+    outbox._post = flaky_post
+    await outbox.enqueue(_entry("attempt-1"))
+
+    await outbox.drain_once()
+    entry = await db.supabase_outbox.find_one({"id": "attempt-1"})
+    assert entry["status"] == OUTBOX_PENDING
+    assert entry["attempts"] == 1
+    assert entry["submission_mirrored"] is True
+
+    await outbox.drain_once()
+    assert posts == ["submissions?on_conflict=id", ANSWERS_PATH, ANSWERS_PATH]
+    assert await db.supabase_outbox.count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_entries_are_dead_lettered_after_max_attempts():
+    db = AsyncMongoMockClient().test_db
+    outbox = _outbox(db, max_attempts=1)
+
+    async def failing_post(path, rows, prefer):
+        raise RuntimeError("POST submissions failed: 500")
+
+    outbox._post = failing_post
+    await outbox.enqueue(_entry("attempt-1"))
+    await outbox.drain_once()
+
+    entry = await db.supabase_outbox.find_one({"id": "attempt-1"})
+    assert entry["status"] == OUTBOX_DEAD
+    stats = await outbox.stats()
+    assert stats["dead"] == 1
+    assert stats["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_rejected_batch_is_bisected_to_the_bad_entry():
+    db = AsyncMongoMockClient().test_db
+    outbox = _outbox(db, base_backoff=0)
+    posts = []
+
+    async def picky_post(path, rows, prefer):
+        posts.append((path, len(rows)))
+        if path.startswith("submissions") and any(row["id"] == "attempt-2" for row in rows):
+            raise RowsRejected("POST submissions rejected: 400 invalid input syntax")
+
+    outbox._post = picky_post
+    for i in range(4):
+        await outbox.enqueue(_entry(f"attempt-{i}"))
+
+    assert await outbox.drain_once() == 4
+    remaining = await db.supabase_outbox.find({}, {"_id": 0}).to_list(None)
+    assert [e["id"] for e in remaining] == ["attempt-2"]
+    assert remaining[0]["status"] == OUTBOX_PENDING
+    assert remaining[0]["attempts"] == 1
+    assert outbox.counters["mirrored_total"] == 3
+    # Whole batch, then halves, then the rejected half's halves
+    assert [n for path, n in posts if path.startswith("submissions")] == [4, 2, 2, 1, 1]
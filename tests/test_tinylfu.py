@@ -0,0 +1,46 @@
+from tinylfu import TinyLFUCache
+
+
+def test_bounded_by_bytes_not_entries():
+    cache = TinyLFUCache(max_bytes=1000, getsizeof=len)
+    for i in range(50):
+        cache[f"k{i}"] = b"x" * 100
+    assert cache.currsize <= 1000
+    assert len(cache) <= 10
+
+
+def test_oversized_entry_is_rejected():
+    cache = TinyLFUCache(max_bytes=1000, getsizeof=len)
+    cache["huge"] = b"x" * 5000
+    assert "huge" not in cache
+    assert cache.rejections == 1
+
+
+def test_scan_does_not_evict_popular_entries():
+    cache = TinyLFUCache(max_bytes=10_000, getsizeof=len)
+    hot = [f"live-{i}" for i in range(5)]
+    for key in hot:
+        cache[key] = b"x" * 1000
+    for _ in range(20):
+        for key in hot:
+            assert cache.get(key) is not None
+
+    # A scan of one-off exams, each seen once
+    for i in range(500):
+        cache.get(f"scan-{i}")
+        cache[f"scan-{i}"] = b"x" * 1000
+
+    assert all(key in cache for key in hot)
+    assert cache.rejections > 0
+    assert cache.currsize <= 10_000
+
+
+def test_counters_and_pop():
+    cache = TinyLFUCache(max_bytes=1000, getsizeof=len)
+    cache["a"] = b"1234"
+    assert cache.get("a") == b"1234"
+    assert cache.get("b") is None
+    assert cache.pop("a") == b"1234"
+    assert cache.currsize == 0
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_ratio"] == 0.5
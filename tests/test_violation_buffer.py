@@ -0,0 +1,88 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from violation_buffer import ViolationBuffer
+
+
+def log(i):
+    return {"exam_id": "e1", "violation": {"type": "tab_switch", "n": i}}
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_in_batches_and_counts_sessions():
+    db = AsyncMongoMockClient().test_db
+    buffer = ViolationBuffer(lambda: db, max_batch=4)
+    assert buffer.add([log(i) for i in range(3)], ("e1", "s1")) == 3
+    assert buffer.add([log(3), log(4)], ("e1", "s1")) == 5
+    assert buffer.add([log(5)]) is None
+    assert buffer.count("e1", "s1") == 5
+    assert buffer.count("e1", "s2") == 0
+
+    assert await buffer.flush() == 6
+    assert await db.violation_logs.count_documents({}) == 6
+    assert buffer.stats()["batches"] == 2
+    assert buffer.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_requeued_and_queue_is_bounded():
+    class Failing:
+        calls = 0
+
+        async def insert_many(self, docs, ordered=True):
+            Failing.calls += 1
+            raise RuntimeError("down")
+
+    buffer = ViolationBuffer(lambda: type("Db", (), {"violation_logs": Failing()})(), max_batch=2, max_pending=5)
+    buffer.add([log(i) for i in range(7)])
+    assert buffer.stats()["dropped"] == 2
+    assert await buffer.flush() == 0
+    assert buffer.stats()["pending"] == 5
+    assert buffer.stats()["failed_batches"] == 1
+    assert [doc["violation"]["n"] for doc, _ in buffer._pending] == [2, 3, 4, 5, 6]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_lost_reply_counts_stored_documents_as_written():
+    db = AsyncMongoMockClient().test_db
+
+    class LostReply:
+        """Stores the batch, then fails the first call as if the reply never arrived"""
+        calls = 0
+
+        async def insert_many(self, docs, ordered=True):
+            LostReply.calls += 1
+            if LostReply.calls == 1:
+                await db.violation_logs.insert_many(docs[:2])
+                raise ConnectionError("connection reset")
+            await db.violation_logs.insert_many(docs, ordered=ordered)
+
+    stored = []
+
+    async def on_written(docs):
+        stored.extend(docs)
+
+    buffer = ViolationBuffer(lambda: type("Db", (), {"violation_logs": LostReply()})(), on_written=on_written)
+    buffer.add([log(i) for i in range(3)])
+    assert await buffer.flush() == 0
+    assert buffer.stats()["pending"] == 3
+
+    # The two stored documents come back as duplicate key errors, the third is written now
+    assert await buffer.flush() == 3
+    assert buffer.stats()["pending"] == 0
+    assert await db.violation_logs.count_documents({}) == 3
+    assert len(stored) == 3
+
+
+@pytest.mark.asyncio
+async def test_documents_failing_repeatedly_are_dropped():
+    class Failing:
+        async def insert_many(self, docs, ordered=True):
+            raise RuntimeError("down")
+
+    buffer = ViolationBuffer(lambda: type("Db", (), {"violation_logs": Failing()})(), max_attempts=3)
+    buffer.add([log(0)])
+    for _ in range(3):
+        await buffer.flush()
+    assert buffer.stats()["pending"] == 0
+    assert buffer.stats()["dead"] == 1
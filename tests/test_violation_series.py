@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import violation_series
+
+# Inside the retention period
+DAY = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2)
+
+
+def log(exam_id, minute, second, violation_type):
+    return {
+        "exam_id": exam_id,
+        "violation": {"type": violation_type},
+        "logged_at": DAY.replace(hour=9, minute=minute, second=second),
+    }
+
+
+@pytest.mark.asyncio
+async def test_rollups_count_per_minute_and_type():
+    db = AsyncMongoMockClient().test_db
+    batch = [log("e1", 0, 5, "tab_switch"), log("e1", 0, 50, "tab_switch"), log("e1", 0, 59, "right_click"),
+             log("e1", 1, 0, "tab_switch"), log("e2", 0, 1, "tab_switch")]
+    await violation_series.record_rollups(db, batch[:3])
+    await violation_series.record_rollups(db, batch[3:])
+    await violation_series.record_rollups(db, [log("e1", 0, 30, "tab_switch")])
+
+    timeline = await violation_series.get_timeline(db, "e1")
+    assert [(row["minute"].minute, row["type"], row["count"]) for row in timeline] == [
+        (0, "right_click", 1), (0, "tab_switch", 3), (1, "tab_switch", 1),
+    ]
+    later = await violation_series.get_timeline(db, "e1", since=DAY.replace(hour=9, second=30))
+    assert [row["minute"].minute for row in later] == [0, 0, 1]
+    assert await violation_series.get_timeline(db, "e1", since=DAY.replace(hour=9, minute=2)) == []
+
+    # Rebuilding from the stored events gives the same rollups
+    await db.violation_logs.insert_many(batch + [log("e1", 0, 30, "tab_switch")])
+    await db.violation_rollups.delete_many({"exam_id": "e1", "type": "right_click"})
+    assert await violation_series.rebuild_rollups(db, "e1") == 3
+    assert await violation_series.get_timeline(db, "e1") == timeline
+
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_unsettled_minutes_and_clears_empty_ones():
+    db = AsyncMongoMockClient().test_db
+    now = datetime.now(timezone.utc)
+    current = violation_series.minute_of(now)
+    old = log("e1", 0, 5, "tab_switch")
+    await db.violation_logs.insert_many([old, {**log("e1", 0, 0, "tab_switch"), "logged_at": now}])
+    # A live flush has counted more for the current minute than the logs the rebuild reads
+    await db.violation_rollups.insert_many([
+        {"exam_id": "e1", "minute": current, "type": "tab_switch", "count": 7},
+        {"exam_id": "e1", "minute": DAY.replace(hour=8), "type": "copy", "count": 2},
+        # Its events expired with the retention period, but the rollup is kept
+        {"exam_id": "e1", "minute": DAY - timedelta(days=365), "type": "copy", "count": 4},
+    ])
+
+    assert await violation_series.rebuild_rollups(db, "e1") == 1
+    timeline = await violation_series.get_timeline(db, "e1")
+    assert [(row["type"], row["count"]) for row in timeline] == [("copy", 4), ("tab_switch", 1), ("tab_switch", 7)]
+
+
+@pytest.mark.asyncio
+async def test_resumed_migration_does_not_duplicate_copied_events(monkeypatch):
+    db = AsyncMongoMockClient().test_db
+    kinds = {violation_series.LOGS: "timeseries", violation_series.LEGACY_LOGS: "collection"}
+
+    async def collection_type(_, name):
+        return kinds.get(name)
+
+    async def ensure_collections(*_):
+        pass
+
+    monkeypatch.setattr(violation_series, "_collection_type", collection_type)
+    monkeypatch.setattr(violation_series, "ensure_collections", ensure_collections)
+    copied = {**log("e1", 0, 5, "tab_switch"), "_id": "a"}
+    # The interrupted run inserted "a" but never deleted it from the legacy collection
+    await db.violation_logs.insert_one(dict(copied))
+    await db.violation_logs_legacy.insert_many([
+        {**copied, "logged_at": copied["logged_at"].isoformat()},
+        {**log("e1", 0, 10, "right_click"), "_id": "b"},
+    ])
+
+    assert await violation_series.migrate_legacy(db) == (2, 1)
+    assert sorted(await db.violation_logs.distinct("_id")) == ["a", "b"]
+    assert await db.violation_logs.count_documents({}) == 2